@@ -0,0 +1,183 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from app.records import EPOCH
+
+MICROS_PER_HOUR = 3600 * 1_000_000
+EPOCH_ORDINAL = EPOCH.toordinal()
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+WEEKDAYS_RU = ("в понедельник", "во вторник", "в среду", "в четверг", "в пятницу", "в субботу", "в воскресенье")
+# Ширина окна "лучшего времени работы", в часах
+BEST_TIME_WINDOW = 4
+
+
+class ActivityBuckets:
+    """
+    Предагрегированные счетчики активности по часовым корзинам.
+
+    Строка массива - день (порядковый номер от base), столбец - час.
+    Создание и завершение задачи увеличивают одну ячейку, поэтому отчеты
+    за любой период - это срезы и свертки NumPy по массивам размером
+    дни x 24, без прохода по самим задачам.
+    """
+
+    def __init__(self):
+        self.base: Optional[int] = None
+        self.created = np.zeros((0, 24), dtype=np.int64)
+        self.completed = np.zeros((0, 24), dtype=np.int64)
+        # Сумма длительностей (создание -> завершение) по дню завершения, в секундах
+        self.completion_seconds = np.zeros(0, dtype=np.float64)
+
+    def _row(self, day: int) -> int:
+        if self.base is None:
+            self.base = day
+        if day < self.base:
+            self._grow(front=self.base - day)
+        elif day - self.base >= len(self.created):
+            self._grow(back=day - self.base - len(self.created) + 1)
+        return day - self.base
+
+    def _grow(self, front: int = 0, back: int = 0):
+        # Запас по росту вперед - чтобы не копировать массивы каждый день
+        if back:
+            back = max(back, 32, len(self.created) // 2)
+        self.created = np.pad(self.created, ((front, back), (0, 0)))
+        self.completed = np.pad(self.completed, ((front, back), (0, 0)))
+        self.completion_seconds = np.pad(self.completion_seconds, (front, back))
+        self.base -= front
+
+    def add_created(self, created: int):
+        # Время - микросекунды от эпохи, как в TaskRecord
+        hours = created // MICROS_PER_HOUR
+        # Строку считаем до обращения к массиву: _row может его заменить
+        row = self._row(EPOCH_ORDINAL + hours // 24)
+        self.created[row, hours % 24] += 1
+
+    def add_completed(self, completed: int, created: int):
+        hours = completed // MICROS_PER_HOUR
+        row = self._row(EPOCH_ORDINAL + hours // 24)
+        self.completed[row, hours % 24] += 1
+        self.completion_seconds[row] += max(completed - created, 0) / 1_000_000
+
+    def add_rows(self, rows: Iterable[Tuple[str, int, int, int, float]]):
+        # Строки (день ISO, час, создано, завершено, секунды) из таблицы task_activity SQLite
+        for day, hour, created, completed, seconds in rows:
+            row = self._row(date.fromisoformat(day).toordinal())
+            self.created[row, hour] += created
+            self.completed[row, hour] += completed
+            self.completion_seconds[row] += seconds
+
+    def window(self, start: date, end: date) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Срезы [start, end] включительно; дни вне накопленного диапазона - нули
+        days = (end - start).days + 1
+        created = np.zeros((days, 24), dtype=np.int64)
+        completed = np.zeros((days, 24), dtype=np.int64)
+        seconds = np.zeros(days, dtype=np.float64)
+        if self.base is not None and days > 0:
+            lo = max(start.toordinal() - self.base, 0)
+            hi = min(end.toordinal() - self.base + 1, len(self.created))
+            if lo < hi:
+                offset = self.base + lo - start.toordinal()
+                created[offset:offset + hi - lo] = self.created[lo:hi]
+                completed[offset:offset + hi - lo] = self.completed[lo:hi]
+                seconds[offset:offset + hi - lo] = self.completion_seconds[lo:hi]
+        return created, completed, seconds
+
+
+def _best_window(per_hour: np.ndarray, width: int = BEST_TIME_WINDOW) -> Optional[int]:
+    if not per_hour.any():
+        return None
+    # Сумма по скользящему окну с переходом через полночь
+    sums = np.convolve(np.concatenate([per_hour, per_hour[:width - 1]]), np.ones(width, dtype=np.int64), "valid")
+    # При равных суммах выбираем окно, которое начинается с активного часа
+    return int((sums * (per_hour.max() + 1) + per_hour).argmax())
+
+
+def _format_duration(seconds: Optional[float]) -> Optional[str]:
+    if seconds is None:
+        return None
+    if seconds >= 86400:
+        return f"{seconds / 86400:.1f} days"
+    return f"{seconds / 3600:.1f} hours"
+
+
+def productivity_report(activity: ActivityBuckets, stats: Dict[str, Any], days: int = 30,
+                        today: Optional[date] = None) -> Dict[str, Any]:
+    today = today or date.today()
+    days = max(days, 1)
+    start = today - timedelta(days=days - 1)
+    created, completed, seconds = activity.window(start, today)
+
+    daily_completed = completed.sum(axis=1)
+    daily_created = created.sum(axis=1)
+    total_completed = int(daily_completed.sum())
+    total_created = int(daily_created.sum())
+
+    # День недели для каждой строки среза: порядковый номер 1 - понедельник
+    weekdays = (np.arange(start.toordinal(), start.toordinal() + days) - 1) % 7
+    by_weekday = np.bincount(weekdays, weights=daily_completed, minlength=7)
+    by_hour = completed.sum(axis=0)
+    best_hour = _best_window(by_hour)
+
+    # Неделя - 7 дней, заканчивающихся today; неполная первая неделя дополняется нулями
+    weekly = np.pad(daily_completed, ((-days) % 7, 0)).reshape(-1, 7).sum(axis=1)
+
+    return {
+        "period_days": days,
+        "daily_average": round(total_completed / days, 2),
+        "weekly_total": int(daily_completed[-7:].sum()),
+        "monthly_total": int(daily_completed[-30:].sum()),
+        "completion_rate": round(stats["completion_rate"], 1),
+        "best_day": WEEKDAYS[int(by_weekday.argmax())] if total_completed else None,
+        "best_time": (
+            f"{best_hour:02d}:00-{(best_hour + BEST_TIME_WINDOW) % 24:02d}:00" if best_hour is not None else None
+        ),
+        # Доля задач, завершенных за период, от созданных за тот же период
+        "productivity_score": min(100, round(total_completed / total_created * 100)) if total_created else 0,
+        "average_completion_time": _format_duration(float(seconds.sum()) / total_completed if total_completed else None),
+        "daily": [
+            {"date": (start + timedelta(days=i)).isoformat(), "created": int(daily_created[i]), "completed": int(daily_completed[i])}
+            for i in range(days)
+        ],
+        "weekly": [int(total) for total in weekly],
+        "by_weekday": {WEEKDAYS[i]: int(by_weekday[i]) for i in range(7)},
+        "by_hour": [int(count) for count in by_hour]
+    }
+
+
+def task_report(activity: ActivityBuckets, stats: Dict[str, Any]) -> Dict[str, Any]:
+    total_completed = int(activity.completed.sum())
+    seconds = float(activity.completion_seconds.sum())
+    average = seconds / total_completed if total_completed else None
+    return {
+        "total_created": int(activity.created.sum()),
+        "total_completed": total_completed,
+        "total_overdue": stats["overdue"],
+        "average_completion_time": _format_duration(average),
+        "average_completion_hours": round(average / 3600, 1) if average is not None else None,
+        "priority_distribution": stats["by_priority"]
+    }
+
+
+def productivity_insights(activity: ActivityBuckets, stats: Dict[str, Any], days: int = 30) -> Dict[str, Any]:
+    report = productivity_report(activity, stats, days)
+    best_time = report["best_time"]
+    if report["best_day"] is None:
+        recommendations = "Завершите несколько задач, чтобы появились персональные рекомендации"
+    else:
+        weekday = WEEKDAYS_RU[WEEKDAYS.index(report["best_day"])]
+        recommendations = (
+            f"Больше всего задач вы завершаете {weekday} в {best_time.replace('-', ' - ')}: "
+            "планируйте важные задачи на это время"
+        )
+    if stats["overdue"]:
+        recommendations += f". Просроченных задач: {stats['overdue']} - начните с них"
+    return {
+        "productivity_score": report["productivity_score"],
+        "best_work_time": best_time.replace("-", " - ") if best_time else None,
+        "recommendations": recommendations,
+        "daily_average": f"В среднем вы завершаете {report['daily_average']:g} задач в день",
+        "period_days": report["period_days"]
+    }
@@ -0,0 +1,40 @@
+import os
+import re
+from typing import Dict, Optional
+
+# Пользователь запросов без токена; его данные лежат там же, где до разделения по пользователям
+DEFAULT_USER = "admin"
+
+# Имя пользователя становится частью пути к его данным, поэтому набор символов ограничен
+USER_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Токены демо-клиентов: /auth/login выдает fake_token, веб-приложение шлет demo_token_12345
+DEMO_TOKENS = {"fake_token": DEFAULT_USER, "demo_token_12345": DEFAULT_USER}
+
+
+def check_user_name(user: str) -> str:
+    if not USER_NAME.match(user):
+        raise ValueError(f"Invalid user name: {user!r}")
+    return user
+
+
+def load_tokens(spec: Optional[str] = None) -> Dict[str, str]:
+    # TASK_API_TOKENS="token1:alice,token2:bob" - токен -> пользователь
+    spec = os.getenv("TASK_API_TOKENS", "") if spec is None else spec
+    tokens = dict(DEMO_TOKENS)
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        token, _, user = item.rpartition(":")
+        if not token:
+            raise ValueError(f"Invalid TASK_API_TOKENS entry: {item!r}")
+        tokens[token] = check_user_name(user)
+    return tokens
+
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else ""
@@ -0,0 +1,80 @@
+import time
+from typing import List, Tuple
+
+# Сколько последних изменений хранит журнал; отставшим клиентам нужна полная синхронизация
+CHANGE_LOG_SIZE = 100_000
+
+
+class ChangeLog:
+    """
+    Ограниченный журнал изменений задач для дельта-синхронизации.
+
+    Каждое создание, изменение и удаление получает следующий номер seq.
+    Номера начинаются с текущего времени в микросекундах, поэтому после
+    перезапуска процесса они продолжают расти, а курсор клиента из прошлого
+    запуска оказывается старше журнала и вызывает полную синхронизацию.
+    since=0 (у клиента ничего нет) отдает весь журнал, если он содержит всю
+    историю хранилища, - как журнал SQLite; иначе нужна полная синхронизация.
+    """
+
+    def __init__(self, size: int = CHANGE_LOG_SIZE):
+        self.last_seq = time.time_ns() // 1000
+        # Номер, с которого начался журнал этого запуска
+        self.origin_seq = self.last_seq
+        # Все изменения с seq <= trimmed_seq недоступны
+        self.trimmed_seq = self.last_seq
+        # Задачи были загружены из хранилища до начала журнала - история неполная
+        self.preloaded = False
+        # Кольцевой буфер: изменение seq лежит в ячейке (seq - origin_seq - 1) % size
+        self._entries: List[Tuple[int, int, bool]] = []
+        self._size = size
+
+    def record(self, task_id: int, deleted: bool = False) -> int:
+        self.last_seq += 1
+        entry = (self.last_seq, task_id, deleted)
+        if len(self._entries) < self._size:
+            self._entries.append(entry)
+        else:
+            slot = (self.last_seq - self.origin_seq - 1) % self._size
+            self.trimmed_seq = self._entries[slot][0]
+            self._entries[slot] = entry
+        return self.last_seq
+
+    def _start(self, since: int) -> int:
+        if since == 0 and not self.preloaded and self.trimmed_seq == self.origin_seq:
+            return self.origin_seq
+        return since
+
+    def needs_resync(self, since: int) -> bool:
+        since = self._start(since)
+        return since < self.trimmed_seq or since > self.last_seq
+
+    def since(self, since: int, limit: int) -> Tuple[List[Tuple[int, int, bool]], int]:
+        """
+        Изменения после since: (seq, id, удалена) по одному на задачу, не больше limit.
+
+        Возвращает также seq, до которого журнал просмотрен (курсор для
+        следующего запроса).
+        """
+        since = self._start(since)
+        latest = {}
+        cursor = since
+        # Номера идут подряд, поэтому ячейка каждого изменения вычисляется, а не ищется
+        for seq in range(max(since, self.trimmed_seq) + 1, self.last_seq + 1):
+            _, task_id, deleted = self._entries[(seq - self.origin_seq - 1) % self._size]
+            if task_id not in latest and len(latest) >= limit:
+                break
+            # Задача, изменившаяся несколько раз, возвращается один раз, на месте последнего изменения
+            latest.pop(task_id, None)
+            latest[task_id] = (seq, task_id, deleted)
+            cursor = seq
+        return list(latest.values()), cursor
+
+
+def encode_put(seq: int, task_json: bytes) -> bytes:
+    return b'{"seq":%d,"op":"put","task":%s}' % (seq, task_json)
+
+
+def encode_delete(seq: int, task_id: str) -> bytes:
+    # Надгробие: клиент удаляет задачу у себя
+    return b'{"seq":%d,"op":"delete","id":"%s"}' % (seq, task_id.encode("ascii"))
@@ -1,124 +1,782 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set, Iterable, Sequence, Tuple, Callable
 from uuid import UUID, uuid4
 from datetime import datetime, date, timedelta
-from app.models import Task, TaskCreate, TaskUpdate, TaskStatus, TaskPriority
+import base64
+import heapq
+import json
+import os
+from sortedcontainers import SortedList
+from app.models import Task, TaskCreate, TaskUpdate, TaskImport, TaskStatus, TaskPriority
+from app.records import (
+    TaskRecord, TaskHistory, STATUS_CODES, OPEN_STATUS_CODES, COMPLETED_CODE, to_micros, from_micros, record_key,
+    public_key, project_records
+)
+from app.search import SearchIndex
+from app.analytics import ActivityBuckets
+from app.changes import ChangeLog, encode_put, encode_delete
+from app.storage import MemoryStorage, LogStorage, PartitionStorage
+from app.auth import DEFAULT_USER
+from app.logger import logger
+
+SORT_FIELDS = ("title", "status", "priority", "due_date", "created_at")
+# Поля Task в порядке JSON-ответа и набор для компактных списков (экраны списков задач)
+TASK_FIELDS = tuple(Task.model_fields)
+COMPACT_FIELDS = ("id", "title", "status", "priority", "due_date")
+
+
+class VersionConflictError(Exception):
+    """Задача изменилась после того, как клиент ее прочитал (If-Match не совпал)."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Task version is {current_version}")
+        self.current_version = current_version
+
+
+def parse_fields(fields: str) -> Tuple[str, ...]:
+    # "id,title,status" -> кортеж полей без повторов в порядке запроса
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in TASK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if not names:
+        raise ValueError("No fields requested")
+    return names
+
+
+def encode_cursor(sort_by: str, order: str, key, task_id: UUID) -> str:
+    if isinstance(key, (date, datetime)):
+        key = key.isoformat()
+    raw = json.dumps([sort_by, order, key, str(task_id)], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, order: str) -> Tuple[Any, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_order, key, task_id = json.loads(base64.urlsafe_b64decode(padded))
+        if sort_by == "due_date":
+            key = date.fromisoformat(key)
+        elif sort_by == "created_at":
+            key = datetime.fromisoformat(key)
+        task_id = UUID(task_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort_by or cursor_order != order:
+        raise ValueError("Cursor does not match sort_by/order")
+    return key, task_id
+
+
+def apply_update(task: Task, task_update: TaskUpdate, now: datetime):
+    if task_update.title is not None:
+        task.title = task_update.title
+    if task_update.description is not None:
+        task.description = task_update.description
+    if task_update.status is not None:
+        task.status = task_update.status
+    if task_update.priority is not None:
+        task.priority = task_update.priority
+    if task_update.tags is not None:
+        task.tags = task_update.tags
+    if task_update.due_date is not None:
+        task.due_date = task_update.due_date
+    
+    task.updated_at = now
+    task.version += 1
+
+
+def imported_task(item: TaskImport, now: datetime) -> Task:
+    # Task повторно проверил бы срок выполнения, поэтому собираем без валидации
+    return Task.model_construct(
+        id=item.id or uuid4(),
+        title=item.title,
+        description=item.description,
+        status=item.status,
+        priority=item.priority,
+        tags=item.tags,
+        due_date=item.due_date,
+        created_at=item.created_at or now,
+        updated_at=item.updated_at or now
+    )
+
+
+def group_size(group: List[Set[int]]) -> int:
+    # Верхняя граница: задача с несколькими тегами из группы считается несколько раз
+    return sum(len(ids) for ids in group)
+
+
+def estimated_matches(groups: List[List[Set[int]]], total: int) -> float:
+    # Оценка размера пересечения в предположении независимых фильтров
+    estimate = float(total)
+    for group in groups:
+        estimate *= min(group_size(group), total) / total
+    return estimate
+
+
+def group_member(groups: List[List[Set[int]]]) -> Callable[[int], bool]:
+    """Проверка "задача проходит все фильтры" без построения пересечения множеств."""
+    if all(len(group) == 1 for group in groups):
+        sets = [group[0] for group in groups]
+        if len(sets) == 1:
+            return sets[0].__contains__
+        return lambda task_id: all(task_id in ids for ids in sets)
+    return lambda task_id: all(any(task_id in ids for ids in group) for group in groups)
+
 
 class TaskDatabase:
-    def __init__(self):
-        self.tasks: Dict[UUID, Task] = {}
+    # Операции выполняются в памяти и не блокируют event loop
+    blocking = False
     
-    def get_tasks(self, skip: int = 0, limit: int = 100, sort_by: str = "created_at", order: str = "desc") -> List[Task]:
-        tasks = list(self.tasks.values())
+    def __init__(self, storage: Optional[MemoryStorage] = None, owner: Optional[str] = None):
+        # Задачи хранятся компактными записями, ключ - UUID.int
+        self.records: Dict[int, TaskRecord] = {}
+        # Вторичные индексы: код статуса / приоритет / тег -> множество id задач
+        self._by_status: Dict[int, Set[int]] = {code: set() for code in STATUS_CODES.values()}
+        self._by_priority: Dict[int, Set[int]] = {p.value: set() for p in TaskPriority}
+        self._by_tag: Dict[str, Set[int]] = {}
+        # Упорядоченные индексы для сортировки: (ключ, id) по каждому полю
+        self._sorted: Dict[str, SortedList] = {field: SortedList() for field in SORT_FIELDS}
+        # Полнотекстовый индекс для поиска
+        self._search = SearchIndex()
+        # Мин-куча (срок, id) открытых задач со сроком. Записи не удаляются
+        # при изменении задачи, а проверяются при извлечении; _due_stale
+        # считает устаревшие, чтобы вовремя пересобрать кучу
+        self._due_heap: List[Tuple[int, int]] = []
+        self._due_stale = 0
+        # Счетчики созданных и завершенных задач по часам для аналитики
+        self.activity = ActivityBuckets()
+        # Журнал изменений с номерами seq для дельта-синхронизации клиентов
+        self.changes = ChangeLog()
+        # Подписчики на события задач (created / completed), например геймификация
+        self.listeners: List[Callable[[Tuple], None]] = []
+        # Все события задач, включая удаленные, - из них восстанавливается XP
+        self.history = TaskHistory()
+        # Пользователь, которому принадлежат задачи (для событий)
+        self.owner = owner
         
-        if sort_by == "title":
-            tasks.sort(key=lambda x: x.title, reverse=(order == "desc"))
-        elif sort_by == "status":
-            tasks.sort(key=lambda x: x.status.value, reverse=(order == "desc"))
-        elif sort_by == "priority":
-            tasks.sort(key=lambda x: x.priority.value, reverse=(order == "desc"))
-        elif sort_by == "due_date":
-            tasks.sort(key=lambda x: x.due_date or date.max, reverse=(order == "desc"))
+        # Слой персистентности: по умолчанию данные живут только в памяти
+        self.storage = storage or MemoryStorage()
+        self._load()
+    
+    def __len__(self) -> int:
+        return len(self.records)
+    
+    def _load(self):
+        history = None
+        for data in self.storage.load():
+            if "events" in data:
+                history = data
+                continue
+            record = TaskRecord.from_dict(data)
+            self.records[record.id] = record
+        self._index_records(list(self.records.values()))
+        for record in self.records.values():
+            self.activity.add_created(record.created)
+            if record.status == COMPLETED_CODE:
+                self.activity.add_completed(record.updated or record.created, record.created)
+        if history is not None:
+            self.history.extend(history["events"])
+            # Награжденные задачи, которые сейчас не завершены, - открытые повторно
+            for task_id in history["rewarded"]:
+                record = self.records.get(UUID(task_id).int)
+                if record is not None and record.status != COMPLETED_CODE:
+                    self.history.reopened.add(record.id)
+        elif self.records:
+            # Данные без истории (до ее появления): события восстанавливаются по задачам
+            # и сразу пишутся в журнал
+            events = []
+            for record in self.records.values():
+                events.append(("created", record.created, record.priority))
+                if record.status == COMPLETED_CODE:
+                    events.append(("completed", record.updated or record.created, record.priority))
+            events.sort(key=lambda event: event[1])
+            self.history.extend(events)
+            self.storage.record_events(events)
+        if self.records:
+            self.changes.preloaded = True
+            logger.info("Tasks restored from storage: %s", len(self.records))
+    
+    def _track_activity(self, record: TaskRecord, old_status: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        # old_status=None - задача новая; время завершения - updated задачи.
+        # Возвращает события истории для записи в журнал вместе с задачей
+        events = []
+        if old_status is None:
+            self.activity.add_created(record.created)
+            events.append(("created", record.created, record.priority))
+        if record.status == COMPLETED_CODE and old_status != COMPLETED_CODE:
+            self.activity.add_completed(record.updated or record.created, record.created)
+            # XP за завершение - один раз на задачу, повторное завершение его не дает
+            if record.id in self.history.reopened:
+                self.history.reopened.discard(record.id)
+            else:
+                events.append(("completed", record.updated or record.created, record.priority))
+        elif old_status == COMPLETED_CODE and record.status != COMPLETED_CODE:
+            self.history.reopened.add(record.id)
+        for kind, at, priority in events:
+            self.history.add(kind, at, priority)
+            for listener in self.listeners:
+                listener((kind, self.owner, from_micros(at), priority))
+        return events
+    
+    def _forget(self, record: TaskRecord):
+        # История удаленной задачи остается, а пометка о повторном открытии больше не нужна
+        self.history.reopened.discard(record.id)
+    
+    def _maybe_snapshot(self):
+        if self.storage.needs_snapshot():
+            states: List[Any] = [record.state() for record in self.records.values()]
+            states.append(self.history.copy())
+            self.storage.snapshot(states, encode_state)
+    
+    def _persist_put(self, record: TaskRecord, events: Sequence[Tuple[str, int, int]] = ()):
+        self.storage.record_put(record.to_json(), events=events)
+        self._maybe_snapshot()
+    
+    def _persist_delete(self, task_id: UUID):
+        self.storage.record_delete(task_id)
+        self._maybe_snapshot()
+    
+    def close(self):
+        self.storage.close()
+    
+    def _index_record(self, record: TaskRecord):
+        self._by_status[record.status].add(record.id)
+        self._by_priority[record.priority].add(record.id)
+        for tag in record.tags:
+            self._by_tag.setdefault(tag, set()).add(record.id)
+        for field, entries in self._sorted.items():
+            entries.add((record.sort_key(field), record.id))
+        self._search.add(record)
+        if record.due is not None and record.status in OPEN_STATUS_CODES:
+            heapq.heappush(self._due_heap, (record.due, record.id))
+    
+    def _index_records(self, records: List[TaskRecord]):
+        # Пакетная вставка: сортированные индексы обновляются одним update()
+        for record in records:
+            self._by_status[record.status].add(record.id)
+            self._by_priority[record.priority].add(record.id)
+            for tag in record.tags:
+                self._by_tag.setdefault(tag, set()).add(record.id)
+            self._search.add(record)
+        for field, entries in self._sorted.items():
+            entries.update((record.sort_key(field), record.id) for record in records)
+        for record in records:
+            if record.due is not None and record.status in OPEN_STATUS_CODES:
+                heapq.heappush(self._due_heap, (record.due, record.id))
+    
+    def _unindex_record(self, record: TaskRecord):
+        self._by_status[record.status].discard(record.id)
+        self._by_priority[record.priority].discard(record.id)
+        for tag in record.tags:
+            ids = self._by_tag.get(tag)
+            if ids is not None:
+                ids.discard(record.id)
+                if not ids:
+                    del self._by_tag[tag]
+        for field, entries in self._sorted.items():
+            entries.discard((record.sort_key(field), record.id))
+        self._search.remove(record.id)
+        if record.due is not None and record.status in OPEN_STATUS_CODES:
+            self._due_stale += 1
+            if self._due_stale > len(self._due_heap) // 2 + 1024:
+                self._rebuild_due_heap()
+    
+    def _rebuild_due_heap(self):
+        self._due_heap = [
+            (record.due, record.id) for record in self.records.values()
+            if record.due is not None and record.status in OPEN_STATUS_CODES
+        ]
+        heapq.heapify(self._due_heap)
+        self._due_stale = 0
+    
+    def _filter_groups(
+        self,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[TaskPriority] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> Optional[List[List[Set[int]]]]:
+        # None означает "без фильтров" - подходят все задачи. Каждый фильтр - группа множеств
+        # индекса (задача подходит, если есть хотя бы в одном); множества не копируются
+        groups: List[List[Set[int]]] = []
+        if status is not None:
+            groups.append([self._by_status[STATUS_CODES[status]]])
+        if priority is not None:
+            groups.append([self._by_priority[priority.value]])
+        if tags:
+            # Задача подходит, если у нее есть хотя бы один из тегов
+            groups.append([self._by_tag[tag] for tag in set(tags) if tag in self._by_tag])
+        if not groups:
+            return None
+        # Первой идет самая маленькая группа: она дает кандидатов, остальные только проверяются
+        groups.sort(key=group_size)
+        return groups
+    
+    def _page_from_index(self, sort_by: str, desc: bool, after: Optional[Tuple], skip: int, limit: int) -> List[TaskRecord]:
+        entries = self._sorted[sort_by]
+        if desc:
+            end = entries.bisect_left(after) if after else len(entries)
+            end = max(0, end - skip)
+            page = entries.islice(max(0, end - limit), end, reverse=True)
+        else:
+            start = (entries.bisect_right(after) if after else 0) + skip
+            page = entries.islice(start, start + limit)
+        return [self.records[task_id] for _, task_id in page]
+    
+    def _page_from_ids(self, ids: Iterable[int], sort_by: str, desc: bool, after: Optional[Tuple], skip: int, limit: int) -> List[TaskRecord]:
+        entries = [(self.records[task_id].sort_key(sort_by), task_id) for task_id in ids]
+        if after:
+            entries = [e for e in entries if (e < after if desc else e > after)]
+        select = heapq.nlargest if desc else heapq.nsmallest
+        page = select(skip + limit, entries)[skip:]
+        return [self.records[task_id] for _, task_id in page]
+    
+    def query_records(
+        self,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[TaskPriority] = None,
+        tags: Optional[Iterable[str]] = None,
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        order: str = "desc",
+        cursor: Optional[str] = None
+    ) -> Tuple[List[TaskRecord], Optional[str]]:
+        if sort_by not in SORT_FIELDS:
+            sort_by = "created_at"
+        desc = order == "desc"
+        after = None
+        if cursor:
+            key, after_id = decode_cursor(cursor, sort_by, order)
+            after = (record_key(sort_by, key), after_id.int)
+        skip = max(skip, 0)
+        limit = max(limit, 0)
+        
+        groups = self._filter_groups(status, priority, tags)
+        if groups is None:
+            records = self._page_from_index(sort_by, desc, after, skip, limit)
+        elif not group_size(groups[0]):
+            records = []
+        elif estimated_matches(groups, len(self.records)) * 16 >= len(self.records):
+            # Фильтр пропускает большую часть задач - дешевле идти по индексу сортировки,
+            # проверяя принадлежность, чем пересекать множества
+            matches = group_member(groups)
+            records = []
+            for _, task_id in self._sorted[sort_by].irange(
+                minimum=None if desc else after,
+                maximum=after if desc else None,
+                inclusive=(False, False),
+                reverse=desc
+            ):
+                if matches(task_id):
+                    if skip:
+                        skip -= 1
+                        continue
+                    records.append(self.records[task_id])
+                    if len(records) >= limit:
+                        break
         else:
-            tasks.sort(key=lambda x: x.created_at or datetime.min, reverse=(order == "desc"))
+            # Кандидаты - самая маленькая группа, остальные фильтры проверяются по одной задаче
+            driver = groups[0][0] if len(groups[0]) == 1 else set().union(*groups[0])
+            if len(groups) > 1:
+                matches = group_member(groups[1:])
+                ids = (task_id for task_id in driver if matches(task_id))
+            else:
+                ids = driver
+            records = self._page_from_ids(ids, sort_by, desc, after, skip, limit)
         
-        return tasks[skip:skip + limit]
+        next_cursor = None
+        if records and len(records) >= limit:
+            last = records[-1]
+            next_cursor = encode_cursor(sort_by, order, public_key(sort_by, last.sort_key(sort_by)), last.uuid)
+        return records, next_cursor
+    
+    def query_tasks(
+        self,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[TaskPriority] = None,
+        tags: Optional[Iterable[str]] = None,
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        order: str = "desc",
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Task], Optional[str]]:
+        records, next_cursor = self.query_records(status, priority, tags, skip, limit, sort_by, order, cursor)
+        return [record.to_task() for record in records], next_cursor
+    
+    def query_json(
+        self,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[TaskPriority] = None,
+        tags: Optional[Iterable[str]] = None,
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        order: str = "desc",
+        cursor: Optional[str] = None
+    ) -> Tuple[List[bytes], Optional[str]]:
+        # То же, что query_tasks, но задачи отдаются готовыми JSON-фрагментами из кэша
+        records, next_cursor = self.query_records(status, priority, tags, skip, limit, sort_by, order, cursor)
+        return [record.encoded() for record in records], next_cursor
+    
+    def query_fields(
+        self,
+        fields: Tuple[str, ...],
+        rows: bool = False,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[TaskPriority] = None,
+        tags: Optional[Iterable[str]] = None,
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        order: str = "desc",
+        cursor: Optional[str] = None
+    ) -> Tuple[List[bytes], Optional[str]]:
+        # Только поля fields, закодированные прямо из записей; rows=True - массивы значений вместо объектов
+        records, next_cursor = self.query_records(status, priority, tags, skip, limit, sort_by, order, cursor)
+        return project_records(records, fields, rows), next_cursor
+    
+    def get_tasks(self, skip: int = 0, limit: int = 100, sort_by: str = "created_at", order: str = "desc") -> List[Task]:
+        tasks, _ = self.query_tasks(skip=skip, limit=limit, sort_by=sort_by, order=order)
+        return tasks
     
     def get_task(self, task_id: UUID) -> Optional[Task]:
-        return self.tasks.get(task_id)
+        record = self.records.get(task_id.int)
+        return record.to_task() if record else None
+    
+    def get_task_json(self, task_id: UUID) -> Optional[bytes]:
+        record = self.records.get(task_id.int)
+        return record.encoded() if record else None
     
     def create_task(self, task_create: TaskCreate) -> Task:
-        task_id = uuid4()
-        now = datetime.now()
-        
-        task = Task(
-            id=task_id,
-            title=task_create.title,
-            description=task_create.description,
-            status=task_create.status,
-            priority=task_create.priority,
-            tags=task_create.tags,
-            due_date=task_create.due_date,
-            created_at=now,
-            updated_at=now
-        )
+        record = TaskRecord.from_create(uuid4(), task_create, to_micros(datetime.now()))
         
-        self.tasks[task_id] = task
+        self.records[record.id] = record
+        self._index_record(record)
+        events = self._track_activity(record)
+        self.changes.record(record.id)
+        self._persist_put(record, events)
         
-        print(f"Task created: {task.title}")
+        logger.info("Task created: %s", record.title)
         
-        return task
+        return record.to_task()
     
-    def update_task(self, task_id: UUID, task_update: TaskUpdate) -> Optional[Task]:
-        if task_id not in self.tasks:
+    def update_task(self, task_id: UUID, task_update: TaskUpdate,
+                    expected_version: Optional[int] = None) -> Optional[Task]:
+        # expected_version - версия, которую видел клиент; если задача с тех пор менялась,
+        # изменение отклоняется (оптимистичная блокировка)
+        record = self.records.get(task_id.int)
+        if record is None:
             return None
+        if expected_version is not None and record.version != expected_version:
+            raise VersionConflictError(record.version)
         
-        task = self.tasks[task_id]
-        old_status = task.status
-        
-        if task_update.title is not None:
-            task.title = task_update.title
-        if task_update.description is not None:
-            task.description = task_update.description
-        if task_update.status is not None:
-            task.status = task_update.status
-        if task_update.priority is not None:
-            task.priority = task_update.priority
-        if task_update.tags is not None:
-            task.tags = task_update.tags
-        if task_update.due_date is not None:
-            task.due_date = task_update.due_date
+        old_status = record.status
+        self._unindex_record(record)
+        record.apply_update(task_update, to_micros(datetime.now()))
+        self._index_record(record)
+        events = self._track_activity(record, old_status)
+        self.changes.record(record.id)
+        self._persist_put(record, events)
         
-        task.updated_at = datetime.now()
-        
-        if task_update.status == TaskStatus.COMPLETED and old_status != TaskStatus.COMPLETED:
-            print(f"Task completed: {task.title}")
+        if record.status == COMPLETED_CODE and old_status != COMPLETED_CODE:
+            logger.info("Task completed: %s", record.title)
         else:
-            print(f"Task updated: {task.title}")
+            logger.info("Task updated: %s", record.title)
         
-        return task
+        return record.to_task()
     
     def delete_task(self, task_id: UUID) -> bool:
-        if task_id in self.tasks:
-            del self.tasks[task_id]
-            print(f"Task deleted: {task_id}")
-            return True
-        return False
+        record = self.records.pop(task_id.int, None)
+        if record is None:
+            return False
+        self._unindex_record(record)
+        self._forget(record)
+        self.changes.record(record.id, deleted=True)
+        self._persist_delete(task_id)
+        logger.info("Task deleted: %s", task_id)
+        return True
+    
+    def create_tasks(self, task_creates: List[TaskCreate]) -> List[Task]:
+        now = to_micros(datetime.now())
+        records = [TaskRecord.from_create(uuid4(), task_create, now) for task_create in task_creates]
+        for record in records:
+            self.records[record.id] = record
+            events = self._track_activity(record)
+            self.changes.record(record.id)
+            self.storage.record_put(record.to_json(), events=events)
+        self._index_records(records)
+        self._maybe_snapshot()
+        
+        logger.info("Tasks created in bulk: %s", len(records))
+        return [record.to_task() for record in records]
+    
+    def update_tasks(self, updates: List[Tuple[UUID, TaskUpdate]]) -> List[Optional[Task]]:
+        now = to_micros(datetime.now())
+        results: List[Optional[Task]] = []
+        for task_id, task_update in updates:
+            record = self.records.get(task_id.int)
+            if record is None:
+                results.append(None)
+                continue
+            old_status = record.status
+            self._unindex_record(record)
+            record.apply_update(task_update, now)
+            self._index_record(record)
+            events = self._track_activity(record, old_status)
+            self.changes.record(record.id)
+            self.storage.record_put(record.to_json(), events=events)
+            results.append(record.to_task())
+        self._maybe_snapshot()
+        
+        logger.info("Tasks updated in bulk: %s", sum(1 for t in results if t is not None))
+        return results
+    
+    def delete_tasks(self, task_ids: List[UUID]) -> List[bool]:
+        results: List[bool] = []
+        for task_id in task_ids:
+            record = self.records.pop(task_id.int, None)
+            if record is not None:
+                self._unindex_record(record)
+                self._forget(record)
+                self.changes.record(record.id, deleted=True)
+                self.storage.record_delete(task_id)
+            results.append(record is not None)
+        self._maybe_snapshot()
+        
+        logger.info("Tasks deleted in bulk: %s", sum(results))
+        return results
+    
+    def import_tasks(self, items: List[TaskImport]) -> List[Task]:
+        # Задачи с существующим id заменяются, остальные добавляются
+        now = to_micros(datetime.now())
+        records = {}
+        for item in items:
+            record = TaskRecord.from_import(item.id or uuid4(), item, now)
+            records[record.id] = record
+        records = list(records.values())
+        for record in records:
+            existing = self.records.get(record.id)
+            if existing is not None:
+                self._unindex_record(existing)
+                record.version = existing.version + 1
+            events = self._track_activity(record, existing.status if existing is not None else None)
+            self.changes.record(record.id)
+            self.records[record.id] = record
+            self.storage.record_put(record.to_json(), events=events)
+        self._index_records(records)
+        self._maybe_snapshot()
+        
+        logger.info("Tasks imported: %s", len(records))
+        return [record.to_task() for record in records]
+    
+    def mark_overdue(self, today: date) -> List[Task]:
+        # Извлекаем из кучи только задачи, срок которых уже прошел;
+        # стоимость зависит от числа изменившихся задач, а не от размера хранилища
+        cutoff = today.toordinal()
+        now = to_micros(datetime.now())
+        update = TaskUpdate(status=TaskStatus.OVERDUE)
+        changed: List[TaskRecord] = []
+        while self._due_heap and self._due_heap[0][0] < cutoff:
+            due, task_id = heapq.heappop(self._due_heap)
+            record = self.records.get(task_id)
+            if record is None or record.due != due or record.status not in OPEN_STATUS_CODES:
+                self._due_stale = max(0, self._due_stale - 1)
+                continue
+            self._unindex_record(record)
+            # Эта запись уже извлечена из кучи и устаревшей не считается
+            self._due_stale = max(0, self._due_stale - 1)
+            record.apply_update(update, now)
+            self._index_record(record)
+            self.changes.record(record.id)
+            self.storage.record_put(record.to_json())
+            changed.append(record)
+        if changed:
+            self._maybe_snapshot()
+            logger.info("Tasks marked overdue: %s", len(changed))
+        return [record.to_task() for record in changed]
+    
+    def last_change_seq(self) -> int:
+        return self.changes.last_seq
+    
+    def generation(self) -> int:
+        # Поколение хранилища меняется при каждой записи: это seq последнего изменения.
+        # Совпадение поколения означает, что любой список задач остался прежним
+        return self.changes.last_seq
+    
+    def get_task_version(self, task_id: UUID) -> Optional[int]:
+        record = self.records.get(task_id.int)
+        return record.version if record else None
+    
+    def get_changes(self, since: int, limit: int = 1000) -> Tuple[List[bytes], int, bool]:
+        # -> (изменения в виде JSON, курсор для следующего запроса, нужна ли полная синхронизация)
+        if self.changes.needs_resync(since):
+            return [], self.changes.last_seq, True
+        entries, cursor = self.changes.since(since, limit)
+        fragments = []
+        for seq, task_id, deleted in entries:
+            record = None if deleted else self.records.get(task_id)
+            if record is None:
+                fragments.append(encode_delete(seq, str(UUID(int=task_id))))
+            else:
+                fragments.append(encode_put(seq, record.encoded()))
+        return fragments, cursor, False
+    
+    def get_activity(self) -> ActivityBuckets:
+        return self.activity
+    
+    def task_history(self) -> List[Tuple]:
+        # События задач в порядке времени - для подписчиков, подключившихся после загрузки
+        return [(kind, self.owner, from_micros(at), priority) for kind, at, priority in self.history.events()]
     
     def get_task_stats(self) -> Dict[str, Any]:
-        tasks = self.get_tasks()
-        total = len(tasks)
-        completed = len([t for t in tasks if t.status == TaskStatus.COMPLETED])
-        in_progress = len([t for t in tasks if t.status == TaskStatus.IN_PROGRESS])
-        overdue = len([t for t in tasks if t.status == TaskStatus.OVERDUE])
+        # Размеры индексов поддерживаются при каждой записи, поэтому подсчет O(1)
+        total = len(self.records)
+        completed = len(self._by_status[STATUS_CODES[TaskStatus.COMPLETED]])
+        in_progress = len(self._by_status[STATUS_CODES[TaskStatus.IN_PROGRESS]])
+        overdue = len(self._by_status[STATUS_CODES[TaskStatus.OVERDUE]])
         
         return {
             "total": total,
             "completed": completed,
             "in_progress": in_progress,
             "overdue": overdue,
-            "completion_rate": (completed / total * 100) if total > 0 else 0
+            "completion_rate": (completed / total * 100) if total > 0 else 0,
+            "by_status": {s.value: len(self._by_status[code]) for s, code in STATUS_CODES.items()},
+            "by_priority": {p.name.lower(): len(self._by_priority[p.value]) for p in TaskPriority}
         }
     
     def search_tasks(self, query: str, limit: int = 50) -> List[Task]:
-        query_lower = query.lower()
-        matching_tasks = []
-        
-        for task in self.tasks.values():
-            if (query_lower in task.title.lower() or 
-                query_lower in task.description.lower() or
-                any(query_lower in tag.lower() for tag in task.tags)):
-                matching_tasks.append(task)
-                if len(matching_tasks) >= limit:
-                    break
-        
-        return matching_tasks
+        return [self.records[task_id].to_task() for task_id in self._search.search(query, limit)]
+    
+    def _tasks_by_created(self, ids: Set[int]) -> List[Task]:
+        records = sorted((self.records[task_id] for task_id in ids), key=lambda r: (r.created, r.id))
+        return [record.to_task() for record in records]
     
     def get_tasks_by_status(self, status_value: str) -> List[Task]:
         try:
             status = TaskStatus(status_value)
-            return [t for t in self.tasks.values() if t.status == status]
         except ValueError:
             return []
+        return self._tasks_by_created(self._by_status[STATUS_CODES[status]])
+    
+    def get_tasks_by_priority(self, priority_value: int) -> List[Task]:
+        try:
+            priority = TaskPriority(priority_value)
+        except ValueError:
+            return []
+        return self._tasks_by_created(self._by_priority[priority.value])
+
+
+class PartitionedTaskDatabase:
+    """
+    Задачи в памяти, разделенные по владельцам.
+
+    У каждого пользователя свой TaskDatabase со своими индексами, счетчиками
+    и журналом изменений, поэтому списки, поиск и статистика стоят столько,
+    сколько задач у запрашивающего пользователя. Блокировки не нужны:
+    операции в памяти выполняются в event loop по одной.
+    """
+
+    blocking = False
+
+    def __init__(self, storage: Optional[MemoryStorage] = None):
+        # Общее хранилище (журнал и снимок) на всех пользователей
+        self.storage = storage or MemoryStorage()
+        self.partitions: Dict[str, TaskDatabase] = {}
+        # Общий список подписчиков на события задач всех пользователей
+        self.listeners: List[Callable[[Tuple], None]] = []
+
+        loaded: Dict[str, List[Dict[str, Any]]] = {}
+        for data in self.storage.load():
+            loaded.setdefault(data.pop("owner", DEFAULT_USER), []).append(data)
+        for user, tasks in loaded.items():
+            self._open(user, tasks)
+
+    def __len__(self) -> int:
+        return sum(len(partition) for partition in self.partitions.values())
+
+    def _open(self, user: str, tasks: List[Dict[str, Any]]) -> TaskDatabase:
+        # Задачи пользователя по умолчанию пишутся без владельца - как до разделения
+        owner = None if user == DEFAULT_USER else user
+        partition = TaskDatabase(PartitionStorage(self.storage, owner, tasks, self._snapshot), owner=user)
+        partition.listeners = self.listeners
+        self.partitions[user] = partition
+        return partition
+
+    def for_user(self, user: str) -> TaskDatabase:
+        partition = self.partitions.get(user)
+        if partition is None:
+            partition = self._open(user, [])
+        return partition
+
+    def _snapshot(self):
+        # Копии полей снимаются сейчас, а кодируются в потоке снимка
+        items: List[Tuple[str, Any]] = [
+            (user, record.state()) for user, partition in self.partitions.items()
+            for record in partition.records.values()
+        ]
+        items.extend((user, partition.history.copy()) for user, partition in self.partitions.items())
+        self.storage.snapshot(items, _encode_owned)
+
+    def count_tasks(self) -> int:
+        return len(self)
+
+    def users(self) -> List[str]:
+        return list(self.partitions)
+
+    def partition_versions(self, users: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        # Версия раздела меняется при каждой записи в него
+        users = self.partitions if users is None else users
+        return {user: self.partitions[user].changes.last_seq for user in users if user in self.partitions}
+
+    def mark_overdue(self, today: date) -> List[Task]:
+        changed: List[Task] = []
+        for partition in list(self.partitions.values()):
+            changed.extend(partition.mark_overdue(today))
+        return changed
+
+    def task_history(self) -> List[Tuple]:
+        events: List[Tuple] = []
+        for partition in self.partitions.values():
+            events.extend(partition.task_history())
+        return events
+
+    def close(self):
+        self.storage.close()
+
+
+def encode_state(state) -> bytes:
+    # Строка снимка: поля задачи или история событий владельца
+    if isinstance(state, TaskHistory):
+        return state.to_json()
+    return TaskRecord.state_to_json(state)
+
+
+def _encode_owned(item: Tuple[str, Any]) -> bytes:
+    # Строка снимка с ключом "owner", если владелец не пользователь по умолчанию
+    user, state = item
+    line = encode_state(state)
+    if user == DEFAULT_USER:
+        return line
+    return b'{"owner":"' + user.encode("ascii") + b'",' + line[1:]
+
+
+def create_task_database():
+    # TASK_DB_BACKEND=sqlite хранит задачи в файле TASK_DB_PATH
+    if os.getenv("TASK_DB_BACKEND", "memory") == "sqlite":
+        from app.sqlite_database import PartitionedSQLiteTaskDatabase
+        return PartitionedSQLiteTaskDatabase(os.getenv("TASK_DB_PATH", "tasks.db"))
+    
+    # TASK_DATA_DIR включает журнал и снимки; без него хранилище только в памяти
+    data_dir = os.getenv("TASK_DATA_DIR")
+    if data_dir:
+        storage = LogStorage(
+            data_dir,
+            fsync_interval=float(os.getenv("TASK_FSYNC_INTERVAL", "0.05")),
+            snapshot_every=int(os.getenv("TASK_SNAPSHOT_EVERY", "100000"))
+        )
+        return PartitionedTaskDatabase(storage=storage)
+    return PartitionedTaskDatabase()
 
 # Глобальный экземпляр базы данных
 task_db = TaskDatabase()
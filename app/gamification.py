@@ -0,0 +1,355 @@
+import asyncio
+from collections import deque
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+from starlette.concurrency import run_in_threadpool
+
+from app.auth import DEFAULT_USER
+from app.logger import logger
+
+# Событие задачи: (вид - "created" / "completed", пользователь, время, приоритет)
+TaskEvent = Tuple[str, Optional[str], datetime, int]
+
+XP_PER_LEVEL = 250
+XP_CREATED = 10
+# За завершение: база плюс надбавка за приоритет (1-5)
+XP_COMPLETED = 20
+XP_PER_PRIORITY = 5
+RANK_TITLES = ((1, "Novice"), (3, "Apprentice"), (5, "Expert"), (10, "Master"), (20, "Grandmaster"))
+
+
+class Achievement:
+    __slots__ = ("id", "title", "description", "xp", "metric", "target")
+
+    def __init__(self, achievement_id: str, title: str, description: str, xp: int, metric: str, target: int):
+        self.id = achievement_id
+        self.title = title
+        self.description = description
+        self.xp = xp
+        # Имя счетчика Player, с которым сравнивается target
+        self.metric = metric
+        self.target = target
+
+
+ACHIEVEMENTS = (
+    Achievement("first-task", "Первая задача", "Создайте свою первую задачу", 50, "created", 1),
+    Achievement("productivity", "Продуктивность", "Завершите 5 задач за один день", 100, "day_completed", 5),
+    Achievement("task-master", "Мастер задач", "Создайте 10 задач в приложении", 150, "created", 10),
+    Achievement("speed-demon", "Скорость", "Завершите 3 задачи за один час", 100, "hour_completed", 3),
+    Achievement("consistency", "Постоянство", "Используйте приложение 7 дней подряд", 200, "streak", 7),
+)
+# Счетчик -> достижения, которые от него зависят: событие проверяет только их
+ACHIEVEMENTS_BY_METRIC: Dict[str, List[Achievement]] = {}
+for _achievement in ACHIEVEMENTS:
+    ACHIEVEMENTS_BY_METRIC.setdefault(_achievement.metric, []).append(_achievement)
+
+DAILY_CHALLENGE_TARGET = 5
+DAILY_CHALLENGE_XP = 75
+WEEKEND_CHALLENGE_TARGET = 3
+WEEKEND_CHALLENGE_XP = 100
+
+
+class Player:
+    """Счетчики одного пользователя; каждое событие меняет их за O(1)."""
+
+    __slots__ = (
+        "user", "xp", "created", "completed", "streak", "last_active",
+        "day", "day_completed", "recent_completions", "week", "weekend_created", "achievements"
+    )
+
+    def __init__(self, user: str):
+        self.user = user
+        self.xp = 0
+        self.created = 0
+        self.completed = 0
+        # Дней активности подряд, заканчивая last_active
+        self.streak = 0
+        self.last_active: Optional[date] = None
+        # Завершено за день day
+        self.day: Optional[date] = None
+        self.day_completed = 0
+        # Время трех последних завершений - для "трех задач за час"
+        self.recent_completions: Deque[datetime] = deque(maxlen=3)
+        # Создано в выходные недели week (понедельник)
+        self.week: Optional[date] = None
+        self.weekend_created = 0
+        self.achievements: Dict[str, datetime] = {}
+
+    @property
+    def level(self) -> int:
+        return self.xp // XP_PER_LEVEL + 1
+
+    @property
+    def hour_completed(self) -> int:
+        # Сколько из последних завершений уложились в час до самого нового
+        if not self.recent_completions:
+            return 0
+        latest = self.recent_completions[-1]
+        return sum(1 for at in self.recent_completions if latest - at <= timedelta(hours=1))
+
+
+def _streak(player: Player, today: date) -> int:
+    # Серия прервана, если последняя активность была раньше вчерашнего дня
+    if player.last_active is None or player.last_active < today - timedelta(days=1):
+        return 0
+    return player.streak
+
+
+def _rank_title(level: int) -> str:
+    title = RANK_TITLES[0][1]
+    for min_level, name in RANK_TITLES:
+        if level >= min_level:
+            title = name
+    return title
+
+
+class GamificationEngine:
+    """
+    XP, уровни, серии и достижения по событиям задач.
+
+    Каждое событие обновляет счетчики одного игрока и проверяет только
+    зависящие от них достижения. Таблица лидеров - SortedList по (-xp, user):
+    изменение XP - удаление и вставка за O(log n), топ-K - срез, место
+    пользователя - бинарный поиск.
+    """
+
+    def __init__(self, on_unlock: Optional[Callable[[str, Achievement], None]] = None):
+        self.players: Dict[str, Player] = {}
+        self.leaderboard = SortedList()
+        # Вызывается при получении достижения (уведомление пользователю)
+        self.on_unlock = on_unlock
+        self.notify = True
+
+    def _player(self, user: str) -> Player:
+        player = self.players.get(user)
+        if player is None:
+            player = self.players[user] = Player(user)
+            self.leaderboard.add((0, user))
+        return player
+
+    def _add_xp(self, player: Player, xp: int):
+        self.leaderboard.remove((-player.xp, player.user))
+        player.xp += xp
+        self.leaderboard.add((-player.xp, player.user))
+
+    def _check(self, player: Player, metric: str, at: datetime):
+        value = getattr(player, metric)
+        for achievement in ACHIEVEMENTS_BY_METRIC[metric]:
+            if value >= achievement.target and achievement.id not in player.achievements:
+                player.achievements[achievement.id] = at
+                self._add_xp(player, achievement.xp)
+                if self.notify and self.on_unlock is not None:
+                    self.on_unlock(player.user, achievement)
+
+    def _touch_day(self, player: Player, day: date):
+        # Серия: активность в день после предыдущего продолжает ее, пропуск - сбрасывает
+        if player.last_active is None or day > player.last_active + timedelta(days=1):
+            player.streak = 1
+        elif day == player.last_active + timedelta(days=1):
+            player.streak += 1
+        else:
+            return
+        player.last_active = day
+
+    def handle(self, event: TaskEvent):
+        kind, user, at, priority = event
+        player = self._player(user or DEFAULT_USER)
+        day = at.date()
+        self._touch_day(player, day)
+
+        if kind == "created":
+            player.created += 1
+            xp = XP_CREATED
+            if day.weekday() >= 5:
+                week = day - timedelta(days=day.weekday())
+                if player.week != week:
+                    player.week, player.weekend_created = week, 0
+                player.weekend_created += 1
+                if player.weekend_created == WEEKEND_CHALLENGE_TARGET:
+                    xp += WEEKEND_CHALLENGE_XP
+            self._add_xp(player, xp)
+            self._check(player, "created", at)
+        else:
+            player.completed += 1
+            if player.day != day:
+                player.day, player.day_completed = day, 0
+            player.day_completed += 1
+            player.recent_completions.append(at)
+            xp = XP_COMPLETED + XP_PER_PRIORITY * priority
+            if player.day_completed == DAILY_CHALLENGE_TARGET:
+                xp += DAILY_CHALLENGE_XP
+            self._add_xp(player, xp)
+            self._check(player, "day_completed", at)
+            self._check(player, "hour_completed", at)
+        self._check(player, "streak", at)
+
+    def rebuild(self, events: Iterable[TaskEvent]):
+        # Восстановление после запуска: события в порядке времени, без уведомлений
+        self.notify = False
+        try:
+            for event in events:
+                self.handle(event)
+        finally:
+            self.notify = True
+
+    # ------------------------------------------------------------------
+    # Ответы API
+    # ------------------------------------------------------------------
+
+    def position(self, user: str) -> Optional[int]:
+        player = self.players.get(user)
+        if player is None:
+            return None
+        return self.leaderboard.index((-player.xp, user)) + 1
+
+    def profile(self, user: str) -> Dict[str, Any]:
+        player = self.players.get(user) or Player(user)
+        return {
+            "user": user,
+            "level": player.level,
+            "xp": player.xp,
+            "xp_to_next_level": XP_PER_LEVEL - player.xp % XP_PER_LEVEL,
+            "total_achievements": len(ACHIEVEMENTS),
+            "unlocked_achievements": len(player.achievements),
+            "rank": _rank_title(player.level),
+            "leaderboard_position": self.position(user),
+            "daily_streak": _streak(player, date.today()),
+            "tasks_created": player.created,
+            "tasks_completed": player.completed
+        }
+
+    def achievements(self, user: str) -> List[Dict[str, Any]]:
+        player = self.players.get(user) or Player(user)
+        today = date.today()
+        current = {
+            "created": player.created,
+            "day_completed": player.day_completed if player.day == today else 0,
+            "hour_completed": player.hour_completed if player.recent_completions and
+                              datetime.now() - player.recent_completions[-1] <= timedelta(hours=1) else 0,
+            "streak": _streak(player, today)
+        }
+        result = []
+        for achievement in ACHIEVEMENTS:
+            unlocked_at = player.achievements.get(achievement.id)
+            progress = achievement.target if unlocked_at else min(current[achievement.metric], achievement.target)
+            if unlocked_at:
+                status = "Получено"
+            elif progress:
+                status = f"В процессе ({progress}/{achievement.target})"
+            else:
+                status = "Заблокировано"
+            result.append({
+                "id": achievement.id,
+                "title": achievement.title,
+                "description": achievement.description,
+                "reward": f"+{achievement.xp} XP",
+                "status": status,
+                "unlocked": unlocked_at is not None,
+                "unlocked_at": unlocked_at.isoformat() if unlocked_at else None,
+                "progress": progress,
+                "target": achievement.target
+            })
+        return result
+
+    def challenges(self, user: str) -> List[Dict[str, Any]]:
+        player = self.players.get(user) or Player(user)
+        today = date.today()
+        week = today - timedelta(days=today.weekday())
+        return [
+            {
+                "id": "daily-5",
+                "title": "Ежедневная пятерка",
+                "description": f"Завершите {DAILY_CHALLENGE_TARGET} задач сегодня",
+                "reward": f"+{DAILY_CHALLENGE_XP} XP",
+                "progress": min(player.day_completed if player.day == today else 0, DAILY_CHALLENGE_TARGET),
+                "target": DAILY_CHALLENGE_TARGET,
+                "expires": datetime.combine(today, time(23, 59, 59)).isoformat()
+            },
+            {
+                "id": "weekend-warrior",
+                "title": "Воитель выходных",
+                "description": f"Создайте {WEEKEND_CHALLENGE_TARGET} задачи в выходные",
+                "reward": f"+{WEEKEND_CHALLENGE_XP} XP",
+                "progress": min(player.weekend_created if player.week == week else 0, WEEKEND_CHALLENGE_TARGET),
+                "target": WEEKEND_CHALLENGE_TARGET,
+                "expires": datetime.combine(week + timedelta(days=6), time(23, 59, 59)).isoformat()
+            }
+        ]
+
+    def top(self, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        return [
+            {"rank": offset + i + 1, "user": user, "xp": -neg_xp, "level": -neg_xp // XP_PER_LEVEL + 1}
+            for i, (neg_xp, user) in enumerate(islice(self.leaderboard, offset, offset + limit))
+        ]
+
+
+class GamificationFeed:
+    """
+    Подача событий задач в GamificationEngine.
+
+    Хранилище в памяти вызывает движок напрямую при каждом событии, после
+    восстановления истории из задач. SQLite пишет события в таблицу
+    task_events раздела пользователя триггерами; каждый воркер читает ее по
+    seq, поэтому видит и события других воркеров. За проход читаются только
+    разделы, версия которых изменилась.
+    """
+
+    def __init__(self, task_db, engine: GamificationEngine, interval: float = 1.0):
+        self.task_db = task_db
+        self.engine = engine
+        self.interval = interval
+        # Курсор task_events и версия раздела по пользователям
+        self.since: Dict[str, int] = {}
+        self.versions: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _poll(self) -> int:
+        handled = 0
+        versions = await run_in_threadpool(self.task_db.partition_versions)
+        for user, version in versions.items():
+            if self.versions.get(user) == version:
+                continue
+            db = await run_in_threadpool(self.task_db.for_user, user)
+            events, self.since[user] = await run_in_threadpool(db.get_task_events, self.since.get(user, 0))
+            for event in events:
+                self.engine.handle(event)
+            handled += len(events)
+            # Неполная порция - раздел прочитан до версии, снятой перед чтением
+            if len(events) < 10000:
+                self.versions[user] = version
+        return handled
+
+    async def _run(self):
+        # Первый проход - догоняем историю, не рассылая уведомлений о старых достижениях
+        self.engine.notify = False
+        try:
+            while await self._poll():
+                pass
+        finally:
+            self.engine.notify = True
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._poll()
+            except Exception as e:
+                logger.error("Error reading task events: %s", e)
+
+    def start(self):
+        if not hasattr(self.task_db, "listeners"):
+            if self._task is None:
+                self._task = asyncio.get_running_loop().create_task(self._run())
+        elif self.engine.handle not in self.task_db.listeners:
+            self.engine.rebuild(self.task_db.task_history())
+            self.task_db.listeners.append(self.engine.handle)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
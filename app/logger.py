@@ -0,0 +1,188 @@
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import List, Optional
+
+# Тот же формат, что и в старом logs/task_manager.log
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+logger = logging.getLogger("task_manager")
+
+_STOP = object()
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler, который пишет пачку записей одним write и одним flush."""
+
+    def emit_batch(self, records: List[logging.LogRecord]):
+        data = "".join(self.format(record) + self.terminator for record in records)
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes > 0 and self.stream.tell() + len(data) > self.maxBytes:
+            self.doRollover()
+        self.stream.write(data)
+        self.stream.flush()
+
+
+class BackgroundLogWriter(threading.Thread):
+    """
+    Поток, который забирает записи из очереди и пишет их пачками.
+
+    Обработчики запросов только кладут запись в ограниченную очередь; если
+    очередь переполнена, запись отбрасывается (счетчик dropped), но запрос
+    никогда не ждет диска или консоли.
+    """
+
+    def __init__(self, file_handler: BatchRotatingFileHandler, console_handler: Optional[logging.Handler],
+                 max_queue: int = 10_000, batch_size: int = 512, flush_interval: float = 0.2):
+        super().__init__(name="log-writer", daemon=True)
+        self.file_handler = file_handler
+        self.console_handler = console_handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def put(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, batch: List[logging.LogRecord]):
+        try:
+            self.file_handler.emit_batch(batch)
+            if self.console_handler is not None:
+                for record in batch:
+                    if record.levelno >= self.console_handler.level:
+                        self.console_handler.handle(record)
+        except Exception:
+            self.file_handler.handleError(batch[0])
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            stop = record is _STOP
+            batch = [] if stop else [record]
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stop = True
+                    break
+                batch.append(record)
+            if batch:
+                self._write(batch)
+            if stop:
+                break
+            # Полная пачка - очередь не успеваем разбирать, пишем дальше без паузы;
+            # иначе даем накопиться следующей
+            if len(batch) < self.batch_size:
+                time.sleep(self.flush_interval)
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.join(timeout=5)
+        self.file_handler.close()
+
+
+class QueueLogHandler(logging.Handler):
+    """Передает записи в BackgroundLogWriter; сообщение форматируется уже в потоке записи."""
+
+    def __init__(self, writer: BackgroundLogWriter):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record: logging.LogRecord):
+        self.writer.put(record)
+
+
+def setup_logging(
+    path: Optional[str] = None,
+    level: Optional[str] = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5
+) -> BackgroundLogWriter:
+    # Настройки по умолчанию берутся из окружения: TASK_LOG_FILE, TASK_LOG_LEVEL,
+    # TASK_LOG_CONSOLE (уровень вывода в консоль, по умолчанию WARNING)
+    path = path or os.getenv("TASK_LOG_FILE", os.path.join("logs", "task_manager.log"))
+    if int(os.getenv("TASK_WORKERS", "1")) > 1:
+        # Воркеры (start.py --workers) ротировали бы общий файл независимо друг от друга
+        # и теряли записи - у каждого процесса свой файл: task_manager.<pid>.log
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{os.getpid()}{ext}"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = BatchRotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                            encoding="utf-8", delay=True)
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+    console_handler.setLevel(os.getenv("TASK_LOG_CONSOLE", "WARNING").upper())
+
+    writer = BackgroundLogWriter(file_handler, console_handler)
+    writer.start()
+
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueLogHandler):
+            logger.removeHandler(handler)
+            handler.writer.close()
+    logger.addHandler(QueueLogHandler(writer))
+    logger.setLevel((level or os.getenv("TASK_LOG_LEVEL", "INFO")).upper())
+    logger.propagate = False
+    return writer
+
+
+class RequestLogMiddleware:
+    """
+    ASGI-middleware журнала запросов: метод, путь, статус, длительность, пользователь.
+
+    Успешные запросы можно прореживать (sample_rate), ошибки пишутся всегда.
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            failed = status_code >= 400
+            if failed or self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+                info = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status_code": status_code,
+                    "duration": f"{time.perf_counter() - start:.3f}s",
+                    "user": scope.get("state", {}).get("user", "anonymous"),
+                    "timestamp": datetime.now().isoformat()
+                }
+                if failed:
+                    logger.warning("Request failed: %s", info)
+                else:
+                    logger.info("Request completed: %s", info)
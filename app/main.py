@@ -1,17 +1,34 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Response, Body, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import List, Optional, Dict, Any
-from datetime import datetime, date, timedelta
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
+import asyncio
 import uuid
+import json
+import zlib
 import sys
 import os
 
 # Добавляем корневую директорию в путь Python
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.models import Task, TaskCreate, TaskUpdate, TaskStatus, TaskPriority
-from app.database import TaskDatabase
+from pydantic import ValidationError
+
+from app.models import Task, TaskCreate, TaskUpdate, TaskBulkUpdate, TaskImport, TaskStatus, TaskPriority, NotificationMarkRead
+from app.database import TaskDatabase, VersionConflictError, COMPACT_FIELDS, parse_fields, create_task_database
+from app.auth import DEFAULT_USER, DEMO_TOKENS, load_tokens, bearer_token
+from app.logger import logger, setup_logging, RequestLogMiddleware
+from app.metrics import registry, timed, Gauge, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.scheduler import OverdueScheduler
+from app.analytics import productivity_report, task_report, productivity_insights
+from app.notifications import create_notification_store
+from app.gamification import GamificationEngine, GamificationFeed
+from app.push import EventBroker, ChangePump, fragment_seq, sse_frame, ws_message
+from app.profiling import SamplingProfiler, ProfilingMiddleware, profiled
+from app.storage import LogStorage, DurableWritesMiddleware
 
 app = FastAPI(
     title="Task Manager API - Full Version",
@@ -19,19 +36,175 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Журнал пишется фоновым потоком; TASK_LOG_SAMPLE прореживает успешные запросы
+log_writer = setup_logging()
+app.add_middleware(RequestLogMiddleware, sample_rate=float(os.getenv("TASK_LOG_SAMPLE", "1.0")))
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Profile-Id"],
+)
+
+# Токены доступа: TASK_API_TOKENS="токен:пользователь,..." плюс демо-токены.
+# Мобильный клиент без входа шлет "Bearer null" / "Bearer undefined", поэтому неизвестный
+# токен по умолчанию работает как запрос без токена; TASK_STRICT_AUTH=1 отвечает на него 401
+api_tokens = load_tokens()
+strict_auth = os.getenv("TASK_STRICT_AUTH", "0") == "1"
+
+def request_token(request: HTTPConnection) -> Optional[str]:
+    # EventSource и WebSocket в браузере не умеют задавать заголовки - для них токен в access_token
+    token = bearer_token(request.headers.get("authorization"))
+    if token is None:
+        token = request.query_params.get("access_token")
+    return token
+
+def get_current_user(request: HTTPConnection):
+    # Пользователь попадает и в журнал запросов; HTTPConnection - чтобы работало и для WebSocket
+    token = request_token(request)
+    if token is None:
+        user = DEFAULT_USER
+    else:
+        user = api_tokens.get(token)
+        if user is None and not strict_auth:
+            user = DEFAULT_USER
+        elif user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+    request.state.user = user
+    return user
+
+def is_admin_token(token: Optional[str]) -> bool:
+    # Отладка доступна только по токену администратора из TASK_API_TOKENS: запрос без токена
+    # и публичные демо-токены тоже работают от имени admin, но администратора не подтверждают
+    return token is not None and token not in DEMO_TOKENS and api_tokens.get(token) == DEFAULT_USER
+
+def is_admin(scope) -> bool:
+    return is_admin_token(request_token(HTTPConnection(scope)))
+
+# Профилирование отдельного запроса по ?profile=1 или X-Profile: 1 (только токен администратора).
+# Без флага middleware лишь проверяет его; TASK_PROFILING=0 убирает middleware совсем.
+# Профили хранятся в памяти процесса, и с несколькими воркерами /debug/profiles/{id}
+# попадал бы в чужой процесс, поэтому там профилирование по умолчанию выключено
+worker_mode = int(os.getenv("TASK_WORKERS", "1")) > 1
+profiler = SamplingProfiler(
+    interval=float(os.getenv("TASK_PROFILE_INTERVAL", "0.005")),
+    keep=int(os.getenv("TASK_PROFILE_KEEP", "50"))
+)
+if os.getenv("TASK_PROFILING", "0" if worker_mode else "1") != "0":
+    app.add_middleware(ProfilingMiddleware, profiler=profiler, authorize=is_admin)
+
+task_db = create_task_database()
+notification_store = create_notification_store()
+
+# Ответ на изменение уходит после fsync журнала (TASK_DATA_DIR); SQLite фиксирует запись сама
+durable_storages = [
+    storage for storage in (getattr(task_db, "storage", None), getattr(notification_store, "storage", None))
+    if isinstance(storage, LogStorage)
+]
+if durable_storages:
+    app.add_middleware(DurableWritesMiddleware, storages=durable_storages)
+overdue_scheduler = OverdueScheduler(task_db, interval=float(os.getenv("TASK_OVERDUE_INTERVAL", "60")))
+# Push-события: TASK_PUSH_QUEUE - сколько событий может ждать медленный клиент,
+# TASK_PUSH_INTERVAL - как часто журнал изменений переносится подписчикам
+push_broker = EventBroker(queue_size=int(os.getenv("TASK_PUSH_QUEUE", "256")))
+change_pump = ChangePump(task_db, push_broker, interval=float(os.getenv("TASK_PUSH_INTERVAL", "0.25")))
+
+async def notify_achievement(user: str, achievement):
+    try:
+        # Ключ достижения: при нескольких воркерах каждый получает его сам,
+        # а уведомление создается и отправляется один раз
+        notification = await run_notifications(
+            notification_store.add_notification, user, f"Достижение '{achievement.title}' получено!", "success",
+            key=f"achievement:{achievement.id}"
+        )
+        if notification is None:
+            return
+        push_broker.publish("notification", json.dumps(notification, ensure_ascii=False).encode("utf-8"), user=user)
+    except Exception as e:
+        logger.error("Error sending achievement notification: %s", e)
+
+# Геймификация считается по событиям задач; о новых достижениях пользователь получает уведомление
+gamification = GamificationEngine(
+    on_unlock=lambda user, achievement: asyncio.get_running_loop().create_task(notify_achievement(user, achievement))
 )
+gamification_feed = GamificationFeed(task_db, gamification)
+
+registry.register(Gauge("task_store_tasks", "Tasks in the store", lambda: len(task_db)))
+registry.register(Gauge("task_log_dropped_records", "Log records dropped because the log queue was full",
+                        lambda: log_writer.dropped))
+registry.register(Gauge("push_subscribers", "Connected push subscribers", lambda: len(push_broker.subscribers)))
+registry.register(Gauge("push_dropped_subscribers", "Push subscribers disconnected for falling behind",
+                        lambda: push_broker.dropped))
+
+@app.on_event("startup")
+async def start_overdue_scheduler():
+    overdue_scheduler.start()
+    change_pump.start()
+    gamification_feed.start()
+
+@app.on_event("shutdown")
+async def close_task_db():
+    await overdue_scheduler.stop()
+    await change_pump.stop()
+    await gamification_feed.stop()
+    task_db.close()
+    notification_store.close()
+    log_writer.close()
 
-# Упрощенная аутентификация
-def get_current_user():
-    return "admin"
+async def run_db(func, *args, **kwargs):
+    # Блокирующие бэкенды (SQLite) выполняем в пуле потоков, чтобы не останавливать event loop
+    if task_db.blocking:
+        # profiled: при профилировании запроса его работа в пуле потоков тоже попадает в отсчеты
+        return await run_in_threadpool(profiled(func), *args, **kwargs)
+    return func(*args, **kwargs)
 
-task_db = TaskDatabase()
+async def get_user_db(current_user: str = Depends(get_current_user)) -> TaskDatabase:
+    # Раздел хранилища пользователя: запросы видят и сканируют только его задачи
+    return await run_db(task_db.for_user, current_user)
+
+async def run_notifications(func, *args, **kwargs):
+    if notification_store.blocking:
+        return await run_in_threadpool(profiled(func), *args, **kwargs)
+    return func(*args, **kwargs)
+
+def json_response(body: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    # Тело уже закодировано хранилищем - отдаем как есть, без response_model
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def join_json(fragments: List[bytes]) -> bytes:
+    return b"[" + b",".join(fragments) + b"]"
+
+# Клиент хранит ответ, но перед использованием сверяет его с сервером по ETag
+CONDITIONAL_HEADERS = {"Cache-Control": "private, no-cache"}
+
+def task_etag(version: int) -> str:
+    return '"v%d"' % version
+
+def list_etag(user: str, generation: int, query: str) -> str:
+    # Список зависит от пользователя, параметров запроса и поколения хранилища
+    return '"g%x-%08x"' % (generation, zlib.crc32(f"{user}?{query}".encode("utf-8")))
+
+def parse_etags(header: str) -> List[str]:
+    # Список тегов через запятую; слабые (W/) сравниваются как сильные
+    return [tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()]
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return "*" in tags or etag in tags
+
+def not_modified(etag: str) -> Response:
+    # 304 без тела: ответ не сериализуется вовсе
+    return Response(status_code=304, headers={"ETag": etag, **CONDITIONAL_HEADERS})
 
 # ============================================================================
 # ROOT ENDPOINTS
@@ -68,6 +241,35 @@ async def health_check():
         }
     }
 
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    # Формат Prometheus; в режиме нескольких воркеров у каждого процесса свои счетчики.
+    # Размер хранилища SQLite пересчитывается в пуле потоков, гауге отдается готовое число
+    await run_db(task_db.count_tasks)
+    return Response(content=registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+def require_admin(request: Request) -> str:
+    if not is_admin_token(request_token(request)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+    request.state.user = DEFAULT_USER
+    return DEFAULT_USER
+
+@app.get("/debug/profiles", tags=["Health"])
+async def list_profiles(
+    limit: int = Query(10, ge=1, le=100),
+    current_user: str = Depends(require_admin)
+):
+    # Самые медленные из недавно профилированных запросов, со свернутыми стеками
+    return [profile.to_dict(profiler.interval) for profile in profiler.slowest(limit)]
+
+@app.get("/debug/profiles/{profile_id}", tags=["Health"])
+async def get_profile(profile_id: int, current_user: str = Depends(require_admin)):
+    # Свернутые стеки одного запроса: flamegraph.pl profile.txt > profile.svg
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=profile.collapsed(), media_type="text/plain")
+
 # ============================================================================
 # AUTHENTICATION
 # ============================================================================
@@ -88,130 +290,445 @@ async def login(username: str, password: str):
 @app.post("/tasks/", response_model=Task, status_code=201, tags=["Tasks"])
 async def create_task(
     task: TaskCreate,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
 ):
     try:
-        result = task_db.create_task(task)
-        print(f"Task created by {current_user}: {result.title}")
+        result = await run_db(db.create_task, task)
+        logger.info("Task created by %s: %s", current_user, result.title)
         return result
     except Exception as e:
-        print(f"Error creating task: {e}")
+        logger.error("Error creating task: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/tasks/", response_model=List[Task], tags=["Tasks"])
 async def get_tasks(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     status: Optional[TaskStatus] = None,
     priority: Optional[int] = None,
-    tags: Optional[List[str]] = None,
+    tags: Optional[List[str]] = Query(None),
     sort_by: str = "created_at",
     order: str = "desc",
-    current_user: str = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Поля задачи через запятую, например id,title,status"),
+    compact: bool = Query(False, description="Задачи массивами значений в порядке fields (по умолчанию - поля списка)"),
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
 ):
     try:
-        tasks = task_db.get_tasks(skip=skip, limit=limit, sort_by=sort_by, order=order)
+        # Поколение читается до запроса: если между ними была запись, ETag окажется
+        # старее ответа и следующий опрос просто получит 200
+        etag = list_etag(current_user, await run_db(db.generation), request.url.query)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
         
-        if status:
-            tasks = [t for t in tasks if t.status == status]
-        if priority:
-            tasks = [t for t in tasks if t.priority.value == priority]
-        if tags:
-            tasks = [t for t in tasks if any(tag in t.tags for tag in tags)]
+        filters = dict(
+            status=status,
+            priority=TaskPriority(priority) if priority else None,
+            tags=tags,
+            skip=skip,
+            limit=limit,
+            sort_by=sort_by,
+            order=order,
+            cursor=cursor
+        )
+        # Порядок, отличный от порядка создания, меряется отдельно: другой индекс или ORDER BY
+        op = "query" if sort_by == "created_at" else "sort"
+        if fields is None and not compact:
+            # Фильтры применяются по индексам до сортировки и пагинации;
+            # задачи приходят готовым JSON из кэша хранилища
+            fragments, next_cursor = await run_db(timed(op, db.query_json), **filters)
+            body = join_json(fragments)
+        else:
+            # Проекция: хранилище кодирует только запрошенные поля, без моделей и полного JSON
+            names = parse_fields(fields) if fields is not None else COMPACT_FIELDS
+            fragments, next_cursor = await run_db(timed(op, db.query_fields), names, compact, **filters)
+            body = join_json(fragments)
+            if compact:
+                body = b'{"fields":%s,"tasks":%s}' % (json.dumps(names).encode("ascii"), body)
+        headers = {"ETag": etag, **CONDITIONAL_HEADERS}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
         
-        print(f"Tasks retrieved by {current_user}: {len(tasks)} tasks")
-        return tasks
+        logger.info("Tasks retrieved by %s: %s tasks", current_user, len(fragments))
+        return json_response(body, headers)
+    except Exception as e:
+        logger.error("Error getting tasks: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/tasks/stats", tags=["Analytics"])
+async def get_task_stats(
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    try:
+        stats = await run_db(timed("stats", db.get_task_stats))
+        logger.info("Stats retrieved by %s", current_user)
+        return stats
+    except Exception as e:
+        logger.error("Error getting stats: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/tasks/search", response_model=List[Task], tags=["Tasks"])
+async def search_tasks(
+    query: str,
+    limit: int = 50,
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    try:
+        return await run_db(timed("search", db.search_tasks), query, limit)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/tasks/changes", tags=["Tasks"])
+async def get_task_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    # Дельта-синхронизация: клиент хранит last_seq и запрашивает только изменения после него.
+    # resync=true - журнал уже не содержит нужных изменений: клиент заново загружает
+    # /tasks/ и продолжает с полученного last_seq
+    try:
+        fragments, last_seq, resync = await run_db(db.get_changes, since, limit)
+        body = b'{"changes":%s,"last_seq":%d,"has_more":%s,"resync":%s}' % (
+            join_json(fragments),
+            last_seq,
+            b"true" if len(fragments) >= limit else b"false",
+            b"true" if resync else b"false"
+        )
+        logger.info("Changes retrieved by %s: %s since %s", current_user, len(fragments), since)
+        return json_response(body)
+    except Exception as e:
+        logger.error("Error getting changes: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ============================================================================
+# BULK OPERATIONS
+# ============================================================================
+
+MAX_BULK_SIZE = 1000
+
+def check_bulk_size(items: list):
+    if len(items) > MAX_BULK_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {MAX_BULK_SIZE} items")
+
+def bulk_error(index: int, error: str) -> Dict[str, Any]:
+    return {"index": index, "status": "error", "error": error}
+
+def validation_message(e: ValidationError) -> str:
+    messages = []
+    for err in e.errors():
+        loc = ".".join(str(p) for p in err["loc"])
+        messages.append(f"{loc}: {err['msg']}" if loc else err["msg"])
+    return "; ".join(messages)
+
+def bulk_response(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    failed = sum(1 for r in results if r["status"] == "error")
+    return {"succeeded": len(results) - failed, "failed": failed, "results": results}
+
+@app.post("/tasks/bulk", tags=["Tasks"])
+async def bulk_create_tasks(
+    items: List[Dict[str, Any]] = Body(...),
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    check_bulk_size(items)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    valid: List[Tuple[int, TaskCreate]] = []
+    # Валидируем всю пачку за один проход; ошибки не мешают остальным элементам
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, TaskCreate.model_validate(item)))
+        except ValidationError as e:
+            results[index] = bulk_error(index, validation_message(e))
+    
+    try:
+        created = await run_db(db.create_tasks, [task for _, task in valid])
+    except Exception as e:
+        logger.error("Error in bulk create: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    for (index, _), task in zip(valid, created):
+        results[index] = {"index": index, "status": "created", "id": str(task.id), "task": task}
+    
+    logger.info("Bulk create by %s: %s of %s", current_user, len(created), len(items))
+    return bulk_response(results)
+
+@app.patch("/tasks/bulk", tags=["Tasks"])
+async def bulk_update_tasks(
+    items: List[Dict[str, Any]] = Body(...),
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    check_bulk_size(items)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    valid: List[Tuple[int, TaskBulkUpdate]] = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, TaskBulkUpdate.model_validate(item)))
+        except ValidationError as e:
+            results[index] = bulk_error(index, validation_message(e))
+    
+    try:
+        updated = await run_db(db.update_tasks, [(item.id, item) for _, item in valid])
+    except Exception as e:
+        logger.error("Error in bulk update: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    for (index, item), task in zip(valid, updated):
+        if task is None:
+            results[index] = bulk_error(index, "Task not found")
+        else:
+            results[index] = {"index": index, "status": "updated", "id": str(item.id), "task": task}
+    
+    logger.info("Bulk update by %s: %s of %s", current_user, len(valid), len(items))
+    return bulk_response(results)
+
+@app.delete("/tasks/bulk", tags=["Tasks"])
+async def bulk_delete_tasks(
+    task_ids: List[str] = Body(...),
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    check_bulk_size(task_ids)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(task_ids)
+    valid: List[Tuple[int, uuid.UUID]] = []
+    for index, task_id in enumerate(task_ids):
+        try:
+            valid.append((index, uuid.UUID(task_id)))
+        except ValueError:
+            results[index] = bulk_error(index, "Invalid task ID format")
+    
+    try:
+        deleted = await run_db(db.delete_tasks, [task_uuid for _, task_uuid in valid])
     except Exception as e:
-        print(f"Error getting tasks: {e}")
+        logger.error("Error in bulk delete: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
+    for (index, task_uuid), ok in zip(valid, deleted):
+        if ok:
+            results[index] = {"index": index, "status": "deleted", "id": str(task_uuid)}
+        else:
+            results[index] = bulk_error(index, "Task not found")
+    
+    logger.info("Bulk delete by %s: %s of %s", current_user, sum(deleted), len(task_ids))
+    return bulk_response(results)
+
+# ============================================================================
+# EXPORT / IMPORT (NDJSON)
+# ============================================================================
+
+EXPORT_CHUNK_SIZE = 1000
+IMPORT_CHUNK_SIZE = 500
+MAX_IMPORT_LINE = 64 * 1024
+MAX_IMPORT_ERRORS = 100
+
+@app.get("/tasks/export", tags=["Tasks"])
+async def export_tasks(
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    async def stream():
+        # Идем по индексу created_at курсором: в памяти только одна порция задач
+        cursor = None
+        exported = 0
+        while True:
+            tasks, cursor = await run_db(
+                db.query_tasks,
+                limit=EXPORT_CHUNK_SIZE,
+                sort_by="created_at",
+                order="asc",
+                cursor=cursor
+            )
+            if tasks:
+                exported += len(tasks)
+                yield "".join(task.model_dump_json() + "\n" for task in tasks).encode("utf-8")
+            if not cursor:
+                break
+        logger.info("Tasks exported by %s: %s", current_user, exported)
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/tasks/import", tags=["Tasks"])
+async def import_tasks(
+    request: Request,
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    imported = 0
+    failed = 0
+    errors: List[Dict[str, Any]] = []
+    batch: List[TaskImport] = []
+    buffer = b""
+    line_number = 0
+    
+    def parse_line(raw: bytes):
+        nonlocal failed
+        if not raw.strip():
+            return
+        try:
+            batch.append(TaskImport.model_validate_json(raw))
+        except ValidationError as e:
+            failed += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": line_number, "error": validation_message(e)})
+    
+    async def flush():
+        nonlocal imported, batch
+        if batch:
+            # Следующая порция тела читается только после записи текущей
+            imported += len(await run_db(db.import_tasks, batch))
+            batch = []
+    
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            if len(buffer) > MAX_IMPORT_LINE:
+                raise HTTPException(status_code=413, detail=f"Line {line_number + 1} is too long")
+            for raw in lines:
+                line_number += 1
+                parse_line(raw)
+                if len(batch) >= IMPORT_CHUNK_SIZE:
+                    await flush()
+        line_number += 1
+        parse_line(buffer)
+        await flush()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error importing tasks: %s", e)
+        raise HTTPException(status_code=400, detail=f"Import stopped after {imported} tasks: {e}")
+    
+    logger.info("Tasks imported by %s: %s, failed: %s", current_user, imported, failed)
+    return {"imported": imported, "failed": failed, "errors": errors}
 
 @app.get("/tasks/{task_id}", response_model=Task, tags=["Tasks"])
 async def get_task(
     task_id: str,
-    current_user: str = Depends(get_current_user)
+    request: Request,
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
 ):
     try:
         from uuid import UUID
         task_uuid = UUID(task_id)
-        task = task_db.get_task(task_uuid)
-        if not task:
+        # Для 304 достаточно версии задачи, JSON не собирается
+        version = await run_db(db.get_task_version, task_uuid)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        etag = task_etag(version)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag)
+        body = await run_db(db.get_task_json, task_uuid)
+        if body is None:
             raise HTTPException(status_code=404, detail="Task not found")
-        print(f"Task retrieved by {current_user}: {task.title}")
-        return task
+        logger.info("Task retrieved by %s: %s", current_user, task_id)
+        return json_response(body, {"ETag": etag, **CONDITIONAL_HEADERS})
+    except HTTPException:
+        raise
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid task ID format")
     except Exception as e:
-        print(f"Error getting task: {e}")
+        logger.error("Error getting task: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
+async def if_match_version(header: Optional[str], db: TaskDatabase, task_uuid: uuid.UUID) -> Optional[int]:
+    # If-Match -> версия, которую хранилище сверит атомарно с записью; None - без проверки
+    if not header:
+        return None
+    tags = parse_etags(header)
+    current = await run_db(db.get_task_version, task_uuid)
+    if current is None:
+        # По RFC 9110 условие ложно, если ресурса нет
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Task not found")
+    if "*" in tags:
+        return None
+    if task_etag(current) not in tags:
+        raise VersionConflictError(current)
+    # Совпавшая версия передается в хранилище: изменение между проверкой и записью тоже даст 412
+    return current
+
 @app.put("/tasks/{task_id}", response_model=Task, tags=["Tasks"])
 async def update_task(
     task_id: str,
     task_update: TaskUpdate,
-    current_user: str = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
 ):
     try:
         from uuid import UUID
         task_uuid = UUID(task_id)
-        result = task_db.update_task(task_uuid, task_update)
+        expected_version = await if_match_version(request.headers.get("if-match"), db, task_uuid)
+        result = await run_db(db.update_task, task_uuid, task_update, expected_version)
         if not result:
             raise HTTPException(status_code=404, detail="Task not found")
-        print(f"Task updated by {current_user}: {result.title}")
+        logger.info("Task updated by %s: %s", current_user, result.title)
+        response.headers["ETag"] = task_etag(result.version)
         return result
+    except VersionConflictError as e:
+        logger.info("Stale update rejected for %s: %s", current_user, task_id)
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Task was modified by another request",
+            headers={"ETag": task_etag(e.current_version)}
+        )
+    except HTTPException:
+        raise
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid task ID format")
     except Exception as e:
-        print(f"Error updating task: {e}")
+        logger.error("Error updating task: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/tasks/{task_id}", status_code=204, tags=["Tasks"])
 async def delete_task(
     task_id: str,
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
 ):
     try:
         from uuid import UUID
         task_uuid = UUID(task_id)
-        if not task_db.delete_task(task_uuid):
+        if not await run_db(db.delete_task, task_uuid):
             raise HTTPException(status_code=404, detail="Task not found")
-        print(f"Task deleted by {current_user}: {task_id}")
+        logger.info("Task deleted by %s: %s", current_user, task_id)
         return None
+    except HTTPException:
+        raise
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid task ID format")
     except Exception as e:
-        print(f"Error deleting task: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
-
-@app.get("/tasks/stats", tags=["Analytics"])
-async def get_task_stats(current_user: str = Depends(get_current_user)):
-    try:
-        stats = task_db.get_task_stats()
-        print(f"Stats retrieved by {current_user}")
-        return stats
-    except Exception as e:
-        print(f"Error getting stats: {e}")
-        raise HTTPException(status_code=400, detail=str(e))
-
-@app.get("/tasks/search", response_model=List[Task], tags=["Tasks"])
-async def search_tasks(query: str, limit: int = 50, current_user: str = Depends(get_current_user)):
-    try:
-        return task_db.search_tasks(query, limit)
-    except Exception as e:
+        logger.error("Error deleting task: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/tasks/status/{status}", response_model=List[Task], tags=["Tasks"])
-async def get_tasks_by_status(status: TaskStatus, current_user: str = Depends(get_current_user)):
+async def get_tasks_by_status(
+    status: TaskStatus,
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
     try:
-        return task_db.get_tasks_by_status(status.value)
+        return await run_db(timed("sort", db.get_tasks_by_status), status.value)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/tasks/priority/{priority}", response_model=List[Task], tags=["Tasks"])
-async def get_tasks_by_priority(priority: int, current_user: str = Depends(get_current_user)):
+async def get_tasks_by_priority(
+    priority: int,
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
     try:
         if priority < 1 or priority > 5:
             raise HTTPException(status_code=400, detail="Priority must be between 1 and 5")
-        return [t for t in task_db.get_tasks() if t.priority.value == priority]
+        return await run_db(timed("sort", db.get_tasks_by_priority), priority)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -226,16 +743,17 @@ async def ai_assist(
 ):
     try:
         response = f"AI Assistant: I understand you said '{message}'. How can I help you with your tasks?"
-        print(f"AI assistance requested by {current_user}: {message}")
+        logger.info("AI assistance requested by %s: %s", current_user, message)
         return {"response": response, "user": current_user}
     except Exception as e:
-        print(f"Error in AI assistant: {e}")
+        logger.error("Error in AI assistant: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/ai/create-task", tags=["AI Assistant"])
 async def ai_create_task(
     request: Dict[str, Any],
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
 ):
     try:
         title = request.get("title", "AI Generated Task")
@@ -249,11 +767,11 @@ async def ai_create_task(
             tags=["ai-generated"]
         )
         
-        result = task_db.create_task(task_data)
-        print(f"AI created task for {current_user}: {result.title}")
+        result = await run_db(db.create_task, task_data)
+        logger.info("AI created task for %s: %s", current_user, result.title)
         return result
     except Exception as e:
-        print(f"Error in AI task creation: {e}")
+        logger.error("Error in AI task creation: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/ai/subtasks", tags=["AI Assistant"])
@@ -271,28 +789,27 @@ async def ai_create_subtasks(
             {"title": "Завершение и документация", "description": f"Документирование: {main_task}"}
         ]
         
-        print(f"AI created subtasks for {current_user}: {main_task}")
+        logger.info("AI created subtasks for %s: %s", current_user, main_task)
         return {"subtasks": subtasks, "main_task": main_task}
     except Exception as e:
-        print(f"Error in AI subtasks creation: {e}")
+        logger.error("Error in AI subtasks creation: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/ai/productivity-analysis", tags=["AI Assistant"])
 async def ai_productivity_analysis(
-    current_user: str = Depends(get_current_user)
+    days: int = Query(30, ge=1, le=3660),
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
 ):
     try:
-        insights = {
-            "productivity_score": 75,
-            "best_work_time": "10:00 - 14:00",
-            "recommendations": "Попробуйте работать в утренние часы для лучшей продуктивности",
-            "daily_average": "В среднем вы завершаете 3 задачи в день"
-        }
+        activity = await run_db(db.get_activity)
+        stats = await run_db(db.get_task_stats)
+        insights = productivity_insights(activity, stats, days)
         
-        print(f"AI productivity analysis for {current_user}")
+        logger.info("AI productivity analysis for %s", current_user)
         return insights
     except Exception as e:
-        print(f"Error in AI productivity analysis: {e}")
+        logger.error("Error in AI productivity analysis: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 # ============================================================================
@@ -302,102 +819,31 @@ async def ai_productivity_analysis(
 @app.get("/gamification/profile", tags=["Gamification"])
 async def get_gamification_profile(current_user: str = Depends(get_current_user)):
     try:
-        profile = {
-            "user": current_user,
-            "level": 5,
-            "xp": 1250,
-            "xp_to_next_level": 250,
-            "total_achievements": 8,
-            "unlocked_achievements": 5,
-            "rank": "Expert",
-            "daily_streak": 7
-        }
-        print(f"Gamification profile retrieved for {current_user}")
+        profile = gamification.profile(current_user)
+        logger.info("Gamification profile retrieved for %s", current_user)
         return profile
     except Exception as e:
-        print(f"Error getting gamification profile: {e}")
+        logger.error("Error getting gamification profile: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/gamification/achievements", tags=["Gamification"])
 async def get_achievements(current_user: str = Depends(get_current_user)):
     try:
-        achievements = [
-            {
-                "id": "first-task",
-                "title": "Первая задача",
-                "description": "Создайте свою первую задачу",
-                "reward": "+50 XP",
-                "status": "Получено",
-                "unlocked": True
-            },
-            {
-                "id": "productivity",
-                "title": "Продуктивность",
-                "description": "Завершите 5 задач за один день",
-                "reward": "+100 XP",
-                "status": "В процессе (3/5)",
-                "unlocked": False
-            },
-            {
-                "id": "task-master",
-                "title": "Мастер задач",
-                "description": "Создайте 10 задач в приложении",
-                "reward": "+150 XP",
-                "status": "В процессе (7/10)",
-                "unlocked": False
-            },
-            {
-                "id": "speed-demon",
-                "title": "Скорость",
-                "description": "Завершите 3 задачи за один час",
-                "reward": "+100 XP",
-                "status": "Заблокировано",
-                "unlocked": False
-            },
-            {
-                "id": "consistency",
-                "title": "Постоянство",
-                "description": "Используйте приложение 7 дней подряд",
-                "reward": "+200 XP",
-                "status": "Заблокировано",
-                "unlocked": False
-            }
-        ]
-        
-        print(f"Achievements retrieved for {current_user}")
+        achievements = gamification.achievements(current_user)
+        logger.info("Achievements retrieved for %s", current_user)
         return achievements
     except Exception as e:
-        print(f"Error getting achievements: {e}")
+        logger.error("Error getting achievements: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/gamification/challenges", tags=["Gamification"])
 async def get_challenges(current_user: str = Depends(get_current_user)):
     try:
-        challenges = [
-            {
-                "id": "daily-5",
-                "title": "Ежедневная пятерка",
-                "description": "Завершите 5 задач сегодня",
-                "reward": "+75 XP",
-                "progress": 3,
-                "target": 5,
-                "expires": "2024-01-01T23:59:59"
-            },
-            {
-                "id": "weekend-warrior",
-                "title": "Воитель выходных",
-                "description": "Создайте 3 задачи в выходные",
-                "reward": "+100 XP",
-                "progress": 1,
-                "target": 3,
-                "expires": "2024-01-07T23:59:59"
-            }
-        ]
-        
-        print(f"Challenges retrieved for {current_user}")
+        challenges = gamification.challenges(current_user)
+        logger.info("Challenges retrieved for %s", current_user)
         return challenges
     except Exception as e:
-        print(f"Error getting challenges: {e}")
+        logger.error("Error getting challenges: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/gamification/rewards", tags=["Gamification"])
@@ -409,25 +855,24 @@ async def get_rewards(current_user: str = Depends(get_current_user)):
             {"id": "priority-bump", "title": "Priority Bump", "description": "Повысить приоритет задачи", "cost": 50}
         ]
         
-        print(f"Rewards retrieved for {current_user}")
+        logger.info("Rewards retrieved for %s", current_user)
         return rewards
     except Exception as e:
-        print(f"Error getting rewards: {e}")
+        logger.error("Error getting rewards: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/gamification/leaderboard", tags=["Gamification"])
-async def get_leaderboard(current_user: str = Depends(get_current_user)):
+async def get_leaderboard(
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: str = Depends(get_current_user)
+):
     try:
-        leaderboard = [
-            {"rank": 1, "user": "admin", "xp": 1250, "level": 5},
-            {"rank": 2, "user": "user2", "xp": 1100, "level": 4},
-            {"rank": 3, "user": "user3", "xp": 950, "level": 4}
-        ]
-        
-        print(f"Leaderboard retrieved for {current_user}")
+        leaderboard = gamification.top(limit, offset)
+        logger.info("Leaderboard retrieved for %s", current_user)
         return leaderboard
     except Exception as e:
-        print(f"Error getting leaderboard: {e}")
+        logger.error("Error getting leaderboard: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 # ============================================================================
@@ -443,40 +888,142 @@ async def send_notification(
         message = request.get("message", "Default notification")
         notification_type = request.get("type", "info")
         
-        notification = {
-            "id": str(uuid.uuid4()),
-            "message": message,
-            "type": notification_type,
-            "user": current_user,
-            "timestamp": datetime.now().isoformat(),
-            "read": False
-        }
-        
-        print(f"Notification sent to {current_user}: {message}")
+        notification = await run_notifications(
+            notification_store.add_notification, current_user, message, notification_type
+        )
+        push_broker.publish("notification", json.dumps(notification, ensure_ascii=False).encode("utf-8"),
+                            user=current_user)
+        logger.info("Notification sent to %s: %s", current_user, message)
         return notification
     except Exception as e:
-        print(f"Error sending notification: {e}")
+        logger.error("Error sending notification: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/notifications", tags=["Notifications"])
-async def get_notifications(current_user: str = Depends(get_current_user)):
-    try:
-        notifications = [
-            {
-                "id": str(uuid.uuid4()),
-                "message": "Достижение 'Первая задача' получено!",
-                "type": "success",
-                "timestamp": datetime.now().isoformat(),
-                "read": False
-            }
-        ]
-        
-        print(f"Notifications retrieved for {current_user}")
-        return notifications
+async def get_notifications(
+    cursor: Optional[int] = Query(None, ge=1, description="next_cursor предыдущей страницы"),
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: str = Depends(get_current_user)
+):
+    # Новые уведомления сверху; next_cursor = null - больше страниц нет
+    try:
+        notifications, next_cursor = await run_notifications(
+            notification_store.get_notifications, current_user, cursor, limit
+        )
+        unread = await run_notifications(notification_store.get_unread_count, current_user)
+        logger.info("Notifications retrieved for %s", current_user)
+        return {"notifications": notifications, "next_cursor": next_cursor, "unread": unread}
+    except Exception as e:
+        logger.error("Error getting notifications: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/notifications/unread-count", tags=["Notifications"])
+async def get_unread_count(current_user: str = Depends(get_current_user)):
+    return {"unread": await run_notifications(notification_store.get_unread_count, current_user)}
+
+@app.post("/notifications/read", tags=["Notifications"])
+async def mark_notifications_read(
+    request: NotificationMarkRead = Body(default_factory=NotificationMarkRead),
+    current_user: str = Depends(get_current_user)
+):
+    # {"ids": [...]} - выбранные уведомления, {"up_to": n} или пустое тело - все до n / все
+    try:
+        if request.ids is not None:
+            marked = await run_notifications(notification_store.mark_read, current_user, request.ids)
+        else:
+            marked = await run_notifications(notification_store.mark_all_read, current_user, request.up_to)
+        unread = await run_notifications(notification_store.get_unread_count, current_user)
+        logger.info("Notifications marked read by %s: %s", current_user, marked)
+        return {"marked": marked, "unread": unread}
     except Exception as e:
-        print(f"Error getting notifications: {e}")
+        logger.error("Error marking notifications read: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
+# ============================================================================
+# PUSH EVENTS
+# ============================================================================
+
+# Сколько пропущенных изменений отдается при переподключении; больше - полная синхронизация
+PUSH_REPLAY_LIMIT = 1000
+
+async def missed_events(db: TaskDatabase, since: int) -> Tuple[list, int]:
+    fragments, cursor, resync = await run_db(db.get_changes, since, PUSH_REPLAY_LIMIT)
+    if resync or len(fragments) >= PUSH_REPLAY_LIMIT:
+        # Клиент заново загружает /tasks/ и продолжает с last_seq
+        last_seq = await run_db(db.last_change_seq)
+        return [(last_seq, "resync", b'{"last_seq":%d}' % last_seq)], last_seq
+    return [(fragment_seq(fragment), "task", fragment) for fragment in fragments], cursor
+
+async def subscribe_events(db: TaskDatabase, user: str, since: Optional[int]):
+    # -> (подписчик, seq, с которого отдавать события). Без since - с текущего seq журнала:
+    # с него же ChangePump начнет рассылку этому пользователю, а изменения, разосланные
+    # до подписки уже работающим насосом, live_events доберет из журнала
+    current = await run_db(db.last_change_seq)
+    subscriber = push_broker.subscribe(user, current)
+    return subscriber, current if since is None else since
+
+async def live_events(db: TaskDatabase, subscriber, since: Optional[int]):
+    # Сначала пропущенное (подписка уже оформлена, поэтому ничего не теряется),
+    # затем живые события без повторов того, что уже отдано из журнала
+    replayed = 0
+    if since is not None:
+        events, replayed = await missed_events(db, since)
+        for event in events:
+            yield event
+    while True:
+        event = await subscriber.queue.get()
+        if event is None:
+            # Клиент отстал или сервер останавливается - клиент переподключится с последним seq
+            break
+        if event[1] == "task" and event[0] <= replayed:
+            continue
+        yield event
+
+@app.get("/events", tags=["Push"])
+async def stream_events(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    # Server-Sent Events: task (то же, что элемент /tasks/changes), notification, resync, ping.
+    # id события - seq, поэтому EventSource сам продолжает с Last-Event-ID после обрыва
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    subscriber, since = await subscribe_events(db, current_user, since)
+
+    async def frames():
+        try:
+            yield b"retry: 2000\n\n"
+            async for event in live_events(db, subscriber, since):
+                yield sse_frame(event)
+        finally:
+            push_broker.unsubscribe(subscriber)
+
+    logger.info("Event stream opened by %s since %s", current_user, since)
+    return StreamingResponse(frames(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/events")
+async def websocket_events(
+    websocket: WebSocket,
+    since: Optional[int] = Query(None, ge=0),
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    # Те же события для клиентов без EventSource (React Native): {"event", "seq", "data"}
+    await websocket.accept()
+    subscriber, since = await subscribe_events(db, current_user, since)
+    try:
+        async for event in live_events(db, subscriber, since):
+            await websocket.send_text(ws_message(event))
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        push_broker.unsubscribe(subscriber)
+
 # ============================================================================
 # THEMES
 # ============================================================================
@@ -492,10 +1039,10 @@ async def get_themes():
             {"id": "forest", "name": "Forest Theme", "primary": "#56ab2f", "secondary": "#a8e6cf"}
         ]
         
-        print("Themes retrieved")
+        logger.info("Themes retrieved")
         return themes
     except Exception as e:
-        print(f"Error getting themes: {e}")
+        logger.error("Error getting themes: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 # ============================================================================
@@ -511,10 +1058,10 @@ async def voice_command(
         command = request.get("command", "")
         response = f"Voice command received: '{command}' from user {current_user}"
         
-        print(f"Voice command by {current_user}: {command}")
+        logger.info("Voice command by %s: %s", current_user, command)
         return {"response": response, "command": command, "user": current_user}
     except Exception as e:
-        print(f"Error processing voice command: {e}")
+        logger.error("Error processing voice command: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 # ============================================================================
@@ -522,44 +1069,37 @@ async def voice_command(
 # ============================================================================
 
 @app.get("/analytics/productivity", tags=["Analytics"])
-async def get_productivity_analytics(current_user: str = Depends(get_current_user)):
-    try:
-        analytics = {
-            "daily_average": 3.2,
-            "weekly_total": 22,
-            "monthly_total": 89,
-            "completion_rate": 78.5,
-            "best_day": "Wednesday",
-            "best_time": "10:00-14:00",
-            "productivity_score": 85
-        }
+async def get_productivity_analytics(
+    days: int = Query(30, ge=1, le=3660),
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    try:
+        # Отчет строится по часовым корзинам активности, задачи не перебираются
+        activity = await run_db(db.get_activity)
+        stats = await run_db(db.get_task_stats)
+        analytics = productivity_report(activity, stats, days)
         
-        print(f"Productivity analytics retrieved for {current_user}")
+        logger.info("Productivity analytics retrieved for %s", current_user)
         return analytics
     except Exception as e:
-        print(f"Error getting productivity analytics: {e}")
+        logger.error("Error getting productivity analytics: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/analytics/tasks", tags=["Analytics"])
-async def get_task_analytics(current_user: str = Depends(get_current_user)):
-    try:
-        analytics = {
-            "total_created": 45,
-            "total_completed": 38,
-            "total_overdue": 2,
-            "average_completion_time": "2.5 days",
-            "priority_distribution": {
-                "low": 15,
-                "medium": 20,
-                "high": 8,
-                "urgent": 2
-            }
-        }
+async def get_task_analytics(
+    current_user: str = Depends(get_current_user),
+    db: TaskDatabase = Depends(get_user_db)
+):
+    try:
+        activity = await run_db(db.get_activity)
+        stats = await run_db(db.get_task_stats)
+        analytics = task_report(activity, stats)
         
-        print(f"Task analytics retrieved for {current_user}")
+        logger.info("Task analytics retrieved for %s", current_user)
         return analytics
     except Exception as e:
-        print(f"Error getting task analytics: {e}")
+        logger.error("Error getting task analytics: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 if __name__ == "__main__":
@@ -1,9 +1,14 @@
 from enum import Enum
 from typing import Optional, List
 from uuid import UUID, uuid4
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from pydantic import BaseModel, Field, field_validator
 
+# Допустимое время created_at / updated_at при импорте: с эпохи и до текущего
+# момента с запасом на расхождение часов
+IMPORT_EARLIEST = datetime(1970, 1, 1)
+IMPORT_CLOCK_SKEW = timedelta(days=1)
+
 
 class TaskStatus(str, Enum):
     CREATED = "создано"
@@ -59,10 +64,41 @@ class TaskUpdate(BaseModel):
     due_date: Optional[date] = None
 
 
+class TaskBulkUpdate(TaskUpdate):
+    id: UUID = Field(..., description="Идентификатор изменяемой задачи")
+
+
+class TaskImport(TaskBase):
+    id: Optional[UUID] = Field(None, description="Идентификатор из выгрузки; без него создается новый")
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    @field_validator('due_date')
+    @classmethod
+    def validate_due_date(cls, v):
+        # В выгрузке срок выполнения может быть уже в прошлом
+        return v
+    
+    @field_validator('created_at', 'updated_at')
+    @classmethod
+    def validate_timestamp(cls, v):
+        # Аналитика хранит дни подряд от самого раннего до самого позднего,
+        # поэтому время вне разумного диапазона отклоняется
+        if v is None:
+            return v
+        local = v.astimezone().replace(tzinfo=None) if v.tzinfo is not None else v
+        if local < IMPORT_EARLIEST:
+            raise ValueError('Время не может быть раньше 1970 года')
+        if local > datetime.now() + IMPORT_CLOCK_SKEW:
+            raise ValueError('Время не может быть в будущем')
+        return v
+
+
 class Task(TaskBase):
     id: UUID = Field(default_factory=uuid4, description="Уникальный идентификатор задачи")
     created_at: datetime = Field(default_factory=datetime.now, description="Время создания задачи")
     updated_at: Optional[datetime] = Field(None, description="Время последнего обновления")
+    version: int = Field(default=1, ge=1, description="Версия задачи; растет при каждом изменении")
     
     model_config = {
         "json_schema_extra": {
@@ -75,7 +111,13 @@ class Task(TaskBase):
                 "priority": 3,
                 "due_date": "2024-12-31",
                 "created_at": "2024-01-01T12:00:00",
-                "updated_at": "2024-01-01T14:30:00"
+                "updated_at": "2024-01-01T14:30:00",
+                "version": 2
             }
         }
     }
+
+
+class NotificationMarkRead(BaseModel):
+    ids: Optional[List[int]] = Field(None, description="Номера уведомлений; без них - все до up_to")
+    up_to: Optional[int] = Field(None, ge=0, description="Отметить все уведомления с номером <= up_to; без него - все")
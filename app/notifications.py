@@ -0,0 +1,440 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.storage import MemoryStorage, LogStorage
+
+# Сколько последних уведомлений хранится у пользователя; более старые вытесняются
+INBOX_SIZE = 1000
+
+NOTIFICATION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    user TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    type TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    read INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user, id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS notification_inboxes (
+    user TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    read_upto INTEGER NOT NULL DEFAULT 0,
+    unread INTEGER NOT NULL DEFAULT 0
+);
+
+-- Ключи разовых уведомлений (например, полученное достижение): с одним
+-- ключом у пользователя уведомление создается один раз, сколько бы
+-- воркеров его ни отправили
+CREATE TABLE IF NOT EXISTS notification_keys (
+    user TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (user, key)
+) WITHOUT ROWID;
+"""
+
+
+def notification_dict(user: str, notification_id: int, message: str, notification_type: str,
+                      timestamp: str, read: bool) -> Dict[str, Any]:
+    return {
+        "id": notification_id,
+        "message": message,
+        "type": notification_type,
+        "user": user,
+        "timestamp": timestamp,
+        "read": read
+    }
+
+
+class Notification:
+    __slots__ = ("id", "message", "type", "timestamp", "read", "key")
+
+    def __init__(self, notification_id: int, message: str, notification_type: str, timestamp: str, read: bool = False,
+                 key: Optional[str] = None):
+        self.id = notification_id
+        self.message = message
+        self.type = notification_type
+        self.timestamp = timestamp
+        self.read = read
+        # Ключ разового уведомления (см. NotificationStore.add_notification)
+        self.key = key
+
+
+class Inbox:
+    """
+    Кольцевой буфер уведомлений одного пользователя.
+
+    Номера уведомлений у пользователя идут подряд (1, 2, 3...), поэтому
+    уведомление n лежит в ячейке (n - base) % size и находится без поиска.
+    Все уведомления с номером <= read_upto прочитаны: "прочитать все" -
+    это сдвиг границы, а не проход по буферу. Счетчик unread обновляется
+    при каждой записи.
+    """
+
+    __slots__ = ("user", "size", "items", "base", "last_id", "read_upto", "unread", "keys")
+
+    def __init__(self, user: str, size: int):
+        self.user = user
+        self.size = size
+        self.items: List[Notification] = []
+        # Номер первого уведомления, попавшего в буфер (после загрузки - не обязательно 1)
+        self.base = 1
+        self.last_id = 0
+        self.read_upto = 0
+        self.unread = 0
+        # Ключи разовых уведомлений, включая вытесненные из буфера
+        self.keys: Set[str] = set()
+
+    @property
+    def first_id(self) -> int:
+        return self.last_id - len(self.items) + 1
+
+    def _slot(self, notification_id: int) -> int:
+        return (notification_id - self.base) % self.size
+
+    def is_read(self, notification: Notification) -> bool:
+        return notification.read or notification.id <= self.read_upto
+
+    def get(self, notification_id: int) -> Optional[Notification]:
+        if self.first_id <= notification_id <= self.last_id:
+            return self.items[self._slot(notification_id)]
+        return None
+
+    def add(self, notification: Notification):
+        if not self.items:
+            self.base = notification.id
+        if len(self.items) < self.size:
+            self.items.append(notification)
+        else:
+            slot = self._slot(notification.id)
+            if not self.is_read(self.items[slot]):
+                self.unread -= 1
+            self.items[slot] = notification
+        self.last_id = notification.id
+        if not self.is_read(notification):
+            self.unread += 1
+
+    def mark_read(self, notification_id: int) -> bool:
+        notification = self.get(notification_id)
+        if notification is None or self.is_read(notification):
+            return False
+        notification.read = True
+        self.unread -= 1
+        return True
+
+    def mark_all_read(self, up_to: int) -> int:
+        up_to = min(up_to, self.last_id)
+        if up_to <= self.read_upto:
+            return 0
+        if up_to == self.last_id:
+            marked = self.unread
+        else:
+            # Частичная отметка - проход только по еще не прочитанному диапазону
+            marked = 0
+            for notification_id in range(max(self.read_upto + 1, self.first_id), up_to + 1):
+                if not self.items[self._slot(notification_id)].read:
+                    marked += 1
+        self.read_upto = up_to
+        self.unread -= marked
+        return marked
+
+    def page(self, cursor: Optional[int], limit: int) -> Tuple[List[Notification], Optional[int]]:
+        # Новые сверху; cursor - номер последнего уведомления предыдущей страницы
+        start = self.last_id if cursor is None else min(cursor - 1, self.last_id)
+        stop = max(start - limit, self.first_id - 1)
+        items = [self.items[self._slot(n)] for n in range(start, stop, -1)]
+        next_cursor = items[-1].id if items and stop >= self.first_id else None
+        return items, next_cursor
+
+
+# Документы журнала: "@user" - граница прочитанного и ключи разовых уведомлений,
+# "n@user" - уведомление n (со своим ключом, пока документ "@user" его не перезаписал)
+
+def _inbox_document(inbox: Inbox) -> Dict[str, Any]:
+    return {"id": f"@{inbox.user}", "user": inbox.user, "read_upto": inbox.read_upto, "keys": sorted(inbox.keys)}
+
+
+def _notification_document(inbox: Inbox, notification: Notification) -> Dict[str, Any]:
+    doc = {
+        "id": f"{notification.id}@{inbox.user}", "user": inbox.user, "n": notification.id,
+        "message": notification.message, "type": notification.type,
+        "timestamp": notification.timestamp, "read": notification.read
+    }
+    if notification.key is not None:
+        doc["key"] = notification.key
+    return doc
+
+
+def _encode(doc: Dict[str, Any]) -> bytes:
+    return json.dumps(doc, ensure_ascii=False).encode("utf-8")
+
+
+class NotificationStore:
+    """
+    Уведомления пользователей в памяти процесса.
+
+    С LogStorage (TASK_DATA_DIR) каждая запись дописывается в журнал, и
+    входящие восстанавливаются после перезапуска. Вытеснение из буфера в
+    журнал не пишется: лишние уведомления отбрасываются при загрузке.
+    """
+
+    # Операции выполняются в памяти и не блокируют event loop
+    blocking = False
+
+    def __init__(self, storage: Optional[MemoryStorage] = None, inbox_size: int = INBOX_SIZE):
+        self.inbox_size = inbox_size
+        self.inboxes: Dict[str, Inbox] = {}
+        self.storage = storage or MemoryStorage()
+        self._load()
+
+    def _inbox(self, user: str) -> Inbox:
+        inbox = self.inboxes.get(user)
+        if inbox is None:
+            inbox = self.inboxes[user] = Inbox(user, self.inbox_size)
+        return inbox
+
+    def _load(self):
+        docs = list(self.storage.load())
+        last_ids: Dict[str, int] = {}
+        for doc in docs:
+            if "read_upto" in doc:
+                inbox = self._inbox(doc["user"])
+                inbox.read_upto = doc["read_upto"]
+                inbox.keys.update(doc.get("keys", ()))
+            else:
+                last_ids[doc["user"]] = max(last_ids.get(doc["user"], 0), doc["n"])
+                if "key" in doc:
+                    self._inbox(doc["user"]).keys.add(doc["key"])
+        # Вытесненные уведомления остаются в журнале и снимке - берем только последние inbox_size
+        notifications = sorted(
+            (doc for doc in docs if "n" in doc and doc["n"] > last_ids[doc["user"]] - self.inbox_size),
+            key=lambda doc: doc["n"]
+        )
+        for doc in notifications:
+            self._inbox(doc["user"]).add(
+                Notification(doc["n"], doc["message"], doc["type"], doc["timestamp"], doc["read"], doc.get("key"))
+            )
+
+    def _persist(self, inbox: Inbox, notification: Optional[Notification] = None):
+        doc = _inbox_document(inbox) if notification is None else _notification_document(inbox, notification)
+        self.storage.record_put(_encode(doc))
+        if self.storage.needs_snapshot():
+            self.storage.snapshot(self._documents(), _encode)
+
+    def _documents(self) -> List[Dict[str, Any]]:
+        docs = []
+        for inbox in self.inboxes.values():
+            docs.append(_inbox_document(inbox))
+            docs.extend(_notification_document(inbox, notification) for notification in inbox.items)
+        return docs
+
+    def _to_dict(self, inbox: Inbox, notification: Notification) -> Dict[str, Any]:
+        return notification_dict(inbox.user, notification.id, notification.message, notification.type,
+                                 notification.timestamp, inbox.is_read(notification))
+
+    def close(self):
+        self.storage.close()
+
+    def add_notification(self, user: str, message: str, notification_type: str = "info",
+                         key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        # key - ключ разового уведомления: если оно уже было, возвращается None
+        inbox = self._inbox(user)
+        if key is not None:
+            if key in inbox.keys:
+                return None
+            inbox.keys.add(key)
+        notification = Notification(inbox.last_id + 1, message, notification_type, datetime.now().isoformat(), key=key)
+        inbox.add(notification)
+        self._persist(inbox, notification)
+        return self._to_dict(inbox, notification)
+
+    def get_notifications(self, user: str, cursor: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        inbox = self.inboxes.get(user)
+        if inbox is None:
+            return [], None
+        items, next_cursor = inbox.page(cursor, limit)
+        return [self._to_dict(inbox, notification) for notification in items], next_cursor
+
+    def get_unread_count(self, user: str) -> int:
+        inbox = self.inboxes.get(user)
+        return inbox.unread if inbox is not None else 0
+
+    def mark_read(self, user: str, notification_ids: Iterable[int]) -> int:
+        inbox = self.inboxes.get(user)
+        if inbox is None:
+            return 0
+        marked = 0
+        for notification_id in set(notification_ids):
+            if inbox.mark_read(notification_id):
+                marked += 1
+                self._persist(inbox, inbox.get(notification_id))
+        return marked
+
+    def mark_all_read(self, user: str, up_to: Optional[int] = None) -> int:
+        inbox = self.inboxes.get(user)
+        if inbox is None:
+            return 0
+        marked = inbox.mark_all_read(inbox.last_id if up_to is None else up_to)
+        self._persist(inbox)
+        return marked
+
+
+class SQLiteNotificationStore:
+    """
+    Уведомления в базе SQLite - общие для всех воркеров.
+
+    Счетчики пользователя (последний номер, граница прочитанного, число
+    непрочитанных) лежат одной строкой в notification_inboxes и меняются в
+    той же транзакции, что и уведомления.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = "tasks.db", inbox_size: int = INBOX_SIZE):
+        from app.sqlite_database import ConnectionPool
+
+        self.inbox_size = inbox_size
+        self.pool = ConnectionPool(path)
+        self.pool.get().executescript(NOTIFICATION_SCHEMA)
+
+    def close(self):
+        self.pool.close()
+
+    def _inbox(self, conn, user: str):
+        return conn.execute(
+            "SELECT last_id, read_upto, unread FROM notification_inboxes WHERE user = ?", (user,)
+        ).fetchone()
+
+    def add_notification(self, user: str, message: str, notification_type: str = "info",
+                         key: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        # key - ключ разового уведомления: если его уже записал этот или другой воркер, возвращается None
+        conn = self.pool.get()
+        timestamp = datetime.now().isoformat()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if key is not None and not conn.execute(
+                "INSERT OR IGNORE INTO notification_keys (user, key) VALUES (?, ?)", (user, key)
+            ).rowcount:
+                conn.execute("ROLLBACK")
+                return None
+            last_id, read_upto = conn.execute(
+                "INSERT INTO notification_inboxes (user, last_id, unread) VALUES (?, 1, 1) "
+                "ON CONFLICT(user) DO UPDATE SET last_id = last_id + 1, unread = unread + 1 "
+                "RETURNING last_id, read_upto",
+                (user,)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO notifications (user, id, message, type, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (user, last_id, message, notification_type, timestamp)
+            )
+            # Вытесняем уведомление, выпавшее из буфера; непрочитанное уменьшает счетчик
+            evicted = conn.execute(
+                "DELETE FROM notifications WHERE user = ? AND id <= ? RETURNING id, read",
+                (user, last_id - self.inbox_size)
+            ).fetchall()
+            lost_unread = sum(1 for row in evicted if not row["read"] and row["id"] > read_upto)
+            if lost_unread:
+                conn.execute("UPDATE notification_inboxes SET unread = unread - ? WHERE user = ?", (lost_unread, user))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return notification_dict(user, last_id, message, notification_type, timestamp, False)
+
+    def get_notifications(self, user: str, cursor: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        conn = self.pool.get()
+        # Одна транзакция чтения - уведомления и граница прочитанного из одного снимка
+        conn.execute("BEGIN")
+        try:
+            inbox = self._inbox(conn, user)
+            if inbox is None:
+                return [], None
+            rows = conn.execute(
+                "SELECT id, message, type, timestamp, read FROM notifications "
+                "WHERE user = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (user, cursor if cursor is not None else inbox["last_id"] + 1, max(limit + 1, 1))
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        items = [
+            notification_dict(user, row["id"], row["message"], row["type"], row["timestamp"],
+                              bool(row["read"]) or row["id"] <= inbox["read_upto"])
+            for row in rows[:limit]
+        ]
+        next_cursor = items[-1]["id"] if len(rows) > limit and items else None
+        return items, next_cursor
+
+    def get_unread_count(self, user: str) -> int:
+        inbox = self._inbox(self.pool.get(), user)
+        return inbox["unread"] if inbox is not None else 0
+
+    def mark_read(self, user: str, notification_ids: Iterable[int]) -> int:
+        notification_ids = sorted(set(notification_ids))
+        if not notification_ids:
+            return 0
+        conn = self.pool.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            inbox = self._inbox(conn, user)
+            if inbox is None:
+                conn.execute("ROLLBACK")
+                return 0
+            marked = conn.execute(
+                f"UPDATE notifications SET read = 1 WHERE user = ? AND read = 0 AND id > ? "
+                f"AND id IN ({', '.join('?' * len(notification_ids))})",
+                (user, inbox["read_upto"], *notification_ids)
+            ).rowcount
+            conn.execute("UPDATE notification_inboxes SET unread = unread - ? WHERE user = ?", (marked, user))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return marked
+
+    def mark_all_read(self, user: str, up_to: Optional[int] = None) -> int:
+        conn = self.pool.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            inbox = self._inbox(conn, user)
+            if inbox is None:
+                conn.execute("ROLLBACK")
+                return 0
+            up_to = inbox["last_id"] if up_to is None else min(up_to, inbox["last_id"])
+            if up_to <= inbox["read_upto"]:
+                conn.execute("ROLLBACK")
+                return 0
+            if up_to == inbox["last_id"]:
+                marked = inbox["unread"]
+            else:
+                marked = conn.execute(
+                    "SELECT COUNT(*) FROM notifications WHERE user = ? AND id > ? AND id <= ? AND read = 0",
+                    (user, inbox["read_upto"], up_to)
+                ).fetchone()[0]
+            conn.execute(
+                "UPDATE notification_inboxes SET read_upto = ?, unread = unread - ? WHERE user = ?",
+                (up_to, marked, user)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return marked
+
+
+def create_notification_store():
+    # Уведомления хранятся там же, где задачи (см. create_task_database)
+    if os.getenv("TASK_DB_BACKEND", "memory") == "sqlite":
+        return SQLiteNotificationStore(os.getenv("TASK_DB_PATH", "tasks.db"))
+
+    data_dir = os.getenv("TASK_DATA_DIR")
+    if data_dir:
+        storage = LogStorage(
+            os.path.join(data_dir, "notifications"),
+            fsync_interval=float(os.getenv("TASK_FSYNC_INTERVAL", "0.05")),
+            snapshot_every=int(os.getenv("TASK_SNAPSHOT_EVERY", "100000"))
+        )
+        return NotificationStore(storage=storage)
+    return NotificationStore()
@@ -0,0 +1,241 @@
+import itertools
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+# Отсчеты, когда запрос в обработке, но его код не выполняется ни в event loop,
+# ни в пуле потоков: ожидание ввода-вывода, очереди пула или других запросов
+WAITING = "[waiting]"
+# Корень стеков работы запроса в пуле потоков (run_in_threadpool, бэкенд SQLite)
+THREAD_POOL = "[thread pool]"
+
+# Значения флага, включающие профилирование запроса
+ENABLED_VALUES = ("1", "true", "yes")
+
+
+def frame_name(code: CodeType, module: Optional[str], cache: Dict[CodeType, str]) -> str:
+    name = cache.get(code)
+    if name is None:
+        # co_qualname (с именем класса) есть только с Python 3.11
+        qualname = getattr(code, "co_qualname", code.co_name)
+        name = f"{module}.{qualname}" if module else qualname
+        cache[code] = name
+    return name
+
+
+def _stack(frame: Optional[FrameType], root: FrameType, names: Dict[CodeType, str]) -> Optional[str]:
+    # Свернутый стек от root (не включая) до вершины; None - root не в выполняемом стеке
+    stack = []
+    while frame is not None and frame is not root:
+        stack.append(frame_name(frame.f_code, frame.f_globals.get("__name__"), names))
+        frame = frame.f_back
+    if frame is None:
+        return None
+    stack.reverse()
+    return ";".join(stack)
+
+
+class RequestProfile:
+    """Отсчеты стека одного запроса: свернутый стек -> число отсчетов."""
+
+    __slots__ = ("id", "method", "path", "thread_id", "root", "workers", "started", "started_at",
+                 "duration", "status_code", "stacks", "samples")
+
+    def __init__(self, profile_id: int, method: str, path: str, root: FrameType):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        # Поток и кадр middleware: отсчет принадлежит запросу, только если кадр в выполняемом стеке
+        self.thread_id = threading.get_ident()
+        self.root: Optional[FrameType] = root
+        # Потоки пула, выполняющие сейчас блокирующую работу запроса: id потока -> кадр обертки
+        self.workers: Dict[int, FrameType] = {}
+        self.started = time.perf_counter()
+        self.started_at = datetime.now()
+        self.duration = 0.0
+        self.status_code = 500
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+
+    def sample(self, frames: Dict[int, FrameType], names: Dict[CodeType, str]):
+        root = self.root
+        if root is None:
+            return
+        key = _stack(frames.get(self.thread_id), root, names)
+        if key is None:
+            # Event loop занят не этим запросом - может быть, запрос ждет свою работу в пуле потоков
+            key = WAITING
+            for thread_id, worker_root in list(self.workers.items()):
+                stack = _stack(frames.get(thread_id), worker_root, names)
+                if stack is not None:
+                    key = f"{THREAD_POOL};{stack}" if stack else THREAD_POOL
+                    break
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        # Формат flamegraph.pl / speedscope: "корень;вызов;...;вершина число"
+        label = f"{self.method} {self.path}".replace(";", ",")
+        lines = [f"{label};{key} {count}" if key else f"{label} {count}"
+                 for key, count in sorted(self.stacks.items())]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def to_dict(self, interval: float) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": self.samples,
+            "interval_ms": interval * 1000,
+            "started_at": self.started_at.isoformat(),
+            "stacks": self.collapsed()
+        }
+
+
+class SamplingProfiler:
+    """
+    Выборочный профилировщик отдельных запросов.
+
+    Фоновый поток раз в interval читает стек потока event loop и засчитывает
+    отсчет запросу, если кадр его middleware есть в стеке. Если нет, берется
+    стек потока пула, который выполняет блокирующую работу запроса (обертка
+    profiled вокруг run_in_threadpool); иначе запрос ждет ([waiting]).
+    Поток работает только пока есть профилируемые запросы; последние keep
+    профилей хранятся в памяти для /debug/profiles.
+    """
+
+    def __init__(self, interval: float = 0.005, keep: int = 50):
+        self.interval = interval
+        self.profiles: deque = deque(maxlen=keep)
+        self._active: Dict[int, RequestProfile] = {}
+        self._ids = itertools.count(1)
+        self._names: Dict[CodeType, str] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, method: str, path: str, root: FrameType) -> RequestProfile:
+        profile = RequestProfile(next(self._ids), method, path, root)
+        with self._lock:
+            self._active[profile.id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def finish(self, profile: RequestProfile, status_code: int):
+        with self._lock:
+            self._active.pop(profile.id, None)
+        profile.duration = time.perf_counter() - profile.started
+        profile.status_code = status_code
+        # Кадры держат локальные переменные запроса - после ответа они не нужны
+        profile.root = None
+        profile.workers.clear()
+        self.profiles.append(profile)
+
+    def _run(self):
+        try:
+            while True:
+                time.sleep(self.interval)
+                with self._lock:
+                    if not self._active:
+                        self._thread = None
+                        return
+                    active = list(self._active.values())
+                frames = sys._current_frames()
+                for profile in active:
+                    profile.sample(frames, self._names)
+        finally:
+            # После ошибки в выборке следующий профилируемый запрос должен запустить поток заново
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def slowest(self, limit: int = 10) -> List[RequestProfile]:
+        return sorted(self.profiles, key=lambda profile: profile.duration, reverse=True)[:limit]
+
+    def get(self, profile_id: int) -> Optional[RequestProfile]:
+        return next((profile for profile in self.profiles if profile.id == profile_id), None)
+
+
+# Профиль запроса, который обрабатывается в текущем контексте (задаче asyncio)
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def profiled(func: Callable) -> Callable:
+    """
+    Обертка для функции, уходящей в пул потоков: поток пула отмечается в профиле запроса.
+
+    Без профилирования возвращает саму функцию - лишней работы нет.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return func
+
+    def wrapper(*args, **kwargs):
+        thread_id = threading.get_ident()
+        profile.workers[thread_id] = sys._getframe()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.workers.pop(thread_id, None)
+
+    return wrapper
+
+
+def profile_requested(scope) -> bool:
+    # Флаг ?profile=1 или заголовок X-Profile: 1
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        for name, value in parse_qsl(query.decode("latin-1")):
+            if name == "profile" and value.lower() in ENABLED_VALUES:
+                return True
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile":
+            return value.decode("latin-1").lower() in ENABLED_VALUES
+    return False
+
+
+class ProfilingMiddleware:
+    """
+    ASGI-middleware профилирования по запросу.
+
+    Без флага запрос сразу передается приложению. С флагом профилируется только
+    этот запрос, если authorize разрешает (токен администратора); номер
+    профиля возвращается в заголовке X-Profile-Id.
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler, authorize: Callable[[Any], bool]):
+        self.app = app
+        self.profiler = profiler
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profile_requested(scope) or not self.authorize(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.profiler.start(scope["method"], scope["path"], sys._getframe())
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", ()),
+                                                  (b"x-profile-id", str(profile.id).encode("ascii"))]}
+            await send(message)
+
+        token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            self.profiler.finish(profile, status_code)
@@ -0,0 +1,193 @@
+import asyncio
+from typing import Any, Dict, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.logger import logger
+
+# Сколько событий может ждать отправки одному клиенту; дальше он считается медленным
+SUBSCRIBER_QUEUE_SIZE = 256
+# Событие в очереди: (seq изменения или None, тип, JSON-данные)
+Event = Tuple[Optional[int], str, bytes]
+
+
+class Subscriber:
+    __slots__ = ("queue", "user", "closed", "since")
+
+    def __init__(self, user: Optional[str], size: int, since: Optional[int] = None):
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(maxsize=size)
+        self.user = user
+        self.closed = False
+        # seq журнала пользователя в момент подписки: с него ChangePump начинает рассылку
+        self.since = since
+
+
+class EventBroker:
+    """
+    Рассылка событий подключенным клиентам (SSE и WebSocket).
+
+    У каждого подключения своя ограниченная очередь. Публикация никогда не
+    ждет: если очередь клиента заполнена, клиент отключается и при
+    переподключении догоняет пропущенное через журнал изменений.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscriber] = set()
+        self.dropped = 0
+
+    def subscribe(self, user: Optional[str] = None, since: Optional[int] = None) -> Subscriber:
+        subscriber = Subscriber(user, self.queue_size, since)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def _drop(self, subscriber: Subscriber):
+        subscriber.closed = True
+        self.subscribers.discard(subscriber)
+        self.dropped += 1
+        # Освобождаем место под маркер конца, чтобы ожидающий get() проснулся
+        try:
+            subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(None)
+        except (asyncio.QueueEmpty, asyncio.QueueFull):
+            pass
+
+    def publish(self, kind: str, data: bytes, seq: Optional[int] = None, user: Optional[str] = None):
+        # user=None - событие для всех подписчиков
+        event = (seq, kind, data)
+        for subscriber in list(self.subscribers):
+            if user is not None and subscriber.user not in (None, user):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+
+    def close(self):
+        for subscriber in list(self.subscribers):
+            subscriber.closed = True
+            try:
+                subscriber.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        self.subscribers.clear()
+
+
+def sse_frame(event: Event) -> bytes:
+    seq, kind, data = event
+    frame = b"event: %s\ndata: %s\n\n" % (kind.encode("ascii"), data)
+    if seq is not None:
+        # id - это seq: браузер пришлет его в Last-Event-ID при переподключении
+        frame = b"id: %d\n" % seq + frame
+    return frame
+
+
+def ws_message(event: Event) -> str:
+    seq, kind, data = event
+    return '{"event":"%s","seq":%s,"data":%s}' % (kind, "null" if seq is None else seq, data.decode("utf-8"))
+
+
+class ChangePump:
+    """
+    Фоновая задача, которая переносит журнал изменений хранилища в EventBroker.
+
+    Журнал общий для всех воркеров (в SQLite), поэтому клиент получает и
+    изменения, сделанные другим процессом. Опрашиваются только разделы
+    пользователей, у которых есть подписчики, и только те, чья версия
+    изменилась с прошлого прохода.
+    """
+
+    def __init__(self, task_db, broker: EventBroker, interval: float = 0.25, heartbeat: float = 15.0):
+        self.task_db = task_db
+        self.broker = broker
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self._task: Optional[asyncio.Task] = None
+
+    async def _call(self, func, *args):
+        if self.task_db.blocking:
+            return await run_in_threadpool(func, *args)
+        return func(*args)
+
+    async def _pump_user(self, user: str, since: Optional[int]) -> Tuple[int, int]:
+        # -> (курсор журнала пользователя, сколько изменений отправлено)
+        db = await self._call(self.task_db.for_user, user)
+        if since is None:
+            return await self._call(db.last_change_seq), 0
+        fragments, cursor, resync = await self._call(db.get_changes, since, 1000)
+        if resync:
+            self.broker.publish("resync", b'{"last_seq":%d}' % cursor, seq=cursor, user=user)
+        for fragment in fragments:
+            self.broker.publish("task", fragment, seq=fragment_seq(fragment), user=user)
+        return cursor, len(fragments)
+
+    async def _run(self):
+        # Курсор журнала и версия раздела для каждого пользователя с подписчиками
+        cursors: Dict[str, int] = {}
+        versions: Dict[str, Any] = {}
+        idle = 0.0
+        while True:
+            await asyncio.sleep(self.interval)
+            users = {subscriber.user for subscriber in self.broker.subscribers}
+            for user in list(cursors):
+                if user not in users:
+                    del cursors[user]
+                    versions.pop(user, None)
+            if not users:
+                continue
+
+            sent = 0
+            try:
+                current = await self._call(self.task_db.partition_versions, users)
+            except Exception as e:
+                logger.error("Error reading task changes: %s", e)
+                continue
+            for user in users:
+                version = current.get(user)
+                if user in cursors and version is not None and versions.get(user) == version:
+                    continue
+                if user not in cursors:
+                    # Первый проход для пользователя - с самой ранней подписки, а не с текущего seq:
+                    # изменения между подпиской и этим проходом тоже доходят до клиента
+                    seeds = [subscriber.since for subscriber in self.broker.subscribers
+                             if subscriber.user == user and subscriber.since is not None]
+                    if seeds:
+                        cursors[user] = min(seeds)
+                try:
+                    cursors[user], count = await self._pump_user(user, cursors.get(user))
+                except Exception as e:
+                    logger.error("Error reading task changes: %s", e)
+                    continue
+                sent += count
+                # Неполная порция - журнал прочитан до версии, снятой перед чтением
+                if count < 1000:
+                    versions[user] = version
+
+            # Редкий ping держит простаивающие соединения открытыми через прокси
+            # и выявляет отключившихся клиентов
+            idle = 0.0 if sent else idle + self.interval
+            if idle >= self.heartbeat:
+                idle = 0.0
+                self.broker.publish("ping", b"{}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.broker.close()
+
+
+def fragment_seq(fragment: bytes) -> int:
+    # Фрагменты журнала изменений начинаются с {"seq":<число>,
+    return int(fragment[7:fragment.index(b",")])
@@ -0,0 +1,307 @@
+import json
+import sys
+from array import array
+from datetime import datetime, date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from uuid import UUID
+
+from app.models import Task, TaskCreate, TaskUpdate, TaskImport, TaskStatus, TaskPriority
+
+# Статус хранится номером в этом кортеже, приоритет - своим числовым значением
+STATUSES: Tuple[TaskStatus, ...] = tuple(TaskStatus)
+STATUS_CODES: Dict[TaskStatus, int] = {status: code for code, status in enumerate(STATUSES)}
+PRIORITIES: Dict[int, TaskPriority] = {priority.value: priority for priority in TaskPriority}
+COMPLETED_CODE = STATUS_CODES[TaskStatus.COMPLETED]
+# Статусы, из которых задача может стать просроченной
+OPEN_STATUS_CODES = frozenset(STATUS_CODES[status] for status in (TaskStatus.CREATED, TaskStatus.IN_PROGRESS))
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+NO_DUE_DATE = date.max.toordinal()
+NO_TAGS: Tuple[str, ...] = ()
+
+
+def to_micros(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + value * MICROSECOND
+
+
+def intern_tags(tags) -> Tuple[str, ...]:
+    # Одинаковые теги у разных задач ссылаются на одну строку
+    if not tags:
+        return NO_TAGS
+    return tuple(sys.intern(tag) for tag in tags)
+
+
+class TaskRecord:
+    """
+    Компактное представление задачи внутри TaskDatabase.
+
+    id - это UUID.int, статус и приоритет - небольшие целые, срок - порядковый
+    номер дня, время - микросекунды от эпохи. Pydantic-модель Task собирается
+    только на границе API (to_task), а ответы API берут готовый JSON (encoded).
+    """
+
+    __slots__ = (
+        "id", "title", "description", "status", "priority", "tags", "due", "created", "updated", "version", "_encoded"
+    )
+
+    def __init__(self, id: int, title: str, description: Optional[str], status: int, priority: int,
+                 tags: Tuple[str, ...], due: Optional[int], created: int, updated: Optional[int], version: int = 1):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.status = status
+        self.priority = priority
+        self.tags = tags
+        self.due = due
+        self.created = created
+        self.updated = updated
+        # Растет на единицу при каждом изменении задачи (ETag, If-Match)
+        self.version = version
+        # Закодированный JSON задачи; сбрасывается при каждом изменении
+        self._encoded: Optional[bytes] = None
+
+    @property
+    def uuid(self) -> UUID:
+        return UUID(int=self.id)
+
+    @property
+    def status_enum(self) -> TaskStatus:
+        return STATUSES[self.status]
+
+    def to_task(self) -> Task:
+        # Данные уже проверены при записи, повторная валидация не нужна
+        return Task.model_construct(
+            id=UUID(int=self.id),
+            title=self.title,
+            description=self.description,
+            status=STATUSES[self.status],
+            priority=PRIORITIES[self.priority],
+            tags=list(self.tags),
+            due_date=date.fromordinal(self.due) if self.due is not None else None,
+            created_at=from_micros(self.created),
+            updated_at=from_micros(self.updated) if self.updated is not None else None,
+            version=self.version
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Тот же формат, что и Task.model_dump(mode="json")
+        return {
+            "title": self.title,
+            "description": self.description,
+            "status": STATUSES[self.status].value,
+            "tags": list(self.tags),
+            "priority": self.priority,
+            "due_date": date.fromordinal(self.due).isoformat() if self.due is not None else None,
+            "id": str(UUID(int=self.id)),
+            "created_at": from_micros(self.created).isoformat(),
+            "updated_at": from_micros(self.updated).isoformat() if self.updated is not None else None,
+            "version": self.version
+        }
+
+    def to_json(self) -> bytes:
+        # Тот же вид, что и у JSONResponse: компактно и без экранирования кириллицы
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def state(self) -> Tuple:
+        # Неизменяемая копия полей в порядке __init__: снимок кодируется
+        # в другом потоке, пока записи меняются
+        return (self.id, self.title, self.description, self.status, self.priority, self.tags,
+                self.due, self.created, self.updated, self.version)
+
+    @classmethod
+    def state_to_json(cls, state: Tuple) -> bytes:
+        return cls(*state).to_json()
+
+    def encoded(self) -> bytes:
+        # Кэш заполняется только при чтении через API, чтобы холодные задачи
+        # оставались компактными
+        if self._encoded is None:
+            self._encoded = self.to_json()
+        return self._encoded
+
+    def sort_key(self, sort_by: str):
+        if sort_by == "title":
+            return self.title
+        if sort_by == "status":
+            return STATUSES[self.status].value
+        if sort_by == "priority":
+            return self.priority
+        if sort_by == "due_date":
+            return self.due if self.due is not None else NO_DUE_DATE
+        return self.created
+
+    def apply_update(self, task_update: TaskUpdate, now: int):
+        self._encoded = None
+        if task_update.title is not None:
+            self.title = task_update.title
+        if task_update.description is not None:
+            self.description = task_update.description
+        if task_update.status is not None:
+            self.status = STATUS_CODES[task_update.status]
+        if task_update.priority is not None:
+            self.priority = task_update.priority.value
+        if task_update.tags is not None:
+            self.tags = intern_tags(task_update.tags)
+        if task_update.due_date is not None:
+            self.due = task_update.due_date.toordinal()
+
+        self.updated = now
+        self.version += 1
+
+    @classmethod
+    def from_create(cls, task_id: UUID, task_create: TaskCreate, now: int) -> "TaskRecord":
+        return cls(
+            task_id.int,
+            task_create.title,
+            task_create.description,
+            STATUS_CODES[task_create.status],
+            task_create.priority.value,
+            intern_tags(task_create.tags),
+            task_create.due_date.toordinal() if task_create.due_date else None,
+            now,
+            now
+        )
+
+    @classmethod
+    def from_import(cls, task_id: UUID, item: TaskImport, now: int) -> "TaskRecord":
+        return cls(
+            task_id.int,
+            item.title,
+            item.description,
+            STATUS_CODES[item.status],
+            item.priority.value,
+            intern_tags(item.tags),
+            item.due_date.toordinal() if item.due_date else None,
+            to_micros(item.created_at) if item.created_at else now,
+            to_micros(item.updated_at) if item.updated_at else now
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TaskRecord":
+        return cls(
+            UUID(data["id"]).int,
+            data["title"],
+            data.get("description"),
+            STATUS_CODES[TaskStatus(data["status"])],
+            int(data["priority"]),
+            intern_tags(data.get("tags")),
+            date.fromisoformat(data["due_date"]).toordinal() if data.get("due_date") else None,
+            to_micros(datetime.fromisoformat(data["created_at"])),
+            to_micros(datetime.fromisoformat(data["updated_at"])) if data.get("updated_at") else None,
+            int(data.get("version", 1))
+        )
+
+
+def _json(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+STATUS_JSON: Tuple[bytes, ...] = tuple(_json(status.value) for status in STATUSES)
+
+# Поле Task -> его JSON прямо из записи, в том же виде, что и в to_json
+FIELD_ENCODERS: Dict[str, Callable[[TaskRecord], bytes]] = {
+    "title": lambda r: _json(r.title),
+    "description": lambda r: _json(r.description),
+    "status": lambda r: STATUS_JSON[r.status],
+    "tags": lambda r: _json(r.tags),
+    "priority": lambda r: b"%d" % r.priority,
+    "due_date": lambda r: b'"%s"' % date.fromordinal(r.due).isoformat().encode("ascii") if r.due is not None else b"null",
+    "id": lambda r: b'"%s"' % str(UUID(int=r.id)).encode("ascii"),
+    "created_at": lambda r: b'"%s"' % from_micros(r.created).isoformat().encode("ascii"),
+    "updated_at": lambda r: (
+        b'"%s"' % from_micros(r.updated).isoformat().encode("ascii") if r.updated is not None else b"null"
+    ),
+    "version": lambda r: b"%d" % r.version,
+}
+
+
+def project_records(records: Sequence[TaskRecord], fields: Sequence[str], rows: bool = False) -> List[bytes]:
+    """
+    JSON задач только с полями fields: объекты или, при rows=True, массивы
+    значений в порядке fields. Собирается без моделей и без полного JSON задачи.
+    """
+    encoders = [FIELD_ENCODERS[field] for field in fields]
+    if rows:
+        return [b"[" + b",".join([encode(record) for encode in encoders]) + b"]" for record in records]
+    keys = [b'"%s":' % field.encode("ascii") for field in fields]
+    pairs = list(zip(keys, encoders))
+    return [b"{" + b",".join([key + encode(record) for key, encode in pairs]) + b"}" for record in records]
+
+
+def record_key(sort_by: str, value):
+    # Значение из курсора (как в Task) -> ключ сортировки записи
+    if sort_by == "due_date":
+        return value.toordinal()
+    if sort_by == "created_at":
+        return to_micros(value)
+    return value
+
+
+def public_key(sort_by: str, value):
+    # Ключ сортировки записи -> значение для курсора (как в Task)
+    if sort_by == "due_date":
+        return date.fromordinal(value)
+    if sort_by == "created_at":
+        return from_micros(value)
+    return value
+
+
+# Виды событий истории; в байте кода вид стоит над тремя битами приоритета (1-5)
+EVENT_KINDS = ("created", "completed")
+EVENT_CODES = {kind: code for code, kind in enumerate(EVENT_KINDS)}
+
+
+class TaskHistory:
+    """
+    События задач (created / completed), за которые начисляется XP.
+
+    История только дописывается и переживает удаление задач, поэтому после
+    перезапуска XP восстанавливается полностью. Время хранится в array('q'),
+    вид и приоритет - одним байтом. reopened - задачи, которые были завершены
+    и снова открыты: повторное завершение XP не приносит.
+    """
+
+    __slots__ = ("times", "codes", "reopened")
+
+    def __init__(self):
+        self.times = array("q")
+        self.codes = bytearray()
+        self.reopened: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def add(self, kind: str, at: int, priority: int):
+        self.times.append(at)
+        self.codes.append(EVENT_CODES[kind] << 3 | priority)
+
+    def extend(self, events: Iterable[Sequence]):
+        # События в виде JSON: [вид, время в микросекундах, приоритет]
+        for kind, at, priority in events:
+            self.add(kind, at, priority)
+
+    def events(self) -> List[Tuple[str, int, int]]:
+        # В порядке времени; импорт может добавить задачи задним числом
+        order = sorted(range(len(self.times)), key=self.times.__getitem__)
+        return [(EVENT_KINDS[self.codes[i] >> 3], self.times[i], self.codes[i] & 7) for i in order]
+
+    def copy(self) -> "TaskHistory":
+        # Неизменяемая копия для потока снимка
+        history = TaskHistory()
+        history.times = array("q", self.times)
+        history.codes = bytearray(self.codes)
+        history.reopened = set(self.reopened)
+        return history
+
+    def to_json(self) -> bytes:
+        return _json({
+            "events": [[EVENT_KINDS[code >> 3], at, code & 7] for at, code in zip(self.times, self.codes)],
+            "rewarded": [str(UUID(int=task_id)) for task_id in self.reopened]
+        })
@@ -0,0 +1,49 @@
+import asyncio
+from datetime import date
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.logger import logger
+
+
+class OverdueScheduler:
+    """
+    Фоновая задача, переводящая задачи с прошедшим сроком в статус OVERDUE.
+
+    Срок задается датой, поэтому задача становится просроченной в полночь
+    после due_date. Хранилище само выбирает только такие задачи (куча по сроку
+    в памяти, частичный индекс в SQLite), так что частая проверка почти
+    ничего не стоит, когда менять нечего.
+    """
+
+    def __init__(self, task_db, interval: float = 60.0):
+        self.task_db = task_db
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self):
+        if self.task_db.blocking:
+            return await run_in_threadpool(self.task_db.mark_overdue, date.today())
+        return self.task_db.mark_overdue(date.today())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error("Error marking overdue tasks: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,255 @@
+import heapq
+import math
+import re
+from typing import Dict, List, Set, Tuple
+
+# Слова на кириллице и латинице, цифры и подчеркивание
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Вес совпадения в зависимости от поля задачи
+FIELD_WEIGHTS = {"title": 3.0, "tags": 2.0, "description": 1.0}
+
+MIN_PREFIX = 2
+MAX_PREFIX = 15
+# Сколько самых частых слов берем при раскрытии префикса
+MAX_EXPANSIONS = 32
+PREFIX_BOOST = 0.6
+# Пересечение множеств (цикл на C) во столько раз дешевле проверки задач по одной:
+# корзина разбирается им, если до раннего выхода ожидается больше len(корзины) / PREFILTER_RATIO проверок
+PREFILTER_RATIO = 16
+
+
+def tokenize(text: str) -> List[str]:
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower().replace("ё", "е"))
+
+
+def term_score(doc_terms: Dict[str, float], factors: Dict[str, float]) -> float:
+    # Лучший вклад слова запроса в задачу: максимум по раскрытиям; 0 - слово не найдено
+    best = 0.0
+    if len(factors) < len(doc_terms):
+        for word, factor in factors.items():
+            weight = doc_terms.get(word)
+            if weight is not None and weight * factor > best:
+                best = weight * factor
+    else:
+        for word, weight in doc_terms.items():
+            factor = factors.get(word)
+            if factor is not None and weight * factor > best:
+                best = weight * factor
+    return best
+
+
+def push(top: List[Tuple[float, int]], item: Tuple[float, int], limit: int):
+    # Мин-куча k лучших (балл, id)
+    if len(top) < limit:
+        heapq.heappush(top, item)
+    elif item > top[0]:
+        heapq.heapreplace(top, item)
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс с постингами, упорядоченными по вкладу (impact-ordered).
+
+    Постинги слова разложены по весу совпадения: {вес: множество id}. Вес
+    задачи для слова берется из _doc_terms, поэтому постинги не дублируются.
+    Поиск берет кандидатов из самого редкого слова запроса от большего вклада
+    к меньшему, остальные слова проверяет по задаче и останавливается, как
+    только верхняя граница оставшихся кандидатов не выше k-го результата
+    (max-score). Баллы в выдаче точные; из задач с одинаковым баллом на
+    границе k попадают уже просмотренные.
+    """
+
+    def __init__(self):
+        # Инвертированный индекс: слово -> {вес: множество id задач}
+        self._postings: Dict[str, Dict[float, Set[int]]] = {}
+        # Число задач со словом (document frequency) - для idf и выбора раскрытий префикса
+        self._counts: Dict[str, int] = {}
+        # Префикс -> слова словаря с этим префиксом
+        self._prefixes: Dict[str, Set[str]] = {}
+        # Слова каждой задачи с весами, чтобы удалять ее без повторной токенизации
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def _task_terms(self, task) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        fields = (
+            ("title", [task.title]),
+            ("description", [task.description or ""]),
+            ("tags", task.tags),
+        )
+        for field, texts in fields:
+            weight = FIELD_WEIGHTS[field]
+            for text in texts:
+                for token in tokenize(text):
+                    terms[token] = terms.get(token, 0.0) + weight
+        return terms
+
+    def add(self, task):
+        # task - любой объект с id (int), title, description и tags
+        if task.id in self._doc_terms:
+            self.remove(task.id)
+        terms = self._task_terms(task)
+        self._doc_terms[task.id] = terms
+        for token, weight in terms.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                for size in range(MIN_PREFIX, min(len(token), MAX_PREFIX) + 1):
+                    self._prefixes.setdefault(token[:size], set()).add(token)
+            ids = postings.get(weight)
+            if ids is None:
+                ids = postings[weight] = set()
+            ids.add(task.id)
+            self._counts[token] = self._counts.get(token, 0) + 1
+
+    def remove(self, task_id: int):
+        terms = self._doc_terms.pop(task_id, None)
+        if not terms:
+            return
+        for token, weight in terms.items():
+            self._counts[token] -= 1
+            postings = self._postings[token]
+            ids = postings[weight]
+            ids.discard(task_id)
+            if ids:
+                continue
+            del postings[weight]
+            if postings:
+                continue
+            del self._postings[token]
+            del self._counts[token]
+            for size in range(MIN_PREFIX, min(len(token), MAX_PREFIX) + 1):
+                prefix = token[:size]
+                words = self._prefixes[prefix]
+                words.discard(token)
+                if not words:
+                    del self._prefixes[prefix]
+
+    def _expand(self, term: str) -> List[str]:
+        if len(term) < MIN_PREFIX or len(term) > MAX_PREFIX:
+            return [term] if term in self._postings else []
+        words = self._prefixes.get(term)
+        if not words:
+            return []
+        if len(words) <= MAX_EXPANSIONS:
+            return list(words)
+        # Самые частые слова с этим префиксом; само слово запроса остается всегда
+        expansions = heapq.nlargest(MAX_EXPANSIONS, words, key=self._counts.__getitem__)
+        if term in self._postings and term not in expansions:
+            expansions[-1] = term
+        return expansions
+
+    def _factors(self, term: str) -> Tuple[Dict[str, float], int]:
+        # Слова раскрытия -> множитель вклада (idf, ослабленный для префикса) и частота термина
+        total = len(self._doc_terms)
+        factors: Dict[str, float] = {}
+        frequency = 0
+        for word in self._expand(term):
+            count = self._counts[word]
+            idf = math.log(1 + total / count)
+            factors[word] = idf if word == term else idf * PREFIX_BOOST
+            frequency += count
+        return factors, frequency
+
+    def _scored_groups(self, impact: float, ids: Set[int], others: List[Dict[str, float]]) -> List[Tuple[float, Set[int]]]:
+        # Задачи из ids, в которых есть каждое из остальных слов, сгруппированные по точному баллу.
+        # Вклады слова перебираются от большего к меньшему, поэтому задача получает максимум по раскрытиям
+        groups: Dict[float, Set[int]] = {impact: ids}
+        for factors in others:
+            contributions = sorted(
+                ((weight * factor, bucket) for word, factor in factors.items()
+                 for weight, bucket in self._postings[word].items()),
+                key=lambda item: item[0], reverse=True
+            )
+            # У одного слова корзины не пересекаются; у раскрытий задача может быть в нескольких
+            disjoint = len(factors) == 1
+            merged: Dict[float, Set[int]] = {}
+            for score, group in groups.items():
+                rest = group if disjoint else set(group)
+                for contribution, bucket in contributions:
+                    if not rest:
+                        break
+                    hit = rest & bucket
+                    if hit:
+                        if not disjoint:
+                            rest -= hit
+                        merged.setdefault(score + contribution, set()).update(hit)
+            groups = merged
+        return sorted(groups.items(), key=lambda item: item[0], reverse=True)
+
+    def search(self, query: str, limit: int = 50) -> List[int]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+
+        # Все слова запроса должны найтись; кандидаты дает самое редкое, остальные проверяются от редких
+        expanded = sorted((self._factors(term) for term in terms), key=lambda item: item[1])
+        if not expanded[0][1]:
+            return []
+        driver = expanded[0][0]
+        others = [factors for factors, _ in expanded[1:]]
+        # Внутри корзины перебор останавливается, только когда k задач набрали ее верхнюю
+        # границу, то есть остальные слова дали лучший вклад. Доля таких задач - в
+        # предположении независимости слов
+        total = len(self._doc_terms)
+        density = 1.0
+        others_bound = 0.0
+        for factors in others:
+            best = max(weight * factor for word, factor in factors.items() for weight in self._postings[word])
+            hits = sum(len(ids) for word, factor in factors.items()
+                       for weight, ids in self._postings[word].items() if weight * factor == best)
+            density *= min(hits, total) / total
+            others_bound += best
+
+        # Корзины (вклад, множество id) самого редкого слова от большего вклада к меньшему
+        impacts = sorted(
+            ((weight * factor, ids) for word, factor in driver.items() for weight, ids in self._postings[word].items()),
+            key=lambda item: item[0], reverse=True
+        )
+
+        doc_terms = self._doc_terms
+        top: List[Tuple[float, int]] = []
+        seen: Set[int] = set()
+        several = len(impacts) > 1
+        for impact, ids in impacts:
+            # Max-score: даже лучшие совпадения остальных слов не поднимут кандидатов выше k-го
+            bound = impact + others_bound
+            if len(top) >= limit and bound <= top[0][0]:
+                break
+            if others and len(ids) * density < limit * PREFILTER_RATIO:
+                # Ранний выход ожидается не скоро - корзина разбирается пересечением множеств
+                # (цикл на C) сразу по группам с одинаковым баллом
+                if several:
+                    ids = ids - seen
+                    seen.update(ids)
+                for score, group in self._scored_groups(impact, ids, others):
+                    if len(top) >= limit and score <= top[0][0]:
+                        break
+                    for task_id in heapq.nlargest(limit, group):
+                        push(top, (score, task_id), limit)
+                continue
+            for task_id in ids:
+                if len(top) >= limit and bound <= top[0][0]:
+                    break
+                if several:
+                    # Первое появление - максимальный вклад задачи для этого слова
+                    if task_id in seen:
+                        continue
+                    seen.add(task_id)
+                score = impact
+                terms_of_task = doc_terms[task_id]
+                for factors in others:
+                    part = term_score(terms_of_task, factors)
+                    if not part:
+                        break
+                    score += part
+                else:
+                    push(top, (score, task_id), limit)
+
+        top.sort(reverse=True)
+        return [task_id for _, task_id in top]
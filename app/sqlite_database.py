@@ -0,0 +1,1056 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, date
+from typing import List, Optional, Dict, Any, Iterable, Tuple
+from urllib.parse import quote
+from uuid import UUID, uuid4
+
+from app.analytics import ActivityBuckets
+from app.auth import DEFAULT_USER, USER_NAME
+from app.changes import CHANGE_LOG_SIZE, encode_put, encode_delete
+from app.database import (
+    SORT_FIELDS, VersionConflictError, encode_cursor, decode_cursor, apply_update, imported_task
+)
+from app.logger import logger
+from app.models import Task, TaskCreate, TaskUpdate, TaskImport, TaskStatus, TaskPriority
+from app.search import tokenize
+from app.storage import task_from_dict
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    tags TEXT NOT NULL,
+    due_date TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE INDEX IF NOT EXISTS idx_tasks_title ON tasks(title, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks(COALESCE(due_date, '9999-12-31'), id);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_created_at ON tasks(status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_priority_created_at ON tasks(priority, created_at, id);
+-- Только открытые задачи со сроком: поиск просроченных читает лишь те строки, что изменятся
+CREATE INDEX IF NOT EXISTS idx_tasks_open_due ON tasks(due_date)
+    WHERE status IN ('создано', 'в работе') AND due_date IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS task_tags (
+    tag TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    PRIMARY KEY (tag, task_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_task_tags_task ON task_tags(task_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    title, description, tags,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4'
+);
+
+-- Счетчики для статистики поддерживаются триггерами при каждой записи
+CREATE TABLE IF NOT EXISTS task_counts (
+    field TEXT NOT NULL,
+    value NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (field, value)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS tasks_counts_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO task_counts VALUES ('status', NEW.status, 1)
+        ON CONFLICT(field, value) DO UPDATE SET n = n + 1;
+    INSERT INTO task_counts VALUES ('priority', NEW.priority, 1)
+        ON CONFLICT(field, value) DO UPDATE SET n = n + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_counts_delete AFTER DELETE ON tasks BEGIN
+    UPDATE task_counts SET n = n - 1 WHERE field = 'status' AND value = OLD.status;
+    UPDATE task_counts SET n = n - 1 WHERE field = 'priority' AND value = OLD.priority;
+END;
+
+-- Активность по часовым корзинам для аналитики: создано, завершено и суммарное
+-- время до завершения. Это история событий, удаление задачи ее не меняет
+CREATE TABLE IF NOT EXISTS task_activity (
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    created INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    completion_seconds REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, hour)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS tasks_activity_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO task_activity (day, hour, created)
+        VALUES (substr(NEW.created_at, 1, 10), CAST(substr(NEW.created_at, 12, 2) AS INTEGER), 1)
+        ON CONFLICT(day, hour) DO UPDATE SET created = created + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_activity_insert_completed AFTER INSERT ON tasks
+WHEN NEW.status = 'завершено' BEGIN
+    INSERT INTO task_activity (day, hour, completed, completion_seconds)
+        VALUES (
+            substr(COALESCE(NEW.updated_at, NEW.created_at), 1, 10),
+            CAST(substr(COALESCE(NEW.updated_at, NEW.created_at), 12, 2) AS INTEGER),
+            1,
+            MAX((julianday(COALESCE(NEW.updated_at, NEW.created_at)) - julianday(NEW.created_at)) * 86400, 0)
+        )
+        ON CONFLICT(day, hour) DO UPDATE SET
+            completed = completed + 1, completion_seconds = completion_seconds + excluded.completion_seconds;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_activity_completed AFTER UPDATE OF status ON tasks
+WHEN NEW.status = 'завершено' AND OLD.status != 'завершено' BEGIN
+    INSERT INTO task_activity (day, hour, completed, completion_seconds)
+        VALUES (
+            substr(NEW.updated_at, 1, 10),
+            CAST(substr(NEW.updated_at, 12, 2) AS INTEGER),
+            1,
+            MAX((julianday(NEW.updated_at) - julianday(NEW.created_at)) * 86400, 0)
+        )
+        ON CONFLICT(day, hour) DO UPDATE SET
+            completed = completed + 1, completion_seconds = completion_seconds + excluded.completion_seconds;
+END;
+
+-- Журнал изменений для дельта-синхронизации; AUTOINCREMENT не переиспользует
+-- номера после очистки, а старые записи сверх CHANGE_LOG_SIZE удаляются
+CREATE TABLE IF NOT EXISTS task_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL,
+    deleted INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_changes_task ON task_changes(task_id, seq);
+
+CREATE TRIGGER IF NOT EXISTS tasks_changes_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO task_changes (task_id, deleted) VALUES (NEW.id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_changes_update AFTER UPDATE ON tasks BEGIN
+    INSERT INTO task_changes (task_id, deleted) VALUES (NEW.id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_changes_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO task_changes (task_id, deleted) VALUES (OLD.id, 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS task_changes_trim AFTER INSERT ON task_changes BEGIN
+    DELETE FROM task_changes WHERE seq <= NEW.seq - {CHANGE_LOG_SIZE};
+END;
+
+-- События задач для геймификации: создание и завершение. Каждый воркер
+-- читает таблицу по seq, поэтому видит события всех процессов
+CREATE TABLE IF NOT EXISTS task_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    at TEXT NOT NULL,
+    priority INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS tasks_events_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO task_events (kind, at, priority) VALUES ('created', NEW.created_at, NEW.priority);
+END;
+
+-- XP за завершение начисляется один раз на задачу: повторное завершение
+-- после возврата в работу события не дает. task_rewards - задачи, за
+-- завершение которых событие уже записано
+CREATE TABLE IF NOT EXISTS task_rewards (
+    task_id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+DROP TRIGGER IF EXISTS tasks_events_insert_completed;
+DROP TRIGGER IF EXISTS tasks_events_completed;
+
+CREATE TRIGGER IF NOT EXISTS tasks_rewards_insert_completed AFTER INSERT ON tasks
+WHEN NEW.status = 'завершено' AND NOT EXISTS (SELECT 1 FROM task_rewards WHERE task_id = NEW.id) BEGIN
+    INSERT INTO task_rewards (task_id) VALUES (NEW.id);
+    INSERT INTO task_events (kind, at, priority)
+        VALUES ('completed', COALESCE(NEW.updated_at, NEW.created_at), NEW.priority);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_rewards_completed AFTER UPDATE OF status ON tasks
+WHEN NEW.status = 'завершено' AND OLD.status != 'завершено'
+    AND NOT EXISTS (SELECT 1 FROM task_rewards WHERE task_id = NEW.id) BEGIN
+    INSERT INTO task_rewards (task_id) VALUES (NEW.id);
+    INSERT INTO task_events (kind, at, priority) VALUES ('completed', NEW.updated_at, NEW.priority);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_rewards_delete AFTER DELETE ON tasks BEGIN
+    DELETE FROM task_rewards WHERE task_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tasks_counts_update AFTER UPDATE OF status, priority ON tasks BEGIN
+    UPDATE task_counts SET n = n - 1 WHERE field = 'status' AND value = OLD.status;
+    INSERT INTO task_counts VALUES ('status', NEW.status, 1)
+        ON CONFLICT(field, value) DO UPDATE SET n = n + 1;
+    UPDATE task_counts SET n = n - 1 WHERE field = 'priority' AND value = OLD.priority;
+    INSERT INTO task_counts VALUES ('priority', NEW.priority, 1)
+        ON CONFLICT(field, value) DO UPDATE SET n = n + 1;
+END;
+"""
+
+# Выражение ORDER BY для каждого поля сортировки; совпадает с индексами выше
+SORT_COLUMNS = {
+    "title": "title",
+    "status": "status",
+    "priority": "priority",
+    "due_date": "COALESCE(due_date, '9999-12-31')",
+    "created_at": "created_at",
+}
+
+TASK_COLUMNS = "id, title, description, status, priority, tags, due_date, created_at, updated_at, version"
+
+INSERT_TASK = f"INSERT INTO tasks ({TASK_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+UPDATE_TASK = (
+    "UPDATE tasks SET title = ?, description = ?, status = ?, priority = ?, tags = ?, "
+    "due_date = ?, updated_at = ?, version = ? WHERE id = ?"
+)
+REPLACE_TASK = (
+    "UPDATE tasks SET title = ?, description = ?, status = ?, priority = ?, tags = ?, "
+    "due_date = ?, created_at = ?, updated_at = ?, version = ? WHERE rowid = ?"
+)
+SELECT_TASK = f"SELECT rowid, {TASK_COLUMNS} FROM tasks WHERE id = ?"
+INSERT_TAG = "INSERT OR IGNORE INTO task_tags (tag, task_id) VALUES (?, ?)"
+DELETE_TAGS = "DELETE FROM task_tags WHERE task_id = ?"
+INSERT_FTS = "INSERT INTO tasks_fts (rowid, title, description, tags) VALUES (?, ?, ?, ?)"
+DELETE_FTS = "DELETE FROM tasks_fts WHERE rowid = ?"
+
+# Сколько закодированных задач держит кэш JSON-ответов
+JSON_CACHE_SIZE = 10_000
+
+
+def _sql_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _row_to_task(row) -> Task:
+    return task_from_dict({
+        "id": row["id"],
+        "title": row["title"],
+        "description": row["description"],
+        "status": row["status"],
+        "priority": row["priority"],
+        "tags": json.loads(row["tags"]),
+        "due_date": row["due_date"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "version": row["version"],
+    })
+
+
+def _row_to_json(row) -> bytes:
+    # Порядок полей и формат - как у JSONResponse для модели Task
+    return json.dumps({
+        "title": row["title"],
+        "description": row["description"],
+        "status": row["status"],
+        "tags": json.loads(row["tags"]),
+        "priority": row["priority"],
+        "due_date": row["due_date"],
+        "id": row["id"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "version": row["version"],
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_text(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _text_or_null(value: Optional[str]) -> bytes:
+    # Идентификаторы, даты и время хранятся ASCII-строками без символов, требующих экранирования
+    return b'"%s"' % value.encode("ascii") if value is not None else b"null"
+
+
+# Поле Task -> его JSON прямо из значения столбца
+FIELD_ENCODERS = {
+    "title": _json_text,
+    "description": _json_text,
+    "status": _json_text,
+    # Теги уже хранятся JSON-массивом
+    "tags": lambda value: value.encode("utf-8"),
+    "priority": lambda value: b"%d" % value,
+    "due_date": _text_or_null,
+    "id": _text_or_null,
+    "created_at": _text_or_null,
+    "updated_at": _text_or_null,
+    "version": lambda value: b"%d" % value,
+}
+
+
+def _row_sort_key(row, sort_by: str):
+    # Ключ сортировки строки в том виде, в каком его хранит курсор (как TaskRecord.sort_key)
+    if sort_by == "due_date":
+        return date.fromisoformat(row["due_date"]) if row["due_date"] else date.max
+    if sort_by == "created_at":
+        return datetime.fromisoformat(row["created_at"])
+    return row[sort_by]
+
+
+def _fts_text(text: Optional[str]) -> str:
+    # Тот же токенизатор, что и в памяти: нижний регистр, ё -> е
+    return " ".join(tokenize(text or ""))
+
+
+class ConnectionPool:
+    """Пул соединений: у каждого потока свое соединение со своим кэшем подготовленных выражений."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=256
+            )
+            conn.row_factory = sqlite3.Row
+            # Ожидание блокировки задаем первым: при запуске нескольких воркеров
+            # они одновременно переключают журнал и создают схему
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class SQLiteTaskDatabase:
+    """
+    Хранилище задач в файле SQLite (режим WAL).
+
+    Контракт методов совпадает с TaskDatabase. Фильтры, сортировка, пагинация
+    и статистика выполняются в SQL по индексам. Вызовы блокирующие, поэтому
+    API выполняет их в пуле потоков (см. blocking).
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = "tasks.db", owner: Optional[str] = None):
+        self.path = path
+        # Пользователь, которому принадлежат задачи файла (для событий)
+        self.owner = owner
+        self.pool = ConnectionPool(path)
+        # LRU-кэш JSON задач: id -> (версия, байты). Запись считается
+        # актуальной, только если версия совпадает со строкой в базе
+        self._json_cache: "OrderedDict[str, Tuple[Optional[str], bytes]]" = OrderedDict()
+        self._json_cache_lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+        self._add_version_column()
+        self._backfill_activity()
+        self._backfill_events()
+
+    def _add_version_column(self):
+        # База из версии без tasks.version: у всех задач версия 1
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(tasks)")]
+            if "version" not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _backfill_activity(self):
+        # База из версии без task_activity: один раз заполняем корзины из задач
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            empty = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM task_activity)").fetchone()[0]
+            if empty and conn.execute("SELECT EXISTS (SELECT 1 FROM tasks)").fetchone()[0]:
+                conn.execute(
+                    "INSERT INTO task_activity (day, hour, created) "
+                    "SELECT substr(created_at, 1, 10), CAST(substr(created_at, 12, 2) AS INTEGER), COUNT(*) "
+                    "FROM tasks GROUP BY 1, 2"
+                )
+                conn.execute(
+                    "INSERT INTO task_activity (day, hour, completed, completion_seconds) "
+                    "SELECT substr(COALESCE(updated_at, created_at), 1, 10), "
+                    "CAST(substr(COALESCE(updated_at, created_at), 12, 2) AS INTEGER), COUNT(*), "
+                    "SUM(MAX((julianday(COALESCE(updated_at, created_at)) - julianday(created_at)) * 86400, 0)) "
+                    "FROM tasks WHERE status = ? GROUP BY 1, 2 "
+                    "ON CONFLICT(day, hour) DO UPDATE SET "
+                    "completed = excluded.completed, completion_seconds = excluded.completion_seconds",
+                    (TaskStatus.COMPLETED.value,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _backfill_events(self):
+        # База из версии без task_events: история событий восстанавливается из задач
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            empty = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM task_events)").fetchone()[0]
+            if empty and conn.execute("SELECT EXISTS (SELECT 1 FROM tasks)").fetchone()[0]:
+                conn.execute(
+                    "INSERT INTO task_events (kind, at, priority) "
+                    "SELECT kind, at, priority FROM ("
+                    "    SELECT 'created' AS kind, created_at AS at, priority FROM tasks "
+                    "    UNION ALL "
+                    "    SELECT 'completed', COALESCE(updated_at, created_at), priority FROM tasks WHERE status = ?"
+                    ") ORDER BY at, kind DESC",
+                    (TaskStatus.COMPLETED.value,)
+                )
+            # База из версии без task_rewards: завершенные задачи уже награждены
+            if not conn.execute("SELECT EXISTS (SELECT 1 FROM task_rewards)").fetchone()[0]:
+                conn.execute(
+                    "INSERT INTO task_rewards (task_id) SELECT id FROM tasks WHERE status = ?",
+                    (TaskStatus.COMPLETED.value,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _conn(self) -> sqlite3.Connection:
+        return self.pool.get()
+
+    def close(self):
+        self.pool.close()
+
+    # ------------------------------------------------------------------
+    # Кэш JSON
+    # ------------------------------------------------------------------
+
+    def _cached_json(self, row) -> bytes:
+        task_id, version = row["id"], row["version"]
+        with self._json_cache_lock:
+            entry = self._json_cache.get(task_id)
+            if entry is not None and entry[0] == version:
+                self._json_cache.move_to_end(task_id)
+                return entry[1]
+        encoded = _row_to_json(row)
+        with self._json_cache_lock:
+            self._json_cache[task_id] = (version, encoded)
+            self._json_cache.move_to_end(task_id)
+            if len(self._json_cache) > JSON_CACHE_SIZE:
+                self._json_cache.popitem(last=False)
+        return encoded
+
+    def _invalidate_json(self, task_id: str):
+        with self._json_cache_lock:
+            self._json_cache.pop(task_id, None)
+
+    # ------------------------------------------------------------------
+    # Запись
+    # ------------------------------------------------------------------
+
+    def _write_index_rows(self, conn: sqlite3.Connection, rowid: int, task: Task):
+        task_id = str(task.id)
+        conn.executemany(INSERT_TAG, [(tag, task_id) for tag in task.tags])
+        conn.execute(INSERT_FTS, (
+            rowid,
+            _fts_text(task.title),
+            _fts_text(task.description),
+            _fts_text(" ".join(task.tags))
+        ))
+
+    def _insert_row(self, conn: sqlite3.Connection, task_create: TaskCreate, now: datetime) -> Task:
+        task = Task(
+            id=uuid4(),
+            title=task_create.title,
+            description=task_create.description,
+            status=task_create.status,
+            priority=task_create.priority,
+            tags=task_create.tags,
+            due_date=task_create.due_date,
+            created_at=now,
+            updated_at=now
+        )
+        self._insert_task(conn, task)
+        return task
+
+    def _insert_task(self, conn: sqlite3.Connection, task: Task):
+        cur = conn.execute(INSERT_TASK, (
+            str(task.id), task.title, task.description, task.status.value, task.priority.value,
+            json.dumps(task.tags, ensure_ascii=False), _sql_value(task.due_date),
+            _sql_value(task.created_at), _sql_value(task.updated_at), task.version
+        ))
+        self._write_index_rows(conn, cur.lastrowid, task)
+
+    def _update_row(self, conn: sqlite3.Connection, rowid: int, task: Task, task_update: TaskUpdate, now: datetime):
+        apply_update(task, task_update, now)
+        conn.execute(UPDATE_TASK, (
+            task.title, task.description, task.status.value, task.priority.value,
+            json.dumps(task.tags, ensure_ascii=False), _sql_value(task.due_date),
+            _sql_value(task.updated_at), task.version, str(task.id)
+        ))
+        conn.execute(DELETE_TAGS, (str(task.id),))
+        conn.execute(DELETE_FTS, (rowid,))
+        self._write_index_rows(conn, rowid, task)
+        self._invalidate_json(str(task.id))
+
+    def _delete_row(self, conn: sqlite3.Connection, task_id: UUID) -> bool:
+        row = conn.execute("SELECT rowid FROM tasks WHERE id = ?", (str(task_id),)).fetchone()
+        if row is None:
+            return False
+        conn.execute("DELETE FROM tasks WHERE rowid = ?", (row["rowid"],))
+        conn.execute(DELETE_TAGS, (str(task_id),))
+        conn.execute(DELETE_FTS, (row["rowid"],))
+        self._invalidate_json(str(task_id))
+        return True
+
+    def create_task(self, task_create: TaskCreate) -> Task:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            task = self._insert_row(conn, task_create, datetime.now())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info("Task created: %s", task.title)
+        return task
+
+    def update_task(self, task_id: UUID, task_update: TaskUpdate,
+                    expected_version: Optional[int] = None) -> Optional[Task]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(SELECT_TASK, (str(task_id),)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            # Проверка и запись в одной транзакции IMMEDIATE: между ними никто не пишет
+            if expected_version is not None and row["version"] != expected_version:
+                raise VersionConflictError(row["version"])
+
+            task = _row_to_task(row)
+            old_status = task.status
+            self._update_row(conn, row["rowid"], task, task_update, datetime.now())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if task_update.status == TaskStatus.COMPLETED and old_status != TaskStatus.COMPLETED:
+            logger.info("Task completed: %s", task.title)
+        else:
+            logger.info("Task updated: %s", task.title)
+        return task
+
+    def delete_task(self, task_id: UUID) -> bool:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = self._delete_row(conn, task_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if deleted:
+            logger.info("Task deleted: %s", task_id)
+        return deleted
+
+    def create_tasks(self, task_creates: List[TaskCreate]) -> List[Task]:
+        # Вся пачка - одна транзакция и один fsync
+        now = datetime.now()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tasks = [self._insert_row(conn, task_create, now) for task_create in task_creates]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info("Tasks created in bulk: %s", len(tasks))
+        return tasks
+
+    def update_tasks(self, updates: List[Tuple[UUID, TaskUpdate]]) -> List[Optional[Task]]:
+        now = datetime.now()
+        results: List[Optional[Task]] = []
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for task_id, task_update in updates:
+                row = conn.execute(SELECT_TASK, (str(task_id),)).fetchone()
+                if row is None:
+                    results.append(None)
+                    continue
+                task = _row_to_task(row)
+                self._update_row(conn, row["rowid"], task, task_update, now)
+                results.append(task)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info("Tasks updated in bulk: %s", sum(1 for t in results if t is not None))
+        return results
+
+    def delete_tasks(self, task_ids: List[UUID]) -> List[bool]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = [self._delete_row(conn, task_id) for task_id in task_ids]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info("Tasks deleted in bulk: %s", sum(results))
+        return results
+
+    def _replace_row(self, conn: sqlite3.Connection, rowid: int, task: Task):
+        # Замена на месте, а не удаление и вставка: триггеры активности видят
+        # переход статуса, а не новую задачу
+        conn.execute(REPLACE_TASK, (
+            task.title, task.description, task.status.value, task.priority.value,
+            json.dumps(task.tags, ensure_ascii=False), _sql_value(task.due_date),
+            _sql_value(task.created_at), _sql_value(task.updated_at), task.version, rowid
+        ))
+        conn.execute(DELETE_TAGS, (str(task.id),))
+        conn.execute(DELETE_FTS, (rowid,))
+        self._write_index_rows(conn, rowid, task)
+        self._invalidate_json(str(task.id))
+
+    def import_tasks(self, items: List[TaskImport]) -> List[Task]:
+        # Задачи с существующим id заменяются, остальные добавляются
+        now = datetime.now()
+        tasks = [imported_task(item, now) for item in items]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for task in tasks:
+                row = conn.execute("SELECT rowid, version FROM tasks WHERE id = ?", (str(task.id),)).fetchone()
+                if row is None:
+                    self._insert_task(conn, task)
+                else:
+                    task.version = row["version"] + 1
+                    self._replace_row(conn, row["rowid"], task)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info("Tasks imported: %s", len(tasks))
+        return tasks
+
+    # ------------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------------
+
+    def get_task(self, task_id: UUID) -> Optional[Task]:
+        row = self._conn().execute(SELECT_TASK, (str(task_id),)).fetchone()
+        return _row_to_task(row) if row else None
+
+    def get_task_json(self, task_id: UUID) -> Optional[bytes]:
+        row = self._conn().execute(SELECT_TASK, (str(task_id),)).fetchone()
+        return self._cached_json(row) if row else None
+
+    def _query_rows(
+        self,
+        status: Optional[TaskStatus],
+        priority: Optional[TaskPriority],
+        tags: Optional[Iterable[str]],
+        skip: int,
+        limit: int,
+        sort_by: str,
+        order: str,
+        cursor: Optional[str],
+        columns: str = TASK_COLUMNS
+    ) -> Tuple[List[sqlite3.Row], Optional[str]]:
+        if sort_by not in SORT_FIELDS:
+            sort_by = "created_at"
+        column = SORT_COLUMNS[sort_by]
+        direction = "DESC" if order == "desc" else "ASC"
+
+        where: List[str] = []
+        params: List[Any] = []
+        if status is not None:
+            where.append("status = ?")
+            params.append(status.value)
+        if priority is not None:
+            where.append("priority = ?")
+            params.append(priority.value)
+        if tags:
+            tags = list(dict.fromkeys(tags))
+            where.append(
+                f"id IN (SELECT task_id FROM task_tags WHERE tag IN ({', '.join('?' * len(tags))}))"
+            )
+            params.extend(tags)
+        if cursor:
+            # Keyset-пагинация: продолжаем строго после последней строки страницы
+            key, after_id = decode_cursor(cursor, sort_by, order)
+            where.append(f"({column}, id) {'<' if order == 'desc' else '>'} (?, ?)")
+            params.extend([_sql_value(key), str(after_id)])
+
+        sql = f"SELECT {columns} FROM tasks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {column} {direction}, id {direction} LIMIT ? OFFSET ?"
+        params.extend([max(limit, 0), max(skip, 0)])
+
+        rows = self._conn().execute(sql, params).fetchall()
+
+        next_cursor = None
+        if rows and len(rows) >= limit:
+            last = rows[-1]
+            next_cursor = encode_cursor(sort_by, order, _row_sort_key(last, sort_by), UUID(last["id"]))
+        return rows, next_cursor
+
+    def query_tasks(
+        self,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[TaskPriority] = None,
+        tags: Optional[Iterable[str]] = None,
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        order: str = "desc",
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Task], Optional[str]]:
+        rows, next_cursor = self._query_rows(status, priority, tags, skip, limit, sort_by, order, cursor)
+        return [_row_to_task(row) for row in rows], next_cursor
+
+    def query_json(
+        self,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[TaskPriority] = None,
+        tags: Optional[Iterable[str]] = None,
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        order: str = "desc",
+        cursor: Optional[str] = None
+    ) -> Tuple[List[bytes], Optional[str]]:
+        rows, next_cursor = self._query_rows(status, priority, tags, skip, limit, sort_by, order, cursor)
+        return [self._cached_json(row) for row in rows], next_cursor
+
+    def query_fields(
+        self,
+        fields: Tuple[str, ...],
+        rows: bool = False,
+        status: Optional[TaskStatus] = None,
+        priority: Optional[TaskPriority] = None,
+        tags: Optional[Iterable[str]] = None,
+        skip: int = 0,
+        limit: int = 100,
+        sort_by: str = "created_at",
+        order: str = "desc",
+        cursor: Optional[str] = None
+    ) -> Tuple[List[bytes], Optional[str]]:
+        # Читаются только нужные столбцы (плюс id и столбец сортировки для курсора)
+        sort_column = sort_by if sort_by in SORT_FIELDS else "created_at"
+        columns = ", ".join(dict.fromkeys(fields + ("id", sort_column)))
+        result, next_cursor = self._query_rows(
+            status, priority, tags, skip, limit, sort_by, order, cursor, columns
+        )
+        encoders = [FIELD_ENCODERS[field] for field in fields]
+        if rows:
+            fragments = [
+                b"[" + b",".join([encode(row[i]) for i, encode in enumerate(encoders)]) + b"]" for row in result
+            ]
+        else:
+            keys = [b'"%s":' % field.encode("ascii") for field in fields]
+            fragments = [
+                b"{" + b",".join([keys[i] + encode(row[i]) for i, encode in enumerate(encoders)]) + b"}"
+                for row in result
+            ]
+        return fragments, next_cursor
+
+    def get_tasks(self, skip: int = 0, limit: int = 100, sort_by: str = "created_at", order: str = "desc") -> List[Task]:
+        tasks, _ = self.query_tasks(skip=skip, limit=limit, sort_by=sort_by, order=order)
+        return tasks
+
+    def mark_overdue(self, today: date) -> List[Task]:
+        # Частичный индекс idx_tasks_open_due содержит только кандидатов,
+        # поэтому стоимость зависит от числа изменившихся задач
+        now = datetime.now()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT rowid, {TASK_COLUMNS} FROM tasks "
+                "WHERE status IN (?, ?) AND due_date IS NOT NULL AND due_date < ?",
+                (TaskStatus.CREATED.value, TaskStatus.IN_PROGRESS.value, today.isoformat())
+            ).fetchall()
+            tasks = []
+            for row in rows:
+                task = _row_to_task(row)
+                task.status = TaskStatus.OVERDUE
+                task.updated_at = now
+                task.version += 1
+                conn.execute(
+                    "UPDATE tasks SET status = ?, updated_at = ?, version = version + 1 WHERE rowid = ?",
+                    (task.status.value, _sql_value(now), row["rowid"])
+                )
+                self._invalidate_json(row["id"])
+                tasks.append(task)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if tasks:
+            logger.info("Tasks marked overdue: %s", len(tasks))
+        return tasks
+
+    def last_change_seq(self) -> int:
+        head = self._conn().execute("SELECT seq FROM sqlite_sequence WHERE name = 'task_changes'").fetchone()
+        return head[0] if head else 0
+
+    def generation(self) -> int:
+        # Поколение хранилища - seq последнего изменения; триггеры пишут его при каждой записи
+        return self.last_change_seq()
+
+    def get_task_version(self, task_id: UUID) -> Optional[int]:
+        row = self._conn().execute("SELECT version FROM tasks WHERE id = ?", (str(task_id),)).fetchone()
+        return row[0] if row else None
+
+    def get_changes(self, since: int, limit: int = 1000) -> Tuple[List[bytes], int, bool]:
+        # Для каждой задачи берем последнее изменение после since; страница
+        # упорядочена по seq, курсор - seq последней строки
+        conn = self._conn()
+        # Одна транзакция чтения - согласованный снимок журнала и задач
+        conn.execute("BEGIN")
+        try:
+            head = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'task_changes'").fetchone()
+            last_seq = head[0] if head else 0
+            oldest = conn.execute("SELECT MIN(seq) FROM task_changes").fetchone()[0]
+            trimmed_seq = oldest - 1 if oldest is not None else last_seq
+            if since < trimmed_seq or since > last_seq:
+                return [], last_seq, True
+
+            rows = conn.execute(
+                "WITH latest AS ("
+                "    SELECT task_id, MAX(seq) AS seq FROM task_changes WHERE seq > ? "
+                "    GROUP BY task_id ORDER BY seq LIMIT ?"
+                f") SELECT latest.seq AS change_seq, latest.task_id AS change_task, {', '.join('t.' + c for c in TASK_COLUMNS.split(', '))} "
+                "FROM latest LEFT JOIN tasks t ON t.id = latest.task_id ORDER BY latest.seq",
+                (since, max(limit, 0))
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+
+        fragments = []
+        for row in rows:
+            if row["id"] is None:
+                fragments.append(encode_delete(row["change_seq"], row["change_task"]))
+            else:
+                fragments.append(encode_put(row["change_seq"], self._cached_json(row)))
+        cursor = rows[-1]["change_seq"] if rows and len(rows) >= limit else last_seq
+        return fragments, cursor, False
+
+    def get_task_events(self, since: int, limit: int = 10000) -> Tuple[List[Tuple], int]:
+        # -> (события после seq since, seq последнего события)
+        rows = self._conn().execute(
+            "SELECT seq, kind, at, priority FROM task_events WHERE seq > ? ORDER BY seq LIMIT ?", (since, limit)
+        ).fetchall()
+        events = [(row["kind"], self.owner, datetime.fromisoformat(row["at"]), row["priority"]) for row in rows]
+        return events, rows[-1]["seq"] if rows else since
+
+    def get_activity(self) -> ActivityBuckets:
+        # Таблица маленькая (дни x 24 строки) и общая для всех воркеров
+        activity = ActivityBuckets()
+        activity.add_rows(self._conn().execute(
+            "SELECT day, hour, created, completed, completion_seconds FROM task_activity ORDER BY day"
+        ))
+        return activity
+
+    def get_task_stats(self) -> Dict[str, Any]:
+        counts = {
+            (row["field"], row["value"]): row["n"]
+            for row in self._conn().execute("SELECT field, value, n FROM task_counts")
+        }
+        by_status = {s.value: counts.get(("status", s.value), 0) for s in TaskStatus}
+        by_priority = {p.name.lower(): counts.get(("priority", p.value), 0) for p in TaskPriority}
+        total = sum(by_status.values())
+        completed = by_status[TaskStatus.COMPLETED.value]
+
+        return {
+            "total": total,
+            "completed": completed,
+            "in_progress": by_status[TaskStatus.IN_PROGRESS.value],
+            "overdue": by_status[TaskStatus.OVERDUE.value],
+            "completion_rate": (completed / total * 100) if total > 0 else 0,
+            "by_status": by_status,
+            "by_priority": by_priority
+        }
+
+    def search_tasks(self, query: str, limit: int = 50) -> List[Task]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+        # Каждое слово запроса ищется как префикс, все слова обязательны
+        match = " AND ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+        rows = self._conn().execute(
+            f"SELECT {', '.join('t.' + c for c in TASK_COLUMNS.split(', '))} "
+            "FROM tasks_fts JOIN tasks t ON t.rowid = tasks_fts.rowid "
+            "WHERE tasks_fts MATCH ? ORDER BY bm25(tasks_fts, 3.0, 1.0, 2.0) LIMIT ?",
+            (match, limit)
+        )
+        return [_row_to_task(row) for row in rows]
+
+    def get_tasks_by_status(self, status_value: str) -> List[Task]:
+        try:
+            status = TaskStatus(status_value)
+        except ValueError:
+            return []
+        rows = self._conn().execute(
+            f"SELECT {TASK_COLUMNS} FROM tasks WHERE status = ? ORDER BY created_at, id",
+            (status.value,)
+        )
+        return [_row_to_task(row) for row in rows]
+
+    def get_tasks_by_priority(self, priority_value: int) -> List[Task]:
+        try:
+            priority = TaskPriority(priority_value)
+        except ValueError:
+            return []
+        rows = self._conn().execute(
+            f"SELECT {TASK_COLUMNS} FROM tasks WHERE priority = ? ORDER BY created_at, id",
+            (priority.value,)
+        )
+        return [_row_to_task(row) for row in rows]
+
+
+class PartitionedSQLiteTaskDatabase:
+    """
+    Задачи в SQLite, разделенные по владельцам: у каждого пользователя свой файл.
+
+    Задачи пользователя по умолчанию остаются в path, остальные лежат в
+    <path без расширения>-users/<пользователь>.db. У каждого файла свои
+    индексы, счетчики и блокировка записи, поэтому писатели разных
+    пользователей не ждут друг друга, а запросы читают только данные
+    запрашивающего пользователя. Разделы открываются при первом обращении
+    и остаются открытыми; соединения у каждого раздела свои, по одному на поток.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = "tasks.db"):
+        self.path = path
+        self.directory = os.path.splitext(path)[0] + "-users"
+        self.partitions: Dict[str, SQLiteTaskDatabase] = {}
+        # Защищает только открытие разделов; запись в разные разделы идет параллельно
+        self._lock = threading.Lock()
+        # Сводка раздела по версии файла: user -> (версия, (число задач, ближайший срок открытой задачи))
+        self._summaries: Dict[str, Tuple[Tuple, Tuple[int, Optional[str]]]] = {}
+        self._total = 0
+        self.for_user(DEFAULT_USER)
+
+    def _path(self, user: str) -> str:
+        if user == DEFAULT_USER:
+            return self.path
+        return os.path.join(self.directory, user + ".db")
+
+    def for_user(self, user: str) -> SQLiteTaskDatabase:
+        partition = self.partitions.get(user)
+        if partition is None:
+            with self._lock:
+                partition = self.partitions.get(user)
+                if partition is None:
+                    if user != DEFAULT_USER:
+                        os.makedirs(self.directory, exist_ok=True)
+                    partition = self.partitions[user] = SQLiteTaskDatabase(self._path(user), owner=user)
+        return partition
+
+    def users(self) -> List[str]:
+        # Разделы, созданные любым воркером, видны по файлам в каталоге
+        users = [DEFAULT_USER]
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    user, ext = os.path.splitext(entry.name)
+                    if ext == ".db" and user != DEFAULT_USER and USER_NAME.match(user):
+                        users.append(user)
+        return users
+
+    def partition_versions(self, users: Optional[Iterable[str]] = None) -> Dict[str, Tuple]:
+        # Версия раздела - время изменения и размер файла базы и ее WAL: stat вместо
+        # запроса, чтобы опрос тысяч разделов не открывал соединений
+        versions = {}
+        for user in self.users() if users is None else users:
+            path = self._path(user)
+            try:
+                db_stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            try:
+                wal_stat = os.stat(path + "-wal")
+                wal = (wal_stat.st_mtime_ns, wal_stat.st_size)
+            except FileNotFoundError:
+                wal = None
+            versions[user] = (db_stat.st_mtime_ns, db_stat.st_size, wal)
+        return versions
+
+    def _summary(self, user: str, version: Tuple) -> Tuple[int, Optional[str]]:
+        # Перечитывается, только если файл раздела изменился (любым воркером). Короткое
+        # соединение только для чтения: раздел не открывается и не держит соединений в потоках
+        cached = self._summaries.get(user)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(self._path(user)))}?mode=ro", uri=True)
+        try:
+            total = conn.execute("SELECT COALESCE(SUM(n), 0) FROM task_counts WHERE field = 'status'").fetchone()[0]
+            # Условие совпадает с частичным индексом idx_tasks_open_due - MIN читает одну строку
+            next_due = conn.execute(
+                "SELECT MIN(due_date) FROM tasks "
+                "WHERE status IN ('создано', 'в работе') AND due_date IS NOT NULL"
+            ).fetchone()[0]
+        except sqlite3.OperationalError:
+            # Раздел только что создается другим воркером - посмотрим на следующем проходе
+            return 0, None
+        finally:
+            conn.close()
+        summary = (total, next_due)
+        self._summaries[user] = (version, summary)
+        return summary
+
+    def count_tasks(self) -> int:
+        # Блокирующий подсчет (вызывается в пуле потоков); __len__ отдает последний результат
+        self._total = sum(self._summary(user, version)[0] for user, version in self.partition_versions().items())
+        return self._total
+
+    def __len__(self) -> int:
+        return self._total
+
+    def mark_overdue(self, today: date) -> List[Task]:
+        # Открываются только разделы, где есть открытая задача со сроком раньше сегодняшнего
+        changed: List[Task] = []
+        today_value = today.isoformat()
+        for user, version in self.partition_versions().items():
+            next_due = self._summary(user, version)[1]
+            if next_due is not None and next_due < today_value:
+                changed.extend(self.for_user(user).mark_overdue(today))
+        return changed
+
+    def close(self):
+        with self._lock:
+            for partition in self.partitions.values():
+                partition.close()
@@ -0,0 +1,381 @@
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from app.models import Task, TaskStatus, TaskPriority
+
+SNAPSHOT_FILE = "snapshot.jsonl"
+SEGMENT_PREFIX = "wal-"
+SEGMENT_SUFFIX = ".log"
+
+
+def task_from_dict(data: Dict) -> Task:
+    # Валидация TaskBase отклоняет сроки в прошлом, поэтому при восстановлении
+    # собираем модель из уже проверенных данных без повторной валидации
+    return Task.model_construct(
+        id=UUID(data["id"]),
+        title=data["title"],
+        description=data.get("description"),
+        status=TaskStatus(data["status"]),
+        priority=TaskPriority(data["priority"]),
+        tags=list(data.get("tags") or []),
+        due_date=date.fromisoformat(data["due_date"]) if data.get("due_date") else None,
+        created_at=datetime.fromisoformat(data["created_at"]),
+        updated_at=datetime.fromisoformat(data["updated_at"]) if data.get("updated_at") else None,
+        version=int(data.get("version", 1))
+    )
+
+
+def _owner_field(owner: Optional[str]) -> bytes:
+    # Имена пользователей проверены (app.auth.check_user_name) и не требуют экранирования
+    return b'"owner":"' + owner.encode("ascii") + b'",' if owner is not None else b""
+
+
+def _events_field(events: Sequence[Tuple[str, int, int]]) -> bytes:
+    # События истории (вид, время, приоритет), за которые начислен XP
+    return b'"events":' + json.dumps(events, separators=(",", ":")).encode("ascii") + b"," if events else b""
+
+
+class MemoryStorage:
+    """Хранилище без персистентности: все данные живут только в памяти процесса."""
+
+    def load(self) -> Iterable[Dict[str, Any]]:
+        return []
+
+    def record_put(self, task_json: bytes, owner: Optional[str] = None, events: Sequence[Tuple[str, int, int]] = ()):
+        pass
+
+    def record_events(self, events: Sequence[Tuple[str, int, int]], owner: Optional[str] = None):
+        pass
+
+    def record_delete(self, task_id: UUID, owner: Optional[str] = None):
+        pass
+
+    def needs_snapshot(self) -> bool:
+        return False
+
+    def snapshot(self, items: List[Any], encode: Callable[[Any], bytes]):
+        pass
+
+    async def wait_flushed(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PartitionStorage(MemoryStorage):
+    """
+    Доля общего хранилища, принадлежащая одному пользователю.
+
+    Записи уходят в общий журнал с пометкой владельца; снимок делается сразу
+    по всем пользователям (snapshot_all), потому что журнал у них один.
+    """
+
+    def __init__(self, storage: MemoryStorage, owner: Optional[str], tasks: List[Dict[str, Any]],
+                 snapshot_all: Callable[[], None]):
+        self.storage = storage
+        self.owner = owner
+        self._tasks = tasks
+        self._snapshot_all = snapshot_all
+
+    def load(self) -> Iterable[Dict[str, Any]]:
+        tasks, self._tasks = self._tasks, []
+        return tasks
+
+    def record_put(self, task_json: bytes, owner: Optional[str] = None, events: Sequence[Tuple[str, int, int]] = ()):
+        self.storage.record_put(task_json, self.owner, events)
+
+    def record_events(self, events: Sequence[Tuple[str, int, int]], owner: Optional[str] = None):
+        self.storage.record_events(events, self.owner)
+
+    def record_delete(self, task_id: UUID, owner: Optional[str] = None):
+        self.storage.record_delete(task_id, self.owner)
+
+    def needs_snapshot(self) -> bool:
+        return self.storage.needs_snapshot()
+
+    def snapshot(self, items: List[Any], encode: Callable[[Any], bytes]):
+        self._snapshot_all()
+
+
+class LogStorage(MemoryStorage):
+    """
+    Журнал упреждающей записи (append-only) со снимками.
+
+    Каждая мутация дописывается строкой JSON в текущий сегмент журнала.
+    Фоновый поток сбрасывает накопленные записи пачкой и делает один fsync
+    на пачку (group commit), поэтому запись не блокируется на диске.
+    Изменение надежно сохранено только после fsync его пачки: API ждет его
+    через wait_flushed (DurableWritesMiddleware), прежде чем ответить.
+    Снимок пишется в отдельном потоке из неизменяемых копий записей;
+    после него старые сегменты удаляются.
+    """
+
+    def __init__(self, directory: str, fsync_interval: float = 0.05, snapshot_every: int = 100_000):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+
+        self._pending: List[bytes] = []
+        self._pending_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._urgent = threading.Event()
+        self._closed = False
+        self._records_since_snapshot = 0
+        self._snapshot_thread: Optional[threading.Thread] = None
+        # Номер последней записи в очереди и последней записи, прошедшей fsync
+        self._appended = 0
+        self._flushed = 0
+        # Ожидающие fsync: (номер записи, event loop, future)
+        self._waiters: List[Tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+        segments = self._segments()
+        self._segment = segments[-1] + 1 if segments else 1
+        self._file = open(self._segment_path(self._segment), "ab")
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    # ------------------------------------------------------------------
+    # Файлы
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:08d}{SEGMENT_SUFFIX}")
+
+    def _segments(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(numbers)
+
+    def _fsync_directory(self):
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    # ------------------------------------------------------------------
+    # Восстановление
+    # ------------------------------------------------------------------
+
+    def load(self) -> Iterable[Dict[str, Any]]:
+        # Возвращает задачи в формате JSON-словарей; в объекты их превращает TaskDatabase.
+        # Задачи пользователя, отличного от владельца по умолчанию, получают ключ "owner".
+        # История событий владельца - отдельный словарь {"events": [...], "rewarded": [id, ...]}:
+        # rewarded - задачи, за завершение которых XP уже начислен
+        tasks: Dict[Tuple[Optional[str], str], Dict] = {}
+        histories: Dict[Optional[str], Dict] = {}
+        first_segment = 0
+
+        def history(owner: Optional[str]) -> Dict:
+            data = histories.get(owner)
+            if data is None:
+                data = histories[owner] = {"events": [], "rewarded": set()}
+                if owner is not None:
+                    data["owner"] = owner
+            return data
+
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                first_segment = header["segment"]
+                for line in f:
+                    data = json.loads(line)
+                    if "events" in data:
+                        entry = history(data.get("owner"))
+                        entry["events"].extend(data["events"])
+                        entry["rewarded"].update(data["rewarded"])
+                    else:
+                        tasks[data.get("owner"), data["id"]] = data
+
+        for number in self._segments():
+            if number < first_segment or number == self._segment:
+                continue
+            with open(self._segment_path(number), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Оборванная последняя строка после аварийной остановки
+                        break
+                    owner = record.get("owner")
+                    if "events" in record:
+                        entry = history(owner)
+                        entry["events"].extend(record["events"])
+                    if record["op"] == "put":
+                        data = record["task"]
+                        if owner is not None:
+                            data["owner"] = owner
+                        tasks[owner, data["id"]] = data
+                        if any(kind == "completed" for kind, _, _ in record.get("events", ())):
+                            history(owner)["rewarded"].add(data["id"])
+                    elif record["op"] == "del":
+                        tasks.pop((owner, record["id"]), None)
+                        if owner in histories:
+                            histories[owner]["rewarded"].discard(record["id"])
+
+        return list(tasks.values()) + list(histories.values())
+
+    # ------------------------------------------------------------------
+    # Запись
+    # ------------------------------------------------------------------
+
+    def _append(self, line: bytes):
+        with self._pending_lock:
+            self._pending.append(line)
+            self._appended += 1
+            self._records_since_snapshot += 1
+        self._wakeup.set()
+
+    def record_put(self, task_json: bytes, owner: Optional[str] = None, events: Sequence[Tuple[str, int, int]] = ()):
+        self._append(b'{"op":"put",' + _owner_field(owner) + _events_field(events) + b'"task":' + task_json + b'}\n')
+
+    def record_events(self, events: Sequence[Tuple[str, int, int]], owner: Optional[str] = None):
+        self._append(b'{"op":"evt",' + _owner_field(owner) + _events_field(events)[:-1] + b'}\n')
+
+    def record_delete(self, task_id: UUID, owner: Optional[str] = None):
+        self._append(b'{"op":"del",' + _owner_field(owner) + b'"id":"' + str(task_id).encode("ascii") + b'"}\n')
+
+    def _write_pending(self):
+        # Вызывается под _io_lock
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+            appended = self._appended
+        if batch:
+            self._file.write(b"".join(batch))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._release_waiters(appended)
+
+    def _release_waiters(self, flushed: int):
+        with self._pending_lock:
+            self._flushed = flushed
+            ready = [waiter for waiter in self._waiters if waiter[0] <= flushed]
+            if ready:
+                self._waiters = [waiter for waiter in self._waiters if waiter[0] > flushed]
+        for _, loop, future in ready:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # Event loop уже закрыт - ждать некому
+                pass
+
+    async def wait_flushed(self):
+        """Ждет fsync всех записей, добавленных до вызова (не блокируя event loop)."""
+        with self._pending_lock:
+            if self._closed or self._appended <= self._flushed:
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._waiters.append((self._appended, loop, future))
+        self._urgent.set()
+        await future
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._io_lock:
+                if not self._closed:
+                    self._write_pending()
+            # Даем накопиться следующей пачке; если ответ на запрос ждет fsync,
+            # пауза прерывается - пачкой становится то, что пришло за время прошлого fsync
+            self._urgent.wait(self.fsync_interval)
+            self._urgent.clear()
+
+    # ------------------------------------------------------------------
+    # Снимки
+    # ------------------------------------------------------------------
+
+    def needs_snapshot(self) -> bool:
+        return (
+            self._records_since_snapshot >= self.snapshot_every
+            and not (self._snapshot_thread and self._snapshot_thread.is_alive())
+        )
+
+    def snapshot(self, items: List[Any], encode: Callable[[Any], bytes]):
+        # Переключаемся на новый сегмент: все, что после этой точки, попадет в него
+        with self._io_lock:
+            self._write_pending()
+            self._file.close()
+            self._segment += 1
+            self._file = open(self._segment_path(self._segment), "ab")
+            with self._pending_lock:
+                self._records_since_snapshot = 0
+            segment = self._segment
+
+        self._snapshot_thread = threading.Thread(
+            target=self._write_snapshot, args=(items, encode, segment), name="wal-snapshot", daemon=True
+        )
+        self._snapshot_thread.start()
+
+    def _write_snapshot(self, items: List[Any], encode: Callable[[Any], bytes], segment: int):
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps({"segment": segment}).encode("ascii") + b"\n")
+            for item in items:
+                f.write(encode(item) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_directory()
+
+        # Снимок покрывает все сегменты до текущего - их можно удалить
+        for number in self._segments():
+            if number < segment:
+                os.remove(self._segment_path(number))
+
+    def close(self):
+        if self._snapshot_thread:
+            self._snapshot_thread.join()
+        with self._io_lock:
+            self._write_pending()
+            self._closed = True
+            self._file.close()
+        self._wakeup.set()
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class DurableWritesMiddleware:
+    """
+    ASGI-middleware: ответ на изменяющий запрос уходит только после fsync журнала.
+
+    Запись в хранилище возвращается сразу, а fsync делает фоновый поток
+    пачками. Перед началом ответа на POST/PUT/PATCH/DELETE middleware ждет,
+    пока журналы сбросят все, что было записано к этому моменту, - в том
+    числе изменения этого запроса. Подтвержденное изменение переживает сбой.
+    """
+
+    def __init__(self, app, storages: List[MemoryStorage]):
+        self.app = app
+        self.storages = storages
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                for storage in self.storages:
+                    await storage.wait_flushed()
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
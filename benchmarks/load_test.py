@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Load test of the API: a mixed CRUD/search/stats workload driven in-process through ASGI.
+
+    python benchmarks/load_test.py --tasks 10000 --concurrency 32 --duration 10 --runs 3
+    python benchmarks/load_test.py --backend sqlite --mix list=50,get=30,create=20
+    python benchmarks/load_test.py --save-baseline           # store results in benchmarks/baseline/
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_per_task import TAGS, synthetic_creates
+from results import add_arguments, combine_runs, finish, percentile
+
+SUITE = "load_test"
+DEFAULT_MIX = "list=30,get=25,search=10,stats=10,create=10,update=10,delete=5"
+STATUSES = ["создано", "в работе", "завершено"]
+
+
+class ASGIClient:
+    """
+    Минимальный клиент, вызывающий приложение напрямую, без сокетов и HTTP-парсера.
+
+    Замер включает middleware, зависимости, валидацию и сериализацию - все, что
+    делает приложение, - но не сеть и не сервер, поэтому результаты воспроизводимы.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, params: Optional[Dict] = None,
+                      body: Optional[Dict] = None) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        headers = [(b"host", b"bench")]
+        if body is not None:
+            headers += [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "server": ("bench", 80), "client": ("127.0.0.1", 50000),
+            "root_path": "", "path": path, "raw_path": path.encode("utf-8"),
+            "query_string": urlencode(params or {}, doseq=True).encode("ascii"), "headers": headers
+        }
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                # Тело уже отдано: дальше клиент "держит соединение", пока ответ не закончится
+                await asyncio.Event().wait()
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+
+        status = 0
+        chunks = []
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, b"".join(chunks)
+
+
+class Workload:
+    """Операции смеси: каждая выбирает параметры случайно и возвращает статус ответа."""
+
+    def __init__(self, client: ASGIClient, task_ids: List[str], rnd: random.Random):
+        self.client = client
+        self.task_ids = task_ids
+        self.rnd = rnd
+        # Удаляются только задачи, созданные этим же исполнителем, - без гонок за одну задачу
+        self.created: List[str] = []
+
+    async def list(self) -> int:
+        params = {"limit": 50, "sort_by": self.rnd.choice(["created_at", "priority", "title", "due_date"])}
+        if self.rnd.random() < 0.5:
+            params["status"] = self.rnd.choice(STATUSES)
+        if self.rnd.random() < 0.3:
+            params["tags"] = self.rnd.choice(TAGS)
+        status, _ = await self.client.request("GET", "/tasks/", params)
+        return status
+
+    async def get(self) -> int:
+        status, _ = await self.client.request("GET", f"/tasks/{self.rnd.choice(self.task_ids)}")
+        return status
+
+    async def search(self) -> int:
+        status, _ = await self.client.request("GET", "/tasks/search", {"query": self.rnd.choice(TAGS)})
+        return status
+
+    async def stats(self) -> int:
+        status, _ = await self.client.request("GET", "/tasks/stats")
+        return status
+
+    async def create(self) -> int:
+        body = {"title": f"Нагрузка {self.rnd.randint(1, 10**6)}", "tags": self.rnd.sample(TAGS, 2),
+                "priority": self.rnd.randint(1, 4)}
+        status, response = await self.client.request("POST", "/tasks/", body=body)
+        if status == 201:
+            self.created.append(json.loads(response)["id"])
+        return status
+
+    async def update(self) -> int:
+        body = {"status": self.rnd.choice(STATUSES), "priority": self.rnd.randint(1, 4)}
+        status, _ = await self.client.request("PUT", f"/tasks/{self.rnd.choice(self.task_ids)}", body=body)
+        return status
+
+    async def delete(self) -> int:
+        if not self.created:
+            return await self.create()
+        status, _ = await self.client.request("DELETE", f"/tasks/{self.created.pop()}")
+        return status
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if not hasattr(Workload, name) or name.startswith("_"):
+            raise SystemExit(f"unknown operation in --mix: {name}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+async def worker(workload: Workload, mix: Dict[str, int], deadline: float,
+                 latencies: Dict[str, List[float]], errors: Dict[str, int]):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.perf_counter() < deadline:
+        name = workload.rnd.choices(names, weights)[0]
+        start = time.perf_counter()
+        status = await getattr(workload, name)()
+        latencies[name].append(time.perf_counter() - start)
+        if status >= 400:
+            errors[name] += 1
+
+
+async def run(app, task_ids: List[str], args, mix: Dict[str, int]) -> List[Tuple[Dict[str, List[float]],
+                                                                              Dict[str, int], float]]:
+    from app.main import close_task_db, start_overdue_scheduler
+
+    client = ASGIClient(app)
+    rounds = []
+    await start_overdue_scheduler()
+    try:
+        # Прогрев: первые запросы строят маршруты, кэши JSON и соединения SQLite
+        warmup = Workload(client, task_ids, random.Random(args.seed))
+        for name in mix:
+            for _ in range(5):
+                await getattr(warmup, name)()
+
+        for _ in range(args.runs):
+            latencies = {name: [] for name in mix}
+            errors = {name: 0 for name in mix}
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(*(
+                worker(Workload(client, task_ids, random.Random(args.seed + i)), mix, deadline, latencies, errors)
+                for i in range(args.concurrency)
+            ))
+            rounds.append((latencies, errors, time.perf_counter() - started))
+    finally:
+        await close_task_db()
+    return rounds
+
+
+def summarize(samples: List[float], elapsed: float, errors: int) -> Dict[str, float]:
+    samples.sort()
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 1),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=10_000, help="tasks in the store before the run")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at once")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--seed", type=int, default=42)
+    add_arguments(parser)
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Хранилище и журнал настраиваются переменными окружения при импорте приложения
+        os.environ["TASK_DB_BACKEND"] = args.backend
+        os.environ["TASK_DB_PATH"] = os.path.join(directory, "tasks.db")
+        os.environ.pop("TASK_DATA_DIR", None)
+        os.environ.setdefault("TASK_LOG_FILE", os.path.join(directory, "task_manager.log"))
+        os.environ.setdefault("TASK_LOG_CONSOLE", "ERROR")
+        from app.auth import DEFAULT_USER
+        from app.main import app, task_db
+
+        db = task_db.for_user(DEFAULT_USER)
+        task_ids = []
+        creates = list(synthetic_creates(args.tasks, args.seed))
+        for start in range(0, len(creates), 10_000):
+            task_ids.extend(str(task.id) for task in db.create_tasks(creates[start:start + 10_000]))
+        del creates
+
+        rounds = asyncio.run(run(app, task_ids, args, mix))
+
+    runs = []
+    for latencies, errors, elapsed in rounds:
+        results = {}
+        everything = []
+        for name in mix:
+            everything.extend(latencies[name])
+            results[f"{args.backend}/{name}"] = summarize(latencies[name], elapsed, errors[name])
+        results[f"{args.backend}/total"] = summarize(everything, elapsed, sum(errors.values()))
+        runs.append(results)
+
+    results, noise = combine_runs(runs)
+    print(f"{args.backend}, {args.tasks} tasks, concurrency {args.concurrency}, "
+          f"median of {args.runs} runs x {args.duration:g} s")
+    print(f"  {'operation':<10}{'requests':>10}{'errors':>8}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'spread':>10}")
+    for key, row in results.items():
+        print(f"  {key.split('/')[1]:<10}{row['requests']:>10.0f}{row['errors']:>8.0f}{row['throughput_rps']:>10.0f}"
+              f"{row['p50_ms']:>8.2f}ms{row['p95_ms']:>8.2f}ms{row['p99_ms']:>8.2f}ms{noise[key]['p50_ms']:>9.0%}")
+
+    parameters = {"tasks": args.tasks, "concurrency": args.concurrency, "duration": args.duration,
+                  "mix": mix, "backend": args.backend, "runs": args.runs, "seed": args.seed}
+    # Бэкенд входит в ключи результатов; остальные параметры должны совпадать с базовой линией
+    sys.exit(finish(args, SUITE, parameters, runs, keyed=("backend",)))
+
+
+if __name__ == "__main__":
+    main()
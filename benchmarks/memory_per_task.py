@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: bytes per stored task, Pydantic models vs compact records.
+
+    python benchmarks/memory_per_task.py --count 1000000
+"""
+
+import argparse
+import gc
+import os
+import random
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, date, timedelta
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import Task, TaskCreate, TaskStatus, TaskPriority
+from app.records import TaskRecord, to_micros
+
+TAGS = ["работа", "дом", "api", "backend", "срочно", "покупки", "учеба", "спорт", "mobile", "design",
+        "review", "bug", "feature", "встреча", "звонок", "отчет", "python", "frontend", "docs", "ops"]
+
+
+def synthetic_creates(count: int, seed: int = 42):
+    rnd = random.Random(seed)
+    today = date.today()
+    for i in range(count):
+        yield TaskCreate.model_construct(
+            title=f"Задача {i}: {rnd.choice(TAGS)} {rnd.randint(1, 10_000)}",
+            description=f"Описание задачи номер {i}" if rnd.random() < 0.5 else None,
+            status=rnd.choice(list(TaskStatus)),
+            priority=rnd.choice(list(TaskPriority)),
+            tags=rnd.sample(TAGS, rnd.randint(0, 3)),
+            due_date=today + timedelta(days=rnd.randint(0, 365)) if rnd.random() < 0.6 else None
+        )
+
+
+def current_rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(build) -> int:
+    gc.collect()
+    if os.path.exists("/proc/self/statm"):
+        # RSS процесса: быстро и без накладных расходов tracemalloc
+        before = current_rss()
+        store = build()
+        gc.collect()
+        return current_rss() - before
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before
+
+
+def build_models(count: int):
+    # Так задачи хранились раньше: Dict[UUID, Task]
+    store = {}
+    now = datetime.now()
+    for task_create in synthetic_creates(count):
+        task = Task(
+            id=uuid4(),
+            title=task_create.title,
+            description=task_create.description,
+            status=task_create.status,
+            priority=task_create.priority,
+            tags=task_create.tags,
+            due_date=task_create.due_date,
+            created_at=now,
+            updated_at=now
+        )
+        store[task.id] = task
+    return store
+
+
+def build_records(count: int):
+    # Текущее представление TaskDatabase: Dict[int, TaskRecord]
+    store = {}
+    now = to_micros(datetime.now())
+    for task_create in synthetic_creates(count):
+        record = TaskRecord.from_create(uuid4(), task_create, now)
+        store[record.id] = record
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000, help="number of synthetic tasks")
+    parser.add_argument("--only", choices=["models", "records"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.only:
+        build = build_models if args.only == "models" else build_records
+        print(measure(lambda: build(args.count)))
+        return
+
+    # Каждое представление меряем в отдельном процессе, чтобы освобожденная
+    # память одного замера не искажала другой
+    results = {}
+    for kind in ("models", "records"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--count", str(args.count), "--only", kind],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results[kind] = int(output.split()[-1])
+
+    models, records = results["models"], results["records"]
+    print(f"tasks:              {args.count}")
+    print(f"pydantic Task:      {models / args.count:8.1f} bytes/task  ({models / 2**20:.1f} MiB)")
+    print(f"TaskRecord:         {records / args.count:8.1f} bytes/task  ({records / 2**20:.1f} MiB)")
+    print(f"reduction:          {models / records:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
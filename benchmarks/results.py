@@ -0,0 +1,199 @@
+"""
+Общие части бенчмарков: перцентили, медианы повторных прогонов, запись результатов
+в JSON и сравнение с базовой линией.
+
+Файл результатов:
+
+    {"suite": "store_ops", "environment": {...}, "parameters": {...},
+     "results": {"memory/100000/search_tasks": {"median_us": 41.2, "p95_us": 55.0, ...}},
+     "noise": {"memory/100000/search_tasks": {"median_us": 0.04, "p95_us": 0.12, ...}}}
+
+Каждая метрика - медиана по --runs прогонам, noise - ее разброс между прогонами
+((максимум - минимум) / медиана). Направление метрики определяется суффиксом:
+*_us и *_ms - меньше лучше, *_rps и *_per_s - больше лучше. Остальные (счетчики)
+не сравниваются.
+"""
+
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BENCHMARKS_DIR, "baseline")
+
+LOWER_IS_BETTER = ("_us", "_ms")
+HIGHER_IS_BETTER = ("_rps", "_per_s")
+# Хвостовые перцентили шумнее медианы: их допуск больше порога во столько раз
+TAIL_METRICS = ("p95_", "p99_")
+TAIL_FACTOR = 2.0
+# Допуск не меньше разброса метрики между прогонами, умноженного на этот множитель
+NOISE_FACTOR = 2.0
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    # Ближайший ранг: значение, которое действительно наблюдалось
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def compared(metric: str) -> bool:
+    return metric.endswith(LOWER_IS_BETTER) or metric.endswith(HIGHER_IS_BETTER)
+
+
+def combine_runs(runs: List[Dict[str, Dict[str, float]]]) -> Tuple[Dict[str, Dict[str, float]],
+                                                                    Dict[str, Dict[str, float]]]:
+    """Медиана каждой метрики по прогонам и ее относительный разброс между прогонами."""
+    results: Dict[str, Dict[str, float]] = {}
+    noise: Dict[str, Dict[str, float]] = {}
+    for name in runs[0]:
+        results[name] = {}
+        noise[name] = {}
+        for metric in runs[0][name]:
+            values = sorted(run[name][metric] for run in runs if name in run)
+            middle = statistics.median(values)
+            results[name][metric] = round(middle, 3)
+            if compared(metric):
+                noise[name][metric] = round((values[-1] - values[0]) / middle, 3) if middle else 0.0
+    return results, noise
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR,
+            check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds")
+    }
+
+
+def baseline_path(suite: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{suite}.json")
+
+
+def write_results(path: str, suite: str, parameters: Dict[str, Any], results: Dict[str, Dict[str, float]],
+                  noise: Dict[str, Dict[str, float]]):
+    document = {"suite": suite, "environment": environment(), "parameters": parameters,
+                "results": results, "noise": noise}
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+def load_document(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def parameter_mismatches(parameters: Dict[str, Any], baseline: Dict[str, Any], keyed: Sequence[str]) -> List[str]:
+    """Параметры, с которыми прогоны несравнимы; keyed входят в ключи результатов и могут отличаться."""
+    return [f"{name}: baseline {baseline.get(name)!r}, this run {parameters.get(name)!r}"
+            for name in sorted(parameters.keys() | baseline.keys())
+            if name not in keyed and parameters.get(name) != baseline.get(name)]
+
+
+def allowed_change(metric: str, threshold: float, noise: float) -> float:
+    # Порог для медианы, больше для хвостов; и не меньше наблюдаемого шума этой метрики
+    if metric.startswith(TAIL_METRICS):
+        threshold *= TAIL_FACTOR
+    return max(threshold, NOISE_FACTOR * noise)
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float,
+            noise: Optional[Dict[str, Dict[str, float]]] = None,
+            baseline_noise: Optional[Dict[str, Dict[str, float]]] = None) -> List[str]:
+    """Метрики, ухудшившиеся относительно базовой линии больше допуска (доля, с учетом шума)."""
+    noise = noise or {}
+    baseline_noise = baseline_noise or {}
+    regressions = []
+    # Сравниваются только замеры, которые есть в обоих файлах (размеры и бэкенды могут отличаться)
+    for name in sorted(results.keys() & baseline.keys()):
+        for metric, value in sorted(results[name].items()):
+            base = baseline[name].get(metric)
+            if not base:
+                continue
+            if metric.endswith(LOWER_IS_BETTER):
+                change = value / base - 1
+            elif metric.endswith(HIGHER_IS_BETTER):
+                change = base / value - 1 if value else float("inf")
+            else:
+                continue
+            spread = max(noise.get(name, {}).get(metric, 0.0), baseline_noise.get(name, {}).get(metric, 0.0))
+            allowed = allowed_change(metric, threshold, spread)
+            if change > allowed:
+                regressions.append(f"{name} {metric}: {base:g} -> {value:g} ({change:+.0%} worse, allowed {allowed:.0%})")
+    return regressions
+
+
+def add_arguments(parser, runs: int = 3):
+    parser.add_argument("--runs", type=int, default=runs,
+                        help=f"repeated runs; each metric is the median over them (default {runs})")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="baseline JSON to compare with (default: benchmarks/baseline/<suite>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown of a median before it counts as a regression; tail percentiles "
+                             "get twice as much and noisy metrics at least twice their spread (default 0.25 = 25%%)")
+
+
+def finish(args, suite: str, parameters: Dict[str, Any], runs: List[Dict[str, Dict[str, float]]],
+           keyed: Sequence[str] = ()) -> int:
+    """
+    Сводит прогоны, сохраняет результаты и сравнивает с базовой линией.
+
+    Код выхода 1 - есть регрессии, 2 - параметры прогона не совпадают с базовой
+    линией (кроме keyed, которые входят в ключи результатов) и сравнение бессмысленно.
+    """
+    results, noise = combine_runs(runs)
+    if args.output:
+        write_results(args.output, suite, parameters, results, noise)
+    if args.save_baseline:
+        path = args.baseline or baseline_path(suite)
+        write_results(path, suite, parameters, results, noise)
+        print(f"\nbaseline saved: {path}")
+        return 0
+
+    path = args.baseline or baseline_path(suite)
+    if not os.path.exists(path):
+        print(f"\nno baseline at {path}; run with --save-baseline to create one")
+        return 0
+    baseline = load_document(path)
+    mismatches = parameter_mismatches(parameters, baseline.get("parameters", {}), keyed)
+    if mismatches:
+        print(f"\nNOT COMPARED: parameters differ from {path}:", file=sys.stderr)
+        for line in mismatches:
+            print(f"  {line}", file=sys.stderr)
+        print("  rerun with the baseline's parameters or save a new baseline", file=sys.stderr)
+        return 2
+    if not results.keys() & baseline["results"].keys():
+        print(f"\nNOT COMPARED: no measurements in common with {path} (other backend or sizes?)", file=sys.stderr)
+        return 2
+    regressions = compare(results, baseline["results"], args.threshold, noise, baseline.get("noise"))
+    if regressions:
+        print(f"\nREGRESSIONS vs {path} (threshold {args.threshold:.0%}):", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+    print(f"\nno regressions vs {path} (threshold {args.threshold:.0%})")
+    return 0
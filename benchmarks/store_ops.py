@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the task store: latency of each operation at several store sizes.
+
+    python benchmarks/store_ops.py                           # 1k, 100k, 1M tasks, in-memory store
+    python benchmarks/store_ops.py --sizes 1000,100000 --backend sqlite
+    python benchmarks/store_ops.py --save-baseline           # store results in benchmarks/baseline/
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+from uuid import UUID
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import COMPACT_FIELDS, TaskDatabase
+from app.models import TaskCreate, TaskPriority, TaskStatus, TaskUpdate
+from app.sqlite_database import SQLiteTaskDatabase
+from memory_per_task import TAGS, synthetic_creates
+from results import add_arguments, combine_runs, finish, percentile
+
+SUITE = "store_ops"
+# Задачи добавляются пачками: create_tasks возвращает модели, и миллион моделей разом не нужен
+SEED_BATCH = 10_000
+# Сколько id сохранить для точечных операций
+SAMPLE_IDS = 1000
+
+
+def seed(db, count: int) -> List[UUID]:
+    ids = []
+    batch = []
+    for task_create in synthetic_creates(count):
+        batch.append(task_create)
+        if len(batch) == SEED_BATCH:
+            ids.extend(task.id for task in db.create_tasks(batch)[:SAMPLE_IDS // 10])
+            batch = []
+    if batch:
+        ids.extend(task.id for task in db.create_tasks(batch)[:SAMPLE_IDS // 10])
+    return ids
+
+
+def timed_calls(func: Callable[[int], object], repeat: int, budget: float) -> List[float]:
+    # Прогрев: кэши, ленивые индексы, первое обращение к страницам SQLite
+    for i in range(min(3, repeat)):
+        func(i)
+    samples = []
+    deadline = time.perf_counter() + budget
+    # Сборщик мусора не должен попадать в замер отдельных вызовов
+    gc.disable()
+    try:
+        for i in range(repeat):
+            start = time.perf_counter()
+            func(i)
+            samples.append(time.perf_counter() - start)
+            # Медленные операции на больших размерах ограничены по времени, но не меньше 10 замеров
+            if i >= 10 and time.perf_counter() > deadline:
+                break
+    finally:
+        gc.enable()
+    samples.sort()
+    return samples
+
+
+def operations(db, ids: List[UUID], rnd: random.Random) -> Dict[str, Callable[[int], object]]:
+    _, cursor = db.query_json(limit=100)
+    created: List[UUID] = []
+
+    def create(i):
+        task = db.create_task(TaskCreate(title=f"Бенчмарк {i}", tags=[rnd.choice(TAGS)]))
+        created.append(task.id)
+
+    def delete(i):
+        # Удаляются задачи, созданные в create, - размер хранилища остается прежним
+        if created:
+            db.delete_task(created.pop())
+
+    statuses = list(TaskStatus)
+    return {
+        "get_task": lambda i: db.get_task(ids[i % len(ids)]),
+        "get_tasks": lambda i: db.get_tasks(limit=100),
+        "query_status": lambda i: db.query_json(status=statuses[i % len(statuses)], limit=100),
+        "query_tag_by_priority": lambda i: db.query_json(tags=[TAGS[i % len(TAGS)]], limit=100, sort_by="priority"),
+        "query_cursor_page": lambda i: db.query_json(limit=100, cursor=cursor),
+        "query_compact": lambda i: db.query_fields(COMPACT_FIELDS, True, limit=100),
+        "search_tasks": lambda i: db.search_tasks(TAGS[i % len(TAGS)]),
+        "search_prefix": lambda i: db.search_tasks(f"задач {i % 1000}"),
+        "get_task_stats": lambda i: db.get_task_stats(),
+        "create_task": create,
+        "update_task": lambda i: db.update_task(
+            ids[i % len(ids)], TaskUpdate(priority=TaskPriority(i % 4 + 1), status=statuses[i % 3])
+        ),
+        "delete_task": delete
+    }
+
+
+def open_store(backend: str, directory: str, size: int):
+    if backend == "sqlite":
+        return SQLiteTaskDatabase(os.path.join(directory, f"bench-{size}.db"))
+    return TaskDatabase()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="comma-separated store sizes")
+    parser.add_argument("--backend", choices=["memory", "sqlite", "both"], default="memory")
+    parser.add_argument("--repeat", type=int, default=500, help="calls per operation")
+    parser.add_argument("--budget", type=float, default=2.0, help="max seconds per operation")
+    parser.add_argument("--seed", type=int, default=42)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    backends = ["memory", "sqlite"] if args.backend == "both" else [args.backend]
+    runs: List[Dict[str, Dict[str, float]]] = [{} for _ in range(args.runs)]
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in backends:
+            for size in sizes:
+                db = open_store(backend, directory, size)
+                started = time.perf_counter()
+                ids = seed(db, size)
+                print(f"\n{backend}, {size} tasks (seeded in {time.perf_counter() - started:.1f} s), "
+                      f"median of {args.runs} runs")
+                print(f"  {'operation':<24}{'median':>12}{'p95':>12}{'ops/s':>12}{'spread':>10}")
+                rnd = random.Random(args.seed)
+                ops = operations(db, ids, rnd)
+                size_runs: List[Dict[str, Dict[str, float]]] = [{} for _ in range(args.runs)]
+                # Прогоны чередуются по всем операциям: медленный дрейф машины задевает все одинаково
+                for run in size_runs:
+                    for name, func in ops.items():
+                        samples = timed_calls(func, args.repeat, args.budget)
+                        run[f"{backend}/{size}/{name}"] = {
+                            "median_us": round(percentile(samples, 50) * 1e6, 2),
+                            "p95_us": round(percentile(samples, 95) * 1e6, 2),
+                            "ops_per_s": round(len(samples) / sum(samples), 1),
+                            "calls": len(samples)
+                        }
+                results, noise = combine_runs(size_runs)
+                for key, row in results.items():
+                    print(f"  {key.rsplit('/', 1)[1]:<24}{row['median_us']:>10.1f}us{row['p95_us']:>10.1f}us"
+                          f"{row['ops_per_s']:>12.0f}{noise[key]['median_us']:>9.0%}")
+                for run, size_run in zip(runs, size_runs):
+                    run.update(size_run)
+                db.close()
+                del db, ids, ops
+                gc.collect()
+
+    parameters = {"sizes": sizes, "backends": backends, "repeat": args.repeat, "budget": args.budget,
+                  "runs": args.runs, "seed": args.seed}
+    # Размеры и бэкенды входят в ключи результатов - сравниваются пересекающиеся
+    sys.exit(finish(args, SUITE, parameters, runs, keyed=("sizes", "backends")))
+
+
+if __name__ == "__main__":
+    main()
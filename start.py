@@ -1,21 +1,70 @@
 #!/usr/bin/env python3
 """
 Task Manager API - Original Full Version Launcher
+
+    python start.py                 # режим разработки: один процесс с автоперезагрузкой
+    python start.py --workers 4     # боевой режим: 4 процесса над общим хранилищем SQLite
 """
 
+import argparse
+import os
+import sys
+
 import uvicorn
-from app.main import app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Task Manager API launcher")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("TASK_WORKERS", "1")),
+        help="number of worker processes; more than one enables production mode"
+    )
+    return parser.parse_args()
+
+
+def configure_shared_store(workers: int):
+    # Каждый воркер - отдельный процесс со своей памятью, поэтому хранилище
+    # в памяти (и его журнал) разделилось бы между ними. Общим для всех
+    # процессов является только файл SQLite в режиме WAL: чтения идут
+    # параллельно, записи сериализуются блокировкой базы.
+    backend = os.getenv("TASK_DB_BACKEND", "memory")
+    if backend != "sqlite":
+        if os.getenv("TASK_DATA_DIR"):
+            print("TASK_DATA_DIR is a single-process store; use TASK_DB_BACKEND=sqlite with --workers")
+            sys.exit(1)
+        os.environ["TASK_DB_BACKEND"] = "sqlite"
+    path = os.environ.setdefault("TASK_DB_PATH", "tasks.db")
+    print(f"Shared SQLite store for {workers} workers: {os.path.abspath(path)}")
+
 
 if __name__ == "__main__":
+    args = parse_args()
+    production = args.workers > 1
+
     print("Starting ORIGINAL Full Task Manager API...")
-    print("API will be available at: http://localhost:8000")
-    print("Documentation: http://localhost:8000/docs")
+    print(f"API will be available at: http://localhost:{args.port}")
+    print(f"Documentation: http://localhost:{args.port}/docs")
     print("Features: AI Assistant, Gamification, Notifications, Analytics, Voice Control, Themes")
-    
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
+
+    if production:
+        configure_shared_store(args.workers)
+        # Воркеры узнают о боевом режиме из окружения: у каждого свой файл журнала
+        os.environ["TASK_WORKERS"] = str(args.workers)
+        # Без reload: uvicorn запускает supervisor и N воркеров на одном сокете
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            log_level="info"
+        )
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            log_level="info"
+        )
@@ -1,17 +1,54 @@
 #!/usr/bin/env python3
 """
 Web Application Launcher for Task Manager
+
+    python start_web.py                 # режим разработки: файлы читаются с диска, кэш отключен
+    python start_web.py --production    # боевой режим: файлы в памяти, сжатие, ETag, многопоточность
 """
 
+import argparse
+import email.utils
+import gzip
+import hashlib
 import http.server
-import socketserver
+import mimetypes
 import os
+import re
+import socketserver
 import sys
 import webbrowser
 import time
+from urllib.parse import unquote
+
+try:
+    import brotli
+except ImportError:
+    # Необязательная зависимость: без нее отдаются только gzip и несжатые файлы
+    brotli = None
 
 PORT = 3000
 
+# Типы, которые имеет смысл сжимать; картинки и шрифты уже сжаты
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+# Имя с хэшем содержимого (app.3f2a9c1d.js) - файл никогда не меняется под этим именем
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Остальное (index.html) браузер хранит, но каждый раз сверяет по ETag
+REVALIDATE_CACHE = "no-cache"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Task Manager web app launcher")
+    parser.add_argument("--host", default=os.getenv("HOST", ""))
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEB_PORT", str(PORT))))
+    parser.add_argument(
+        "--production", action="store_true", default=os.getenv("TASK_WEB_PRODUCTION") == "1",
+        help="serve precompressed files from memory with caching headers and a thread per connection"
+    )
+    parser.add_argument("--no-browser", action="store_true", help="do not open the browser on start")
+    return parser.parse_args()
+
+
 class CustomHandler(http.server.SimpleHTTPRequestHandler):
     def do_GET(self):
         if self.path == '/':
@@ -24,38 +61,209 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Expires', '0')
         super().end_headers()
 
+
+class StaticAsset:
+    """Файл, подготовленный при запуске: содержимое, сжатые варианты и заголовки кэширования."""
+
+    __slots__ = ("content_type", "etag", "version", "last_modified", "mtime", "immutable", "variants")
+
+    def __init__(self, path: str, url: str):
+        with open(path, "rb") as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        # ETag по содержимому: одинаков во всех процессах и после перезапуска
+        self.version = hashlib.sha256(body).hexdigest()[:16]
+        self.etag = f'"{self.version}"'
+        # HTTP-даты с точностью до секунды
+        self.mtime = int(os.path.getmtime(path))
+        self.last_modified = email.utils.formatdate(self.mtime, usegmt=True)
+        self.immutable = bool(HASHED_NAME.search(os.path.basename(url)))
+
+        # Кодировка -> тело, в порядке предпочтения сервера
+        self.variants = {}
+        if content_type.startswith(COMPRESSIBLE_TYPES):
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.variants["br"] = compressed
+            # mtime=0 - одинаковый результат при каждом запуске
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants["gzip"] = compressed
+        self.variants["identity"] = body
+
+    def cache_control(self, query: str) -> str:
+        # ?v=<хэш содержимого> в ссылке тоже делает ответ неизменяемым
+        if self.immutable or f"v={self.version}" in query.split("&"):
+            return IMMUTABLE_CACHE
+        return REVALIDATE_CACHE
+
+
+def load_assets(web_dir: str):
+    assets = {}
+    for root, _, files in os.walk(web_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            url = "/" + os.path.relpath(path, web_dir).replace(os.sep, "/")
+            assets[url] = StaticAsset(path, url)
+    if "/index.html" in assets:
+        assets["/"] = assets["/index.html"]
+    return assets
+
+
+def accepted_encodings(header: str):
+    # Accept-Encoding: "br;q=1.0, gzip;q=0, *" -> {"br": 1.0, "gzip": 0.0, "*": 1.0}
+    weights = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = params.strip()
+        try:
+            weights[coding] = float(q[2:]) if q.startswith("q=") else 1.0
+        except ValueError:
+            weights[coding] = 0.0
+    return weights
+
+
+def encoding_allowed(coding: str, weights) -> bool:
+    # Явная запись (в том числе q=0) важнее "*"
+    if coding in weights:
+        return weights[coding] > 0
+    return weights.get("*", 0) > 0
+
+
+class StaticHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Боевая раздача файлов из памяти.
+
+    Файлы читаются и сжимаются один раз при запуске, поэтому запрос - это
+    поиск в словаре и запись готовых байтов, без обращения к диску.
+    Повторная загрузка страницы получает 304 по ETag или Last-Modified.
+    Соединения keep-alive (HTTP/1.1), чтобы страница не открывала новое на каждый файл.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "TaskManagerWeb"
+    assets = {}
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _not_modified(self, asset: StaticAsset) -> bool:
+        # If-None-Match важнее If-Modified-Since (RFC 9110)
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or asset.etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return asset.mtime <= since
+        return False
+
+    def _serve(self, head: bool):
+        path, _, query = self.path.partition("?")
+        asset = self.assets.get(unquote(path))
+        if asset is None:
+            self.send_error(404, "File not found")
+            return
+
+        if self._not_modified(asset):
+            self.send_response(304)
+            self._send_cache_headers(asset, query)
+            self.end_headers()
+            return
+
+        weights = accepted_encodings(self.headers.get("Accept-Encoding", ""))
+        encoding = next(
+            (coding for coding in asset.variants if encoding_allowed(coding, weights)), "identity"
+        )
+        body = asset.variants[encoding]
+
+        self.send_response(200)
+        self.send_header("Content-Type", asset.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self._send_cache_headers(asset, query)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _send_cache_headers(self, asset: StaticAsset, query: str):
+        self.send_header("ETag", asset.etag)
+        self.send_header("Last-Modified", asset.last_modified)
+        self.send_header("Cache-Control", asset.cache_control(query))
+        # Кэши хранят сжатые и несжатые варианты раздельно
+        self.send_header("Vary", "Accept-Encoding")
+
+    def log_message(self, format, *args):
+        # Журнал на каждый запрос в stderr - лишняя синхронная запись под нагрузкой
+        pass
+
+
+class StaticServer(http.server.ThreadingHTTPServer):
+    # Поток на соединение; очередь на сокете - для всплеска одновременных загрузок
+    daemon_threads = True
+    request_queue_size = 128
+
+
 def main():
-    web_dir = os.path.join(os.path.dirname(__file__), 'mobile-app', 'web')
+    args = parse_args()
+    web_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mobile-app', 'web')
     if not os.path.exists(web_dir):
         print(f"Error: Web directory not found: {web_dir}")
         return
-    
-    os.chdir(web_dir)
-    
+
+    if args.production:
+        StaticHandler.assets = load_assets(web_dir)
+    else:
+        os.chdir(web_dir)
+
     print("=" * 60)
     print("TASK MANAGER WEB APPLICATION")
     print("=" * 60)
-    print(f"Web directory: {os.getcwd()}")
-    print(f"Web server: http://localhost:{PORT}")
+    print(f"Web directory: {web_dir}")
+    print(f"Web server: http://localhost:{args.port}")
     print(f"FastAPI backend: http://localhost:8000")
     print(f"API docs: http://localhost:8000/docs")
+    if args.production:
+        encodings = "br, gzip" if brotli is not None else "gzip (pip install brotli for br)"
+        print(f"Production mode: {len(StaticHandler.assets)} files in memory, compression: {encodings}")
     print("=" * 60)
     print("Press Ctrl+C to stop")
     print("=" * 60)
-    
+
     def open_browser():
         time.sleep(2)
-        webbrowser.open(f'http://localhost:{PORT}')
-    
-    import threading
-    browser_thread = threading.Thread(target=open_browser)
-    browser_thread.daemon = True
-    browser_thread.start()
-    
+        webbrowser.open(f'http://localhost:{args.port}')
+
+    if not args.no_browser:
+        import threading
+        browser_thread = threading.Thread(target=open_browser)
+        browser_thread.daemon = True
+        browser_thread.start()
+
     try:
-        with socketserver.TCPServer(("", PORT), CustomHandler) as httpd:
-            print(f"Web server started on port {PORT}")
-            print("Opening browser...")
+        if args.production:
+            server = StaticServer((args.host, args.port), StaticHandler)
+        else:
+            server = socketserver.TCPServer((args.host, args.port), CustomHandler)
+        with server as httpd:
+            print(f"Web server started on port {args.port}")
+            if not args.no_browser:
+                print("Opening browser...")
             httpd.serve_forever()
     except KeyboardInterrupt:
         print("\nWeb server stopped")